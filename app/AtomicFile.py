@@ -0,0 +1,31 @@
+import os
+import shutil
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """
+    Atomically replaces ``path`` with ``content`` through a temporary file and a
+    rename, so readers never see a partial file. Returns False without writing when
+    the file already holds ``content``.
+    """
+    data = content.encode()
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as file:
+                if file.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
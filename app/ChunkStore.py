@@ -0,0 +1,208 @@
+import hashlib
+import io
+import json
+import os
+import stat
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.SitePackager import compression_extension, open_compressed, throughput, walk
+from app.Tracer import current_span, span, traced
+
+CHUNK_SIZE = 4 * 1024 * 1024
+STORE_FILE = "store.json"
+STORE_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+class ChunkStore:
+    """
+    Per-site content-addressed store used for incremental packaging.
+
+    The store remembers, for every source file, the (mtime, size) it was last hashed at
+    and the SHA-256 hashes of its fixed-size chunks, plus which package each chunk was
+    first shipped in. Packaging only re-hashes files whose stat changed and only writes
+    chunks that no earlier package contains, so a delta package scales with the amount
+    of changed data rather than the size of the site.
+    """
+
+    path = None
+    files = None
+    chunks = None
+
+    def __init__(self, path: str, workers: int = None):
+        self.path = path
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        self.files = {}
+        self.chunks = {}
+        self._load()
+
+    @traced("package.incremental")
+    def package(self, source_dir: str, output_dir: str) -> dict:
+        """
+        Writes a delta package of ``source_dir`` to ``output_dir`` and returns its
+        manifest. The manifest maps every current file to its chunk hashes, so a
+        receiver holding the earlier packages can rebuild the full tree.
+
+        Args:
+            source_dir (str): Directory to package.
+            output_dir (str): Directory to write ``chunks.tar.*`` and the manifest to.
+        """
+        if not os.path.isdir(source_dir):
+            raise FileNotFoundError(f"Source path: '{source_dir}' not found.")
+
+        start = time.perf_counter()
+        package_name = os.path.basename(os.path.normpath(output_dir))
+        with span("scan") as trace:
+            current, changed = self._scan(source_dir)
+            trace.add(files=len(current))
+
+        # Hashing dominates; hashlib releases the GIL so threads scale with disks
+        with span("hash") as trace, ThreadPoolExecutor(self.workers) as executor:
+            hashed = executor.map(_hash_chunks, (path for _, path in changed))
+            for (arcname, path), chunks in zip(changed, hashed):
+                current[arcname]["chunks"] = chunks
+            trace.add(files=len(changed))
+
+        os.makedirs(output_dir, exist_ok=True)
+        archive = f"chunks.tar.{compression_extension()}"
+        new_chunks, new_bytes = self._write_chunks(
+            changed, current, os.path.join(output_dir, archive), package_name
+        )
+
+        manifest = {
+            "archive": archive,
+            "chunk_size": CHUNK_SIZE,
+            "files": {
+                arcname: {"size": entry["size"], "chunks": entry["chunks"]}
+                for arcname, entry in current.items()
+            },
+            "changed": [arcname for arcname, _ in changed],
+            "deleted": sorted(set(self.files) - set(current)),
+            "new_chunks": new_chunks,
+            "stats": throughput(len(changed), new_bytes, time.perf_counter() - start),
+        }
+
+        with open(os.path.join(output_dir, MANIFEST_FILE), "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        self.files = current
+        self._save()
+        current_span().add(files=len(changed), bytes=new_bytes)
+        return manifest
+
+    def _scan(self, source_dir: str):
+        """
+        Stats every file and splits them into unchanged (reusing cached chunk hashes)
+        and changed ones.
+        """
+        current = {}
+        changed = []
+
+        for path, arcname in walk(source_dir):
+            file_stat = os.stat(path, follow_symlinks=False)
+            if not stat.S_ISREG(file_stat.st_mode):
+                continue
+
+            cached = self.files.get(arcname)
+            entry = {
+                "mtime_ns": file_stat.st_mtime_ns,
+                "size": file_stat.st_size,
+                "chunks": None,
+            }
+            if (
+                cached is not None
+                and cached["mtime_ns"] == file_stat.st_mtime_ns
+                and cached["size"] == file_stat.st_size
+            ):
+                entry["chunks"] = cached["chunks"]
+            else:
+                changed.append((arcname, path))
+            current[arcname] = entry
+
+        return current, changed
+
+    def _write_chunks(
+        self, changed: list, current: dict, archive_path: str, package_name: str
+    ):
+        new_chunks = 0
+        new_bytes = 0
+
+        with open_compressed(archive_path) as stream:
+            with tarfile.open(fileobj=stream, mode="w|") as tar:
+                for arcname, path in changed:
+                    chunks = current[arcname]["chunks"]
+                    if all(chunk in self.chunks for chunk in chunks):
+                        continue
+
+                    with open(path, "rb") as file:
+                        for chunk in chunks:
+                            data = file.read(CHUNK_SIZE)
+                            if chunk in self.chunks:
+                                continue
+                            if hashlib.sha256(data).hexdigest() != chunk:
+                                raise RuntimeError(
+                                    f"File '{path}' changed while packaging"
+                                )
+
+                            tarinfo = tarfile.TarInfo(chunk)
+                            tarinfo.size = len(data)
+                            tar.addfile(tarinfo, io.BytesIO(data))
+                            self.chunks[chunk] = package_name
+                            new_chunks += 1
+                            new_bytes += len(data)
+
+        return new_chunks, new_bytes
+
+    def _load(self) -> None:
+        try:
+            with open(os.path.join(self.path, STORE_FILE), "r") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if data.get("version") != STORE_VERSION:
+            return
+
+        # Chunks shipped in packages that were deleted since must be shipped again
+        packages_dir = os.path.dirname(os.path.normpath(self.path))
+        packages = {
+            package: os.path.isdir(os.path.join(packages_dir, package))
+            for package in set(data["chunks"].values())
+        }
+        self.chunks = {
+            chunk: package
+            for chunk, package in data["chunks"].items()
+            if packages[package]
+        }
+        self.files = {
+            arcname: entry
+            for arcname, entry in data["files"].items()
+            if all(chunk in self.chunks for chunk in entry["chunks"])
+        }
+
+    def _save(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        store_path = os.path.join(self.path, STORE_FILE)
+        temp_path = f"{store_path}.{os.getpid()}.tmp"
+
+        with open(temp_path, "w") as file:
+            json.dump(
+                {"version": STORE_VERSION, "files": self.files, "chunks": self.chunks},
+                file,
+            )
+        os.replace(temp_path, store_path)
+
+
+def _hash_chunks(path: str) -> list:
+    chunks = []
+
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(CHUNK_SIZE)
+            if not data:
+                break
+            chunks.append(hashlib.sha256(data).hexdigest())
+
+    return chunks
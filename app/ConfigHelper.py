@@ -1,6 +1,12 @@
+import hashlib
 import os
 from string import Template
 
+from app.AtomicFile import write_if_changed
+from app.EnvFile import EnvFile
+from app.Tracer import current_span, traced
+from app.constants import COMPOSE_FILE
+
 # Docker environment variables
 SUBSTITUTIONS = {
     "MYSQL_CONTAINER_NAME": "mysql_{site}",
@@ -25,7 +31,13 @@ SUBSTITUTIONS = {
 class ConfigHelper:
 
     @staticmethod
-    def update_compose_file(site_path: str, site_name: str, ports: dict):
+    def update_compose_file(
+        site_path: str,
+        site_name: str,
+        ports: dict,
+        template_path: str = None,
+        database: dict = None,
+    ):
         """
         Updates the docker compose file based on the information in the environment file.
 
@@ -34,25 +46,62 @@ class ConfigHelper:
             site_name (str): Site name to use for substitution.
             phpmyadmin_port (int): phpMyAdmin port to use for substitution.
             wordpress_port (int): WordPress port to use for substitution.
+            template_path (str): Compose template to render from, defaults to the
+                site's own docker-compose.yml.
+            database (dict): Shared database settings, for sites in shared mode.
         """
-        substitutions = _get_substitutions(
-            site_name, ports.get("phpmyadmin"), ports.get("wordpress")
+        ConfigHelper.render_compose_files(
+            [(site_path, site_name, ports, database)], template_path
         )
-        compose_filepath = os.path.join(site_path, "docker-compose.yml")
 
-        # Read the existing docker-compose.yml file
-        with open(compose_filepath, "r") as compose_file:
-            compose_content = compose_file.read()
+    @staticmethod
+    @traced("render_compose_files")
+    def render_compose_files(sites: list, template_path: str = None) -> dict:
+        """
+        Renders the docker compose file of every site in a single pass and returns how
+        many files were written and how many were already up to date.
 
-        # Use Template to replace placeholders with dynamic values
-        compose_template = Template(compose_content)
-        updated_compose_content = compose_template.substitute(substitutions)
+        Args:
+            sites (list): (site path, site name, ports) tuples to render, optionally
+                followed by the site's shared database settings.
+            template_path (str): Compose template shared by all sites, defaults to each
+                site's own docker-compose.yml.
+        """
+        stats = {"rendered": 0, "unchanged": 0}
+
+        for site_path, site_name, ports, *database in sites:
+            compose_filepath = os.path.join(site_path, COMPOSE_FILE)
+            content = ConfigHelper.render_compose(
+                template_path or compose_filepath, site_name, ports, *database
+            )
+            if write_if_changed(compose_filepath, content):
+                stats["rendered"] += 1
+                current_span().add(files=1, bytes=len(content))
+            else:
+                stats["unchanged"] += 1
+
+        return stats
+
+    @staticmethod
+    def render_compose(
+        template_path: str, site_name: str, ports: dict, database: dict = None
+    ) -> str:
+        """
+        Returns the compose file rendered from ``template_path`` for a site.
 
-        # Write the updated content back to the same file
-        with open(compose_filepath, "w") as compose_file:
-            compose_file.write(updated_compose_content)
+        Args:
+            template_path (str): Path of the compose template.
+            site_name (str): Site name to use for substitution.
+            ports (dict): phpMyAdmin and WordPress ports to use for substitution.
+            database (dict): Shared database settings, for sites in shared mode.
+        """
+        substitutions = _get_substitutions(
+            site_name, ports.get("phpmyadmin"), ports.get("wordpress"), database
+        )
+        return compile_template(template_path).render(substitutions)
 
     @staticmethod
+    @traced("update_env_file")
     def update_env_file(env_path: str, properties: dict):
         """
         Updates the .env file based on the properties values.
@@ -64,36 +113,87 @@ class ConfigHelper:
         if not os.path.exists(env_path):
             raise FileNotFoundError(f"Environment path: '{env_path}' not found.")
 
-        lines = []
-        values = list(properties.keys())
+        # One read and one atomic write, however many properties change
+        env_file = EnvFile(env_path)
+        env_file.update(properties)
+        if env_file.save():
+            current_span().add(files=1)
 
-        # Substitutes the value from proerpties in .env file if exists
-        # otherwise append to the end of file
-        with open(env_path, "r") as file:
-            for line in file:
-                line = line.strip()
 
-                if "=" not in line:
-                    lines.append(line)
-                    continue
-                else:
-                    variable, value = line.split("=")
-                    if variable in values:
-                        lines.append(f"{variable}={properties[variable]}")
-                        values.remove(variable)
-                    else:
-                        lines.append(line)
+class CompiledTemplate:
+    """
+    A string.Template split once into literal text and placeholder names, so rendering
+    is a single join instead of a regex pass over the whole file.
+    """
 
-        # Append any remaining properties to the end of the file
-        if len(values) > 0:
-            for variable in values:
-                lines.append(f"{variable}={properties[variable]}")
+    def __init__(self, content: str):
+        self.parts = []
+        position = 0
 
-        with open(env_path, "w") as file:
-            file.write("\n".join(lines))
+        for match in Template.pattern.finditer(content):
+            start = match.start()
+            self.parts.append(content[position:start])
+            position = match.end()
+            if match.group("escaped") is not None:
+                self.parts.append("$")
+            elif match.group("invalid") is not None:
+                raise ValueError(f"Invalid placeholder at offset {start}")
+            else:
+                self.parts.append((match.group("named") or match.group("braced"),))
 
+        self.parts.append(content[position:])
 
-def _get_substitutions(site_name: str, phpmyadmin_port: int, wordpress_port: int):
+    def render(self, substitutions: dict) -> str:
+        """
+        Substitutes every placeholder, raising KeyError for unknown ones like
+        Template.substitute.
+        """
+        return "".join(
+            part if isinstance(part, str) else str(substitutions[part[0]])
+            for part in self.parts
+        )
+
+
+# Compiled templates by content hash, and the hash of every template file read
+_templates = {}
+_template_files = {}
+
+
+def compile_template(path: str) -> CompiledTemplate:
+    """
+    Returns the compiled template stored at ``path``. Templates are only re-read when
+    the file changes and only recompiled when its contents do.
+    """
+    stat = os.stat(path)
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _template_files.get(path)
+    if cached is not None and cached[:3] == key:
+        return _templates[cached[3]]
+
+    with open(path, "r") as template_file:
+        content = template_file.read()
+
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    if digest not in _templates:
+        _templates[digest] = CompiledTemplate(content)
+    _template_files[path] = (*key, digest)
+    return _templates[digest]
+
+
+def invalidate_template(path: str = None) -> None:
+    """
+    Forgets the template read from ``path``, or every template file, so it is read
+    again on next use.
+    """
+    path = None if path is None else os.path.abspath(path)
+    for key in list(_template_files):
+        if path is None or os.path.abspath(key) == path:
+            del _template_files[key]
+
+
+def _get_substitutions(
+    site_name: str, phpmyadmin_port: int, wordpress_port: int, database: dict = None
+):
     """
     Generates substitution values based on application parameters.
 
@@ -101,6 +201,7 @@ def _get_substitutions(site_name: str, phpmyadmin_port: int, wordpress_port: int
         site_name (str): Site name to use for substitution.
         phpmyadmin_port (int): phpMyAdmin port to use for substitution.
         wordpress_port (int): WordPress port to use for substitution.
+        database (dict): Shared database settings replacing the per-site database.
     """
     if not site_name or not phpmyadmin_port or not wordpress_port:
         raise ValueError(
@@ -127,4 +228,28 @@ def _get_substitutions(site_name: str, phpmyadmin_port: int, wordpress_port: int
         )
         updated_substitutions[key] = updated_value
 
+    if database is not None:
+        updated_substitutions.update(get_database_substitutions(database))
+
     return updated_substitutions
+
+
+def get_database_substitutions(database: dict) -> dict:
+    """
+    Returns the substitutions pointing a site at its database on the shared server.
+
+    Args:
+        database (dict): Shared database settings from SharedDatabase.create_database.
+    """
+    return {
+        "MYSQL_CONTAINER_NAME": database["host"],
+        "MYSQL_DATABASE": database["name"],
+        "MYSQL_USER": database["user"],
+        "MYSQL_PASSWORD": database["password"],
+        "PMA_HOST": database["host"],
+        "WORDPRESS_DB_NAME": database["name"],
+        "WORDPRESS_DB_USER": database["user"],
+        "WORDPRESS_DB_PASSWORD": database["password"],
+        "WORDPRESS_DB_HOST": database["host"],
+        "SHARED_NETWORK_NAME": database["network"],
+    }
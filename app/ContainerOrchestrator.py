@@ -0,0 +1,110 @@
+import asyncio
+import json
+import time
+
+# docker arguments of every lifecycle action, run inside the site's directory
+ACTIONS = {
+    "up": ("compose", "up", "-d"),
+    "down": ("compose", "down"),
+    "restart": ("compose", "restart"),
+    "status": ("compose", "ps", "--all", "--format", "json"),
+}
+
+
+class ContainerOrchestrator:
+    """
+    Runs `docker compose` for many sites at once.
+
+    Every site is its own compose project, so each action is one docker process per
+    site. The processes run as asyncio subprocesses with at most ``concurrency`` of
+    them in flight, and ``on_progress`` is called as each site finishes.
+    """
+
+    concurrency = None
+    docker = None
+    on_progress = None
+
+    def __init__(self, concurrency: int = 8, docker: str = "docker", on_progress=None):
+        """
+        Args:
+            concurrency (int): Maximum number of docker processes running at once.
+            docker (str): docker executable to run.
+            on_progress (callable): Called with each site's result as it completes.
+        """
+        self.concurrency = concurrency
+        self.docker = docker
+        self.on_progress = on_progress
+
+    def run(self, action: str, sites: list) -> list:
+        """
+        Runs ``action`` for every site and returns one result per site, in the order
+        given, with its return code, output and duration. Status results also list the
+        site's services.
+
+        Args:
+            action (str): One of "up", "down", "restart" or "status".
+            sites (list): (site name, site path) pairs.
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action '{action}'.")
+
+        return asyncio.run(self._run_all(action, sites))
+
+    async def _run_all(self, action: str, sites: list) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *(self._run_site(semaphore, action, name, path) for name, path in sites)
+        )
+
+    async def _run_site(self, semaphore, action: str, name: str, path: str) -> dict:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.docker,
+                    *ACTIONS[action],
+                    cwd=path,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                stdout, stderr = await process.communicate()
+                returncode = process.returncode
+                output = (stdout + stderr).decode(errors="replace")
+            except OSError as e:
+                returncode, stdout, output = 127, b"", str(e)
+
+        result = {
+            "name": name,
+            "action": action,
+            "returncode": returncode,
+            "output": output,
+            "seconds": round(time.perf_counter() - start, 6),
+        }
+        if action == "status":
+            result["services"] = (
+                parse_status(stdout.decode(errors="replace")) if returncode == 0 else []
+            )
+
+        if self.on_progress is not None:
+            self.on_progress(result)
+        return result
+
+
+def parse_status(output: str) -> list:
+    """
+    Parses `docker compose ps --format json` output, which is a JSON array in older
+    Compose releases and one JSON object per line in newer ones.
+    """
+    output = output.strip()
+    try:
+        if output.startswith("["):
+            containers = json.loads(output)
+        else:
+            containers = [json.loads(line) for line in output.splitlines() if line]
+    except ValueError:
+        return []
+
+    return [
+        {"service": container.get("Service"), "state": container.get("State")}
+        for container in containers
+    ]
@@ -0,0 +1,113 @@
+import contextlib
+import json
+import os
+import socket
+import sys
+
+from app.constants import DAEMON_SOCKET
+
+
+class DaemonClient:
+    """
+    Client of the manager daemon's socket.
+
+    Messages are single lines of JSON in both directions, one request per
+    connection. A command's output comes back in frames as it is written to stdout
+    or stderr, followed by the reply carrying its exit code. This module only
+    imports the standard library, so forwarding a command costs no more than
+    starting the interpreter.
+    """
+
+    path = None
+
+    def __init__(self, path: str = DAEMON_SOCKET):
+        self.path = path
+
+    def connect(self, timeout: float = None) -> socket.socket:
+        """
+        Connects to the daemon. Raises OSError when it is not running.
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        try:
+            connection.connect(self.path)
+        except OSError:
+            connection.close()
+            raise
+        return connection
+
+    def request(self, message: dict, connection: socket.socket = None) -> dict:
+        """
+        Sends a message and returns the daemon's reply, over ``connection`` if given.
+        """
+        frames = self.frames(message, connection)
+        with contextlib.closing(frames):
+            return next(frames)
+
+    def frames(self, message: dict, connection: socket.socket = None):
+        """
+        Sends a message and yields the frames the daemon sends back until it closes
+        the connection, over ``connection`` if given.
+        """
+        connection = connection or self.connect()
+        with connection, connection.makefile("rb") as reader:
+            connection.sendall(json.dumps(message).encode() + b"\n")
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("The manager daemon closed the connection")
+            while line:
+                yield json.loads(line)
+                line = reader.readline()
+
+    def ping(self, timeout: float = 1) -> dict:
+        """
+        Returns the daemon's status, or None when it is not running.
+        """
+        try:
+            return self.request({"op": "ping"}, self.connect(timeout))
+        except (OSError, ValueError):
+            return None
+
+    def stop(self) -> bool:
+        try:
+            self.request({"op": "stop"}, self.connect(1))
+        except OSError:
+            return False
+        return True
+
+
+def forward(argv: list, path: str = DAEMON_SOCKET):
+    """
+    Runs a command on the daemon and prints its output. Returns the command's exit
+    code, or None when the daemon is not running, serves another directory or the
+    command needs a terminal, so the caller runs it directly.
+    """
+    # Checked first so the common case without a daemon makes no system call
+    if not os.path.exists(path):
+        return None
+
+    client = DaemonClient(path)
+    try:
+        connection = client.connect()
+    except OSError:
+        return None
+
+    message = {"op": "run", "argv": argv, "env": dict(os.environ), "cwd": os.getcwd()}
+    streams = {"stdout": sys.stdout, "stderr": sys.stderr}
+    # The command may have run already, so failures from here on are not retried
+    try:
+        for frame in client.frames(message, connection):
+            if frame.get("interactive") or frame.get("direct"):
+                return None
+            if "exit_code" in frame:
+                return frame["exit_code"]
+            for name, stream in streams.items():
+                if name in frame:
+                    stream.write(frame[name])
+                    stream.flush()
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"Lost the connection to the manager daemon: {e}\n")
+        return 1
+
+    sys.stderr.write("The manager daemon closed the connection\n")
+    return 1
@@ -0,0 +1,497 @@
+import itertools
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from app.SearchReplace import SearchReplace
+from app.SitePackager import (
+    compression_extension,
+    open_compressed,
+    open_decompressed,
+    throughput,
+)
+from app.Tracer import traced
+
+BUFFER_SIZE = 1024 * 1024
+SCHEMA_SUFFIX = ".schema.sql"
+DATA_SUFFIX = ".data.sql"
+VIEW_SUFFIX = ".view.sql"
+DEFERRED_INDEX = re.compile(r"^\s*(UNIQUE |FULLTEXT |SPATIAL )?KEY ")
+DUMP_SECTION = re.compile(
+    rb"^-- (?P<kind>Table structure|Dumping data|Temporary view structure"
+    rb"|Final view structure) for (table|view) `(?P<table>[^`]+)`$"
+)
+# File each kind of mysqldump section is written to. Temporary view structures are
+# placeholders for views referenced before they are created and are left out.
+SECTION_SUFFIXES = {
+    b"Table structure": SCHEMA_SUFFIX,
+    b"Dumping data": DATA_SUFFIX,
+    b"Temporary view structure": None,
+    b"Final view structure": VIEW_SUFFIX,
+}
+CREATE_TABLE = re.compile(
+    r"CREATE TABLE `(?P<table>[^`]+)` \((?P<body>.*?)\n\)(?P<options>[^;]*);", re.S
+)
+RESTORE_HEADER = b"SET FOREIGN_KEY_CHECKS=0;\nSET UNIQUE_CHECKS=0;\nSET AUTOCOMMIT=0;\n"
+RESTORE_FOOTER = b"\nCOMMIT;\n"
+
+
+class DockerMysqlClient:
+    """
+    Runs mysql and mysqldump inside a site's database container through `docker exec`.
+    Dumps and loads are exposed as binary streams so callers never hold a table in
+    memory.
+    """
+
+    def __init__(self, container: str, database: str, user: str, password: str):
+        self.container = container
+        self.database = database
+        self.user = user
+        self.password = password
+
+    def list_tables(self) -> list:
+        return self._list("BASE TABLE")
+
+    def list_views(self) -> list:
+        return self._list("VIEW")
+
+    @contextmanager
+    def dump(self, table: str, schema: bool):
+        """
+        Yields a readable stream of either the CREATE TABLE statement or the INSERT
+        statements of ``table``.
+        """
+        option = "--no-data" if schema else "--no-create-info"
+        with self._mysqldump(f"Dumping table '{table}'", option, table) as stream:
+            yield stream
+
+    @contextmanager
+    def dump_database(self, tables: list):
+        """
+        Yields a readable stream of the CREATE TABLE and INSERT statements of
+        ``tables``, read in a single transaction. The transaction is open once the
+        stream's first section comment arrives.
+        """
+        with self._mysqldump(
+            "Dumping database", "--skip-add-drop-table", *tables
+        ) as stream:
+            yield stream
+
+    @contextmanager
+    def read_lock(self, tables: list):
+        """
+        Holds a READ lock on ``tables`` from a session of its own while the context
+        is open, blocking every write to them.
+        """
+        process = subprocess.Popen(
+            self._command(
+                "mysql", "--unbuffered", "-N", "-B", self.database, interactive=True
+            ),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=self._environment(),
+        )
+        with _checked(process, "Locking tables"):
+            locks = ", ".join(f"`{table}` READ" for table in tables)
+            process.stdin.write(f"LOCK TABLES {locks};\nSELECT 'locked';\n".encode())
+            process.stdin.flush()
+            if process.stdout.readline().strip() != b"locked":
+                raise RuntimeError(f"Could not lock the tables of '{self.database}'.")
+            yield
+            process.stdin.write(b"UNLOCK TABLES;\n")
+
+    def wait(self, timeout: float = 60) -> None:
+        """
+        Blocks until the server accepts connections, e.g. right after its container
+        was started. Raises RuntimeError after ``timeout`` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            result = subprocess.run(
+                self._command("mysqladmin", "ping", "--silent"),
+                capture_output=True,
+                env=self._environment(),
+            )
+            if result.returncode == 0:
+                return
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Database '{self.container}' is not reachable.")
+            time.sleep(1)
+
+    @contextmanager
+    def load(self):
+        """
+        Yields a writable stream piped into the mysql client.
+        """
+        process = subprocess.Popen(
+            self._command("mysql", self.database, interactive=True),
+            stdin=subprocess.PIPE,
+            env=self._environment(),
+        )
+        with _checked(process, "Loading into database"):
+            yield process.stdin
+
+    def _list(self, table_type: str) -> list:
+        result = subprocess.run(
+            self._command(
+                "mysql",
+                "-N",
+                "-B",
+                "-e",
+                f"SHOW FULL TABLES WHERE Table_type = '{table_type}'",
+                self.database,
+            ),
+            check=True,
+            capture_output=True,
+            env=self._environment(),
+        )
+        return [line.split("\t")[0] for line in result.stdout.decode().splitlines()]
+
+    @contextmanager
+    def _mysqldump(self, action: str, option: str, *tables):
+        process = subprocess.Popen(
+            self._command(
+                "mysqldump",
+                "--single-transaction",
+                "--skip-lock-tables",
+                "--skip-triggers",
+                "--skip-dump-date",
+                # Site users of the shared server lack the PROCESS privilege
+                "--no-tablespaces",
+                option,
+                self.database,
+                *tables,
+            ),
+            stdout=subprocess.PIPE,
+            env=self._environment(),
+        )
+        with _checked(process, action):
+            yield process.stdout
+
+    def _command(self, *args, interactive: bool = False) -> list:
+        # Docker copies the value from our environment, keeping it out of the argv
+        command = ["docker", "exec", "-e", "MYSQL_PWD"]
+        if interactive:
+            command.append("-i")
+        return [*command, self.container, args[0], f"--user={self.user}", *args[1:]]
+
+    def _environment(self) -> dict:
+        return {**os.environ, "MYSQL_PWD": self.password}
+
+
+class DatabasePipeline:
+    """
+    Dumps and restores a database one table at a time, several tables at once.
+
+    Every table is dumped as a compressed schema stream and a compressed data stream,
+    all read from one consistent snapshot. Restores create the tables without their
+    secondary indexes, stream the data in parallel with constraint checks disabled
+    and only then build the deferred indexes, mydumper-style.
+    """
+
+    def __init__(self, client, workers: int = 4):
+        """
+        Args:
+            client (DockerMysqlClient): Client of the database to dump or restore.
+            workers (int): Number of tables processed concurrently.
+        """
+        self.client = client
+        self.workers = workers
+
+    @traced("database.dump", counters=("files", "bytes"))
+    def dump(self, output_dir: str) -> dict:
+        """
+        Dumps the tables split between ``workers`` mysqldump processes running at
+        once, each writing a file per table. Writes to the tables are blocked until
+        every process has opened its transaction, so all of them read the same
+        consistent snapshot.
+        """
+        start = time.perf_counter()
+        os.makedirs(output_dir, exist_ok=True)
+        tables = self.client.list_tables()
+
+        groups = [[] for _ in range(self.workers)]
+        for index, table in enumerate(tables):
+            groups[index % self.workers].append(table)
+        # Views read the tables, so they are created last, by the first process
+        groups[0] += self.client.list_views()
+        groups = [group for group in groups if group]
+
+        with ExitStack() as stack:
+            with self.client.read_lock(tables) if tables else nullcontext():
+                sources = [
+                    stack.enter_context(self.client.dump_database(group))
+                    for group in groups
+                ]
+                headers = [_read_header(source) for source in sources]
+
+            with ThreadPoolExecutor(len(sources) or 1) as executor:
+                results = list(
+                    executor.map(
+                        lambda item: _split_dump(item[0], output_dir, *item[1]),
+                        zip(sources, headers),
+                    )
+                )
+
+        return throughput(
+            sum(files for files, _ in results),
+            sum(written for _, written in results),
+            time.perf_counter() - start,
+        )
+
+    @traced("database.restore", counters=("files", "bytes"))
+    def restore(self, input_dir: str) -> dict:
+        """
+        Restores the tables and views dumped to ``input_dir`` and drops every other
+        table and view, so the database ends up exactly as it was dumped.
+        """
+        start = time.perf_counter()
+        tables = _dumped(input_dir, SCHEMA_SUFFIX)
+        views = _dumped(input_dir, VIEW_SUFFIX)
+        for kind, extra in (
+            ("VIEW", set(self.client.list_views()) - set(views)),
+            ("TABLE", set(self.client.list_tables()) - set(tables)),
+        ):
+            if extra:
+                names = ", ".join(f"`{name}`" for name in sorted(extra))
+                self._execute(f"DROP {kind} IF EXISTS {names};")
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            deferred = list(
+                executor.map(lambda table: self._create_table(table, input_dir), tables)
+            )
+            loaded = sum(
+                executor.map(lambda table: self._load_table(table, input_dir), tables)
+            )
+            list(executor.map(self._execute, [sql for sql in deferred if sql]))
+
+        for view in views:
+            with open_decompressed(_find(input_dir, view, VIEW_SUFFIX)) as source:
+                self._execute(source.read().decode())
+
+        return throughput(len(tables), loaded, time.perf_counter() - start)
+
+    @traced("database.copy", counters=("files", "bytes"))
+    def copy(self, target, replacements: list = None) -> dict:
+        """
+        Copies every table into the ``target`` database by piping each dump straight
+        into the target's client, without writing it to disk. Tables are read in
+        separate transactions, so writes made to the source during the copy may
+        leave the copied tables inconsistent with each other. Views are not copied.
+
+        Args:
+            target (DockerMysqlClient): Client of the database to copy into.
+            replacements (list): (search, replace) string pairs applied to the data on
+                the way, keeping serialized PHP values valid.
+        """
+        start = time.perf_counter()
+        tables = self.client.list_tables()
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            deferred = list(
+                executor.map(lambda table: self._copy_schema(table, target), tables)
+            )
+            copied = sum(
+                executor.map(
+                    lambda table: self._copy_data(table, target, replacements), tables
+                )
+            )
+            list(
+                executor.map(
+                    lambda sql: _execute(target, sql), [sql for sql in deferred if sql]
+                )
+            )
+
+        return throughput(len(tables), copied, time.perf_counter() - start)
+
+    def _create_table(self, table: str, input_dir: str) -> str:
+        """
+        Creates ``table`` without its secondary indexes and returns the ALTER TABLE
+        statement that adds them back.
+        """
+        with open_decompressed(_find(input_dir, table, SCHEMA_SUFFIX)) as source:
+            schema = source.read().decode()
+
+        create_sql, deferred_sql = split_indexes(schema)
+        self._execute(f"DROP TABLE IF EXISTS `{table}`;\n{create_sql}")
+        return deferred_sql
+
+    def _copy_schema(self, table: str, target) -> str:
+        with self.client.dump(table, True) as source:
+            schema = source.read().decode()
+
+        create_sql, deferred_sql = split_indexes(schema)
+        _execute(target, f"DROP TABLE IF EXISTS `{table}`;\n{create_sql}")
+        return deferred_sql
+
+    def _copy_data(self, table: str, target, replacements: list) -> int:
+        with self.client.dump(table, False) as source:
+            with target.load() as destination:
+                destination.write(RESTORE_HEADER)
+                if replacements:
+                    # Tables are already copied in parallel, so rewrite inline
+                    engine = SearchReplace(replacements, workers=1)
+                    copied = engine.process_stream(source, destination)["bytes"]
+                else:
+                    copied = _copy(source, destination)
+                destination.write(RESTORE_FOOTER)
+        return copied
+
+    def _load_table(self, table: str, input_dir: str) -> int:
+        path = _find(input_dir, table, DATA_SUFFIX)
+        if path is None:
+            return 0
+
+        with open_decompressed(path) as source:
+            with self.client.load() as destination:
+                destination.write(RESTORE_HEADER)
+                loaded = _copy(source, destination)
+                destination.write(RESTORE_FOOTER)
+        return loaded
+
+    def _execute(self, sql: str) -> None:
+        _execute(self.client, sql)
+
+
+def split_indexes(schema: str):
+    """
+    Splits a mysqldump schema into the statements creating the table without
+    secondary indexes and the ALTER TABLE statements adding them. The primary key and
+    foreign key constraints stay in the CREATE TABLE statement, as do the statements
+    around it setting the character set. InnoDB builds one FULLTEXT index per
+    statement, so each of them gets an ALTER TABLE statement of its own.
+    """
+    match = CREATE_TABLE.search(schema)
+    if match is None:
+        return schema, None
+
+    columns = []
+    indexes = []
+    for line in match.group("body").strip("\n").split("\n"):
+        definition = line.strip().rstrip(",")
+        if DEFERRED_INDEX.match(line):
+            indexes.append(definition)
+        else:
+            columns.append(definition)
+
+    table = match.group("table")
+    start, end = match.span()
+    create_sql = (
+        schema[:start]
+        + f"CREATE TABLE `{table}` (\n  "
+        + ",\n  ".join(columns)
+        + f"\n){match.group('options')};"
+        + schema[end:]
+    )
+    if not create_sql.endswith("\n"):
+        create_sql += "\n"
+    if not indexes:
+        return create_sql, None
+
+    fulltext = [index for index in indexes if index.startswith("FULLTEXT ")]
+    others = [index for index in indexes if not index.startswith("FULLTEXT ")]
+    groups = ([others] if others else []) + [[index] for index in fulltext]
+    deferred_sql = "".join(
+        f"ALTER TABLE `{table}` " + ", ".join(f"ADD {index}" for index in group) + ";\n"
+        for group in groups
+    )
+    return create_sql, deferred_sql
+
+
+def _read_header(source) -> tuple:
+    """
+    Reads a mysqldump stream up to its first section. Returns the dump's header and
+    the first section's comment line, or None when the stream has no sections.
+    """
+    header = b""
+    # mysqldump escapes line breaks in values, so section comments are never data
+    for line in source:
+        if DUMP_SECTION.match(line.rstrip(b"\n")):
+            return header, line
+        header += line
+    return header, None
+
+
+def _split_dump(source, output_dir: str, header: bytes, first_line: bytes) -> tuple:
+    """
+    Writes each section of a mysqldump stream to its own compressed schema, data or
+    view file. The dump's header, which sets the connection's character set and SQL
+    mode, is repeated at the top of every file. Returns the number of tables and
+    views and the number of bytes written.
+    """
+    if first_line is None:
+        return 0, 0
+
+    names = set()
+    written = 0
+    destination = None
+    try:
+        for line in itertools.chain([first_line], source):
+            match = DUMP_SECTION.match(line.rstrip(b"\n"))
+            if match is not None:
+                if destination is not None:
+                    destination.close()
+                    destination = None
+                suffix = SECTION_SUFFIXES[match.group("kind")]
+                if suffix is None:
+                    continue
+                name = match.group("table").decode()
+                destination = open_compressed(
+                    os.path.join(output_dir, f"{name}{suffix}.{compression_extension()}")
+                )
+                destination.write(header)
+                names.add(name)
+            elif destination is not None:
+                destination.write(line)
+                written += len(line)
+    finally:
+        if destination is not None:
+            destination.close()
+
+    return len(names), written
+
+
+@contextmanager
+def _checked(process: subprocess.Popen, action: str):
+    try:
+        yield
+    finally:
+        for stream in (process.stdin, process.stdout):
+            if stream is not None:
+                stream.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise RuntimeError(f"{action} failed with exit code {returncode}")
+
+
+def _execute(client, sql: str) -> None:
+    with client.load() as destination:
+        destination.write(b"SET FOREIGN_KEY_CHECKS=0;\n" + sql.encode())
+
+
+def _copy(source, destination) -> int:
+    copied = 0
+    while True:
+        data = source.read(BUFFER_SIZE)
+        if not data:
+            return copied
+        destination.write(data)
+        copied += len(data)
+
+
+def _dumped(input_dir: str, suffix: str) -> list:
+    return sorted(
+        name.split(suffix)[0] for name in os.listdir(input_dir) if suffix in name
+    )
+
+
+def _find(input_dir: str, table: str, suffix: str) -> str:
+    for extension in ("zst", "gz"):
+        path = os.path.join(input_dir, f"{table}{suffix}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
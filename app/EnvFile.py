@@ -0,0 +1,160 @@
+import os
+import re
+
+from app.AtomicFile import write_if_changed
+
+ASSIGNMENT = re.compile(
+    r"^(?P<export>\s*(?:export\s+)?)(?P<key>[A-Za-z_][\w.]*)\s*=(?P<value>.*)$"
+)
+NEEDS_QUOTES = re.compile(r"[\s#'\"\\]")
+ESCAPE = re.compile(r"\\(.)")
+INLINE_COMMENT = re.compile(r"\s+#")
+
+# Parsed files by absolute path: (inode, mtime_ns, size, lines, trailing newline).
+# Writes replace the file, so a new inode catches rewrites within one mtime tick.
+_cache = {}
+
+
+class EnvFile:
+    """
+    A .env file parsed once into its lines and an index of variable positions.
+
+    Lookups and updates go through the index, while comments, blank lines and the
+    formatting of untouched variables are written back exactly as they were read.
+    Parsed files are cached by mtime, and saving rewrites the file atomically and only
+    when its contents changed.
+    """
+
+    path = None
+
+    def __init__(self, path: str):
+        self.path = path
+        self._load()
+
+    def get(self, key: str, default: str = None) -> str:
+        return self._values.get(key, default)
+
+    def get_many(self, keys: list) -> dict:
+        return {key: self._values.get(key) for key in keys}
+
+    def values(self) -> dict:
+        return dict(self._values)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._values
+
+    def set(self, key: str, value) -> None:
+        self.update({key: value})
+
+    def update(self, properties: dict) -> None:
+        """
+        Sets every property, replacing existing variables in place and appending new
+        ones in order.
+        """
+        for key, value in properties.items():
+            value = "" if value is None else str(value)
+            index = self._index.get(key)
+            if index is None:
+                self._index[key] = len(self._lines)
+                self._lines.append(f"{key}={_format(value)}")
+            else:
+                export = ASSIGNMENT.match(self._lines[index]).group("export")
+                self._lines[index] = f"{export}{key}={_format(value)}"
+            self._values[key] = value
+
+    def delete(self, *keys: str) -> None:
+        """
+        Removes every occurrence of the given variables.
+        """
+        keys = set(keys) & set(self._values)
+        if not keys:
+            return
+
+        self._lines = [line for line in self._lines if _parse(line)[0] not in keys]
+        for key in keys:
+            del self._values[key]
+        self._reindex()
+
+    def save(self) -> bool:
+        """
+        Writes the file if it changed. Returns whether it was written.
+        """
+        content = "\n".join(self._lines)
+        if self._trailing_newline and self._lines:
+            content += "\n"
+        return write_if_changed(self.path, content)
+
+    def _load(self) -> None:
+        path = os.path.abspath(self.path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            lines, trailing_newline = (), False
+        else:
+            cached = _cache.get(path)
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if cached is not None and cached[:3] == key:
+                lines, trailing_newline = cached[3:]
+            else:
+                with open(path, "r") as file:
+                    content = file.read()
+                lines = tuple(content.splitlines())
+                trailing_newline = content.endswith("\n")
+                _cache[path] = (*key, lines, trailing_newline)
+
+        self._lines = list(lines)
+        self._trailing_newline = trailing_newline
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._index = {}
+        self._values = {}
+        for index, line in enumerate(self._lines):
+            key, value = _parse(line)
+            if key is not None:
+                # Like dotenv, the last assignment of a variable wins
+                self._index[key] = index
+                self._values[key] = value
+
+
+def _parse(line: str) -> tuple:
+    """
+    Returns the variable name and value assigned by ``line``, or (None, None) for
+    comments, blank lines and anything else that isn't an assignment.
+    """
+    match = ASSIGNMENT.match(line)
+    if match is None:
+        return None, None
+
+    value = match.group("value").strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        quote = value[0]
+        value = value[1:-1]
+        if quote == '"':
+            value = ESCAPE.sub(_unescape, value)
+    else:
+        value = INLINE_COMMENT.split(value, maxsplit=1)[0]
+
+    return match.group("key"), value
+
+
+def _unescape(match: re.Match) -> str:
+    return "\n" if match.group(1) == "n" else match.group(1)
+
+
+def _format(value: str) -> str:
+    if not NEEDS_QUOTES.search(value):
+        return value
+
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def invalidate(path: str = None) -> None:
+    """
+    Drops the parsed contents of ``path`` from the cache, or of every file.
+    """
+    if path is None:
+        _cache.clear()
+    else:
+        _cache.pop(os.path.abspath(path), None)
@@ -0,0 +1,65 @@
+import fcntl
+import os
+import threading
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+class _LockState:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.fd = None
+        self.depth = 0
+
+
+class FileLock:
+    """
+    Exclusive advisory lock on a file, shared between processes through flock(2).
+
+    The lock is re-entrant within a process: nested ``with FileLock(path)`` blocks on the
+    same path only take the underlying flock once, and threads of the same process are
+    serialized on it as well.
+    """
+
+    path = None
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+
+    def __enter__(self):
+        state = _get_state(self.path)
+        state.lock.acquire()
+
+        if state.depth == 0:
+            try:
+                directory = os.path.dirname(self.path)
+                os.makedirs(directory, exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except Exception:
+                state.lock.release()
+                raise
+            state.fd = fd
+
+        state.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        state = _get_state(self.path)
+        state.depth -= 1
+
+        if state.depth == 0:
+            fcntl.flock(state.fd, fcntl.LOCK_UN)
+            os.close(state.fd)
+            state.fd = None
+
+        state.lock.release()
+        return False
+
+
+def _get_state(path: str) -> _LockState:
+    with _states_lock:
+        if path not in _states:
+            _states[path] = _LockState()
+        return _states[path]
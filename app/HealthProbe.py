@@ -0,0 +1,148 @@
+import asyncio
+import math
+import time
+
+# Bytes read from a response, enough for the status line and headers
+READ_SIZE = 64 * 1024
+
+
+class HealthProbe:
+    """
+    Probes the HTTP endpoints of many sites at once.
+
+    Every endpoint is probed in its own asyncio task over a plain socket, so probing
+    all sites takes about as long as the slowest endpoint, bounded by ``timeout``.
+    Each probe records the status code, the time to first byte and the time until
+    the server closed the response.
+    """
+
+    timeout = None
+    samples = None
+    concurrency = None
+    host = None
+
+    def __init__(
+        self,
+        timeout: float = 5,
+        samples: int = 1,
+        concurrency: int = 256,
+        host: str = "127.0.0.1",
+    ):
+        """
+        Args:
+            timeout (float): Seconds before a request counts as failed.
+            samples (int): Requests sent to every endpoint, one after another.
+            concurrency (int): Maximum number of requests in flight.
+            host (str): Address the sites' ports are published on.
+        """
+        self.timeout = timeout
+        self.samples = samples
+        self.concurrency = concurrency
+        self.host = host
+
+    def probe(self, endpoints: list) -> list:
+        """
+        Probes every endpoint and returns one summary per endpoint, in the order
+        given. See ``summarize`` for the fields.
+
+        Args:
+            endpoints (list): (site name, service, port) tuples.
+        """
+        return asyncio.run(self._probe_all(endpoints))
+
+    async def _probe_all(self, endpoints: list) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *(self._probe_endpoint(semaphore, *endpoint) for endpoint in endpoints)
+        )
+
+    async def _probe_endpoint(self, semaphore, name: str, service: str, port) -> dict:
+        samples = []
+        for _ in range(self.samples):
+            async with semaphore:
+                samples.append(await self.request(port))
+        return summarize(name, service, port, samples)
+
+    async def request(self, port: int) -> dict:
+        """
+        Sends one GET request to ``port`` and returns its status code, time to first
+        byte and total time, or the error that made it fail.
+        """
+        start = time.perf_counter()
+        sample = {"status": None, "ttfb": None, "total": None, "error": None}
+        try:
+            await asyncio.wait_for(self._get(port, start, sample), self.timeout)
+        except asyncio.TimeoutError:
+            sample["error"] = f"timed out after {self.timeout}s"
+        except (OSError, ValueError) as e:
+            sample["error"] = str(e) or type(e).__name__
+        else:
+            sample["total"] = time.perf_counter() - start
+        return sample
+
+    async def _get(self, port: int, start: float, sample: dict) -> None:
+        reader, writer = await asyncio.open_connection(self.host, port)
+        try:
+            writer.write(
+                f"GET / HTTP/1.1\r\nHost: localhost:{port}\r\n"
+                "User-Agent: cms-manager-health\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+
+            response = await reader.read(READ_SIZE)
+            sample["ttfb"] = time.perf_counter() - start
+            if not response:
+                raise ValueError("Connection closed without a response.")
+            sample["status"] = parse_status_code(response)
+
+            while await reader.read(READ_SIZE):
+                pass
+        finally:
+            writer.close()
+
+
+def parse_status_code(response: bytes) -> int:
+    """
+    Returns the status code of the HTTP status line starting ``response``.
+    """
+    status_line = response.split(b"\r\n", 1)[0].split()
+    if len(status_line) < 2 or not status_line[0].startswith(b"HTTP/"):
+        raise ValueError("Invalid HTTP response.")
+    return int(status_line[1])
+
+
+def summarize(name: str, service: str, port: int, samples: list) -> dict:
+    """
+    Summarizes the samples of one endpoint. The endpoint is up when every sample got
+    a response below 500. Latencies are in seconds, over the successful samples.
+    """
+    responded = [sample for sample in samples if sample["error"] is None]
+    ttfb = [sample["ttfb"] for sample in responded]
+    total = [sample["total"] for sample in responded]
+    errors = [sample["error"] for sample in samples if sample["error"] is not None]
+    up = bool(samples) and not errors and all(s["status"] < 500 for s in responded)
+    return {
+        "name": name,
+        "service": service,
+        "port": port,
+        "up": up,
+        "status": samples[-1]["status"] if samples else None,
+        "error": errors[0] if errors else None,
+        "samples": len(samples),
+        "ttfb_p50": percentile(ttfb, 50),
+        "ttfb_p95": percentile(ttfb, 95),
+        "total_p50": percentile(total, 50),
+        "total_p95": percentile(total, 95),
+    }
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Returns the nearest-rank percentile of ``values``, or None when there are none.
+    """
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
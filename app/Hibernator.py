@@ -0,0 +1,280 @@
+import asyncio
+import contextlib
+import os
+import time
+
+from app.AtomicFile import write_if_changed
+from app.HealthProbe import HealthProbe
+from app.constants import COMPOSE_FILE, HIBERNATE_FILE, HIBERNATE_PORT_OFFSET
+
+BUFFER_SIZE = 64 * 1024
+
+# Compose service publishing each of the ports allocated to a site
+SERVICES = {"wordpress": "wordpress", "phpmyadmin": "phpmyadmin"}
+
+
+class SiteProxy:
+    """
+    TCP proxy standing in for a hibernated site.
+
+    It listens on the site's public ports and forwards every connection to the
+    matching backend port. The first connection to a stopped site starts its
+    containers and is held until the backend answers HTTP requests. Once no
+    connection has been open for ``idle_timeout`` seconds, the containers are
+    stopped again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ports: dict,
+        start,
+        stop,
+        idle_timeout: float = 900,
+        ready_timeout: float = 120,
+        host: str = "0.0.0.0",
+        on_event=None,
+    ):
+        """
+        Args:
+            name (str): Site name.
+            ports (dict): Backend port of every public port.
+            start (callable): Coroutine function starting the site's containers.
+            stop (callable): Coroutine function stopping the site's containers.
+            idle_timeout (float): Seconds without connections before stopping.
+            ready_timeout (float): Seconds to wait for a started site to answer
+                HTTP requests.
+            host (str): Address the public ports are bound to.
+            on_event (callable): Called with the site name and "woke" or "hibernated".
+        """
+        self.name = name
+        self.ports = ports
+        self.start = start
+        self.stop = stop
+        self.idle_timeout = idle_timeout
+        self.ready_timeout = ready_timeout
+        self.host = host
+        self.on_event = on_event
+        self.running = False
+        self.connections = 0
+        self.last_activity = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._servers = []
+
+    async def listen(self) -> None:
+        for public_port, backend_port in self.ports.items():
+            server = await asyncio.start_server(
+                lambda reader, writer, port=backend_port: self._handle(
+                    reader, writer, port
+                ),
+                self.host,
+                public_port,
+            )
+            self._servers.append(server)
+
+    async def watch(self, interval: float = None) -> None:
+        """
+        Stops the site whenever it has been idle for longer than the idle timeout.
+        """
+        interval = interval or max(self.idle_timeout / 10, 0.05)
+        while True:
+            await asyncio.sleep(interval)
+            async with self._lock:
+                idle = time.monotonic() - self.last_activity
+                if self.running and not self.connections and idle >= self.idle_timeout:
+                    await self.stop()
+                    self.running = False
+                    self._notify("hibernated")
+
+    async def close(self) -> None:
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+    async def _handle(self, reader, writer, backend_port: int) -> None:
+        self.connections += 1
+        self.last_activity = time.monotonic()
+        try:
+            await self._wake(backend_port)
+            backend_reader, backend_writer = await asyncio.open_connection(
+                "127.0.0.1", backend_port
+            )
+            await asyncio.gather(
+                self._pipe(reader, backend_writer), self._pipe(backend_reader, writer)
+            )
+        except (OSError, RuntimeError):
+            writer.close()
+        finally:
+            self.connections -= 1
+            self.last_activity = time.monotonic()
+
+    async def _wake(self, backend_port: int) -> None:
+        # Connections arriving while the site starts all wait on the same lock
+        async with self._lock:
+            if self.running:
+                return
+
+            await self.start()
+            await _wait_until_ready(backend_port, self.ready_timeout)
+            self.running = True
+            self._notify("woke")
+
+    async def _pipe(self, reader, writer) -> None:
+        try:
+            while True:
+                data = await reader.read(BUFFER_SIZE)
+                if not data:
+                    break
+                self.last_activity = time.monotonic()
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    def _notify(self, event: str) -> None:
+        if self.on_event is not None:
+            self.on_event(self.name, event)
+
+
+class Hibernator:
+    """
+    Hibernates sites by running them behind SiteProxy instances.
+
+    Hibernated sites publish their containers on backend ports (public port plus
+    HIBERNATE_PORT_OFFSET, bound to localhost) through a compose override file, so
+    the proxy can own the public ports. The override replaces the port lists with
+    Compose's ``!override`` tag, which needs Docker Compose 2.24.4 or newer.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 900,
+        docker: str = "docker",
+        host: str = "0.0.0.0",
+        on_event=None,
+    ):
+        """
+        Args:
+            idle_timeout (float): Seconds without connections before a site is stopped.
+            docker (str): docker executable to run.
+            host (str): Address the public ports are bound to.
+            on_event (callable): Called with a site name and "woke" or "hibernated".
+        """
+        self.idle_timeout = idle_timeout
+        self.docker = docker
+        self.host = host
+        self.on_event = on_event
+
+    def serve(self, sites: list) -> None:
+        """
+        Stops every site and proxies its ports until interrupted. On the way out, the
+        override files are removed and the sites that are awake are recreated on
+        their public ports.
+
+        Args:
+            sites (list): (site name, site path, ports) tuples, with ports as
+                registered for the site.
+        """
+        asyncio.run(self._serve(sites))
+
+    async def _serve(self, sites: list) -> None:
+        proxies = []
+        for name, path, ports in sites:
+            write_override(path, ports)
+            await self._compose(path, "stop")
+            proxy = SiteProxy(
+                name,
+                {port: backend_port(port) for port in ports.values() if port},
+                lambda path=path: self._compose(
+                    path, "-f", COMPOSE_FILE, "-f", HIBERNATE_FILE, "up", "-d"
+                ),
+                lambda path=path: self._compose(path, "stop"),
+                self.idle_timeout,
+                host=self.host,
+                on_event=self.on_event,
+            )
+            await proxy.listen()
+            proxies.append(proxy)
+
+        try:
+            await asyncio.gather(*(proxy.watch() for proxy in proxies))
+        finally:
+            for proxy in proxies:
+                await proxy.close()
+            await self._restore(sites, proxies)
+
+    async def _restore(self, sites: list, proxies: list) -> None:
+        awake = {proxy.name for proxy in proxies if proxy.running}
+        for _, path, _ in sites:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(path, HIBERNATE_FILE))
+
+        # Without the override, compose binds the public ports again
+        results = await asyncio.gather(
+            *(
+                self._compose(path, "up", "-d")
+                for name, path, _ in sites
+                if name in awake
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def _compose(self, path: str, *args) -> None:
+        process = await asyncio.create_subprocess_exec(
+            self.docker,
+            "compose",
+            *args,
+            cwd=path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"docker compose {' '.join(args)} failed in '{path}': "
+                + stderr.decode(errors="replace").strip()
+            )
+
+
+def backend_port(port: int) -> int:
+    return port + HIBERNATE_PORT_OFFSET
+
+
+def write_override(site_path: str, ports: dict) -> None:
+    """
+    Writes the compose override publishing the site's services on their backend
+    ports, reachable from localhost only.
+    """
+    lines = ["services:"]
+    for key, service in SERVICES.items():
+        if ports.get(key):
+            lines += [
+                f"  {service}:",
+                "    ports: !override",
+                f'      - "127.0.0.1:{backend_port(ports[key])}:80"',
+            ]
+
+    write_if_changed(os.path.join(site_path, HIBERNATE_FILE), "\n".join(lines) + "\n")
+
+
+async def _wait_until_ready(port: int, timeout: float) -> None:
+    """
+    Waits until the server on ``port`` answers a GET request with a status below 500.
+    An open port proves nothing: Docker's proxy accepts connections as soon as the
+    container starts, before Apache or PHP can serve them.
+    """
+    deadline = time.monotonic() + timeout
+    probe = HealthProbe(timeout=min(timeout, 5))
+    while True:
+        sample = await probe.request(port)
+        if sample["error"] is None and sample["status"] < 500:
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Port {port} was not ready within {timeout}s.")
+        await asyncio.sleep(0.2)
@@ -0,0 +1,177 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+
+EVENT = struct.Struct("iIII")
+READ_SIZE = 1024 * 1024
+
+_libc = None
+
+
+class Inotify:
+    """
+    Minimal inotify binding over ctypes, watching directory trees.
+
+    Every directory gets its own watch, so the tree is walked once when it is added.
+    Directories created or moved into the tree later are watched as their events
+    arrive, and watches of directories moved out of the tree are dropped.
+    """
+
+    fd = None
+
+    def __init__(self):
+        self.fd = _check(_load_libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+        self.paths = {}
+
+    def add_tree(self, root: str, ignore=None) -> list:
+        """
+        Watches ``root`` and every directory below it, and returns the regular files
+        found on the way.
+
+        Args:
+            root (str): Directory to watch.
+            ignore (callable): Called with an entry name, skips the entry when true.
+        """
+        files = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            if not self.add_watch(directory):
+                continue
+            try:
+                entries = list(os.scandir(directory))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            for entry in entries:
+                if ignore is not None and ignore(entry.name):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry.path)
+        return files
+
+    def add_watch(self, path: str) -> bool:
+        """
+        Watches a directory. Returns False when it no longer exists.
+        """
+        wd = _load_libc().inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            if error == errno.ENOSPC:
+                raise RuntimeError(
+                    "Out of inotify watches, raise fs.inotify.max_user_watches"
+                )
+            raise OSError(error, os.strerror(error), path)
+
+        self.paths[wd] = path
+        return True
+
+    def remove_tree(self, root: str) -> None:
+        """
+        Stops watching ``root`` and every directory below it.
+        """
+        prefix = f"{root}/"
+        for wd, path in list(self.paths.items()):
+            if path == root or path.startswith(prefix):
+                del self.paths[wd]
+                # Fails harmlessly when the kernel already dropped the watch
+                _load_libc().inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float = None) -> list:
+        """
+        Waits up to ``timeout`` seconds for events and returns every pending one as
+        (path, mask) pairs. Overflows of the kernel queue are returned with a None
+        path.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return events
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                start = offset + EVENT.size
+                offset = start + length
+                name = data[start:offset].rstrip(b"\0")
+
+                if mask & IN_Q_OVERFLOW:
+                    events.append((None, mask))
+                    continue
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+
+                directory = self.paths.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                events.append((path, mask))
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.paths = {}
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            libc.inotify_init1
+        except (OSError, AttributeError, TypeError) as e:
+            raise RuntimeError("inotify is only available on Linux") from e
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def _check(result: int) -> int:
+    if result < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+    return result
@@ -0,0 +1,356 @@
+import fnmatch
+import os
+import threading
+import time
+
+from app.Inotify import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_DELETE_SELF,
+    IN_ISDIR,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    Inotify,
+)
+from app.SitePackager import throughput
+from app.Tracer import traced
+
+WRITE = "write"
+REMOVE = "remove"
+REMOVE_TREE = "remove_tree"
+PART_SUFFIX = ".part"
+# Editor swap and backup files, and version control metadata
+IGNORE_PATTERNS = (".git", ".svn", "*.swp", "*.swx", "*~", ".#*", "4913", "*.part")
+
+
+class ChangeBatcher:
+    """
+    Coalesces file system changes into batches.
+
+    Changes are keyed by path, so a file written a hundred times in a burst is pushed
+    once, and removing a directory drops the pending changes below it. A batch is
+    released once no change arrived for ``debounce`` seconds, or ``max_delay`` seconds
+    after its first change, so a steady stream of events still gets pushed.
+    """
+
+    def __init__(self, debounce: float = 0.2, max_delay: float = 2.0):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.pending = {}
+        self.events = 0
+        self._first = None
+        self._last = None
+        self._condition = threading.Condition()
+
+    def add(self, path: str, operation: str) -> None:
+        with self._condition:
+            if operation == REMOVE_TREE:
+                prefix = f"{path}/"
+                for pending in [key for key in self.pending if key.startswith(prefix)]:
+                    del self.pending[pending]
+
+            self.pending[path] = operation
+            self.events += 1
+            self._last = time.monotonic()
+            if self._first is None:
+                self._first = self._last
+            self._condition.notify()
+
+    def take(self, timeout: float = None) -> dict:
+        """
+        Waits for the next batch and returns it as a {path: operation} dict, or an
+        empty dict once ``timeout`` seconds passed without a batch.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.pending:
+                    ready = min(self._last + self.debounce, self._first + self.max_delay)
+                    if now >= ready:
+                        batch, self.pending = self.pending, {}
+                        self._first = self._last = None
+                        return batch
+                    wait = ready - now
+                else:
+                    wait = None
+
+                if deadline is not None:
+                    if now >= deadline:
+                        return {}
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._condition.wait(wait)
+
+
+class LiveSync:
+    """
+    Mirrors local edits of a directory to a remote one as they happen.
+
+    The tree is walked once at startup to watch its directories with inotify. From
+    then on, only the paths named by events are looked at: written and moved-in files
+    are uploaded, removed files and directories are deleted remotely. Events are
+    read by a dedicated thread, so the kernel queue keeps draining while a batch is
+    pushed over the single persistent transport.
+
+    The size and mtime of every file are remembered as of its last upload, or as of
+    startup for files the remote is assumed to have already. If the kernel queue
+    overflowed and events were lost, the tree is walked again and only the files
+    that differ from that state are pushed, and the ones gone are removed.
+    """
+
+    transport_factory = None
+    local_dir = None
+    remote_dir = None
+
+    def __init__(
+        self,
+        transport_factory,
+        local_dir: str,
+        remote_dir: str,
+        debounce: float = 0.2,
+        max_delay: float = 2.0,
+        ignore: tuple = IGNORE_PATTERNS,
+    ):
+        """
+        Args:
+            transport_factory (callable): Opens the transport to the remote server.
+            local_dir (str): Directory to watch.
+            remote_dir (str): Directory the changes are pushed to.
+            debounce (float): Seconds without events before a batch is pushed.
+            max_delay (float): Upper bound in seconds on how long a change waits.
+            ignore (tuple): Name patterns of files and directories to leave out.
+        """
+        self.transport_factory = transport_factory
+        self.local_dir = os.path.abspath(local_dir)
+        self.remote_dir = remote_dir.rstrip("/")
+        self.ignore = ignore
+        self.batcher = ChangeBatcher(debounce, max_delay)
+        self.stats = {"batches": 0, "files": 0, "removed": 0, "bytes": 0, "overflows": 0}
+        self._inotify = None
+        self._transport = None
+        self._directories = set()
+        self._synced = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._ready = threading.Event()
+
+    def run(self, on_batch=None) -> dict:
+        """
+        Watches the directory and pushes its changes until stop() is called, then
+        returns the totals.
+
+        Args:
+            on_batch (callable): Called with the statistics of every pushed batch.
+        """
+        if not os.path.isdir(self.local_dir):
+            raise FileNotFoundError(f"Folder '{self.local_dir}' not found.")
+
+        self._inotify = Inotify()
+        reader = threading.Thread(target=self._read_events, daemon=True)
+        try:
+            files = self._inotify.add_tree(self.local_dir, self._ignored)
+            with self._lock:
+                for file in files:
+                    if file not in self._synced:
+                        self._synced[file] = _state(file)
+            reader.start()
+            self._ready.set()
+            while not self._stopped.is_set():
+                batch = self.batcher.take(timeout=0.5)
+                if batch:
+                    stats = self.push(batch)
+                    if on_batch is not None:
+                        on_batch(stats)
+        finally:
+            self._stopped.set()
+            if reader.is_alive():
+                reader.join()
+            self._inotify.close()
+            self.close()
+
+        return self.stats
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """
+        Waits until the directory is watched, so later changes are not missed.
+        """
+        return self._ready.wait(timeout)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def sync_all(self) -> dict:
+        """
+        Pushes every file of the directory, e.g. before watching it.
+        """
+        batch = {}
+        for root, directories, names in os.walk(self.local_dir):
+            directories[:] = [name for name in directories if not self._ignored(name)]
+            for name in names:
+                if not self._ignored(name):
+                    batch[os.path.join(root, name)] = WRITE
+        return self.push(batch)
+
+    @traced("sync.push", counters=("files", "bytes"))
+    def push(self, batch: dict) -> dict:
+        """
+        Applies a batch of changes to the remote directory. Removals go first, so a
+        path replaced within the batch ends up with its new content. Files already
+        gone locally are skipped, their removal event follows.
+        """
+        start = time.perf_counter()
+        files, removed, sent = 0, 0, 0
+        order = {REMOVE_TREE: 0, REMOVE: 1, WRITE: 2}
+
+        for path, operation in sorted(batch.items(), key=lambda item: order[item[1]]):
+            remote_path = self._remote_path(path)
+            if operation == WRITE:
+                size = self._with_transport(self._upload, path, remote_path)
+                if size is not None:
+                    files, sent = files + 1, sent + size
+            else:
+                self._with_transport(self._remove, remote_path, operation)
+                self._forget(path, operation)
+                removed += 1
+
+        stats = throughput(files, sent, time.perf_counter() - start)
+        stats["removed"] = removed
+        # The reader thread counts overflows in the same dict
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["files"] += files
+            self.stats["removed"] += removed
+            self.stats["bytes"] += sent
+        return stats
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _read_events(self) -> None:
+        while not self._stopped.is_set():
+            for path, mask in self._inotify.read(timeout=0.5):
+                self._handle(path, mask)
+
+    def _handle(self, path: str, mask: int) -> None:
+        if path is None:
+            self._resync()
+            return
+
+        if self._ignored(os.path.basename(path)) or path == self.local_dir:
+            return
+
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # Files may have landed in it before it was watched
+                for file in self._inotify.add_tree(path, self._ignored):
+                    self.batcher.add(file, WRITE)
+            elif mask & IN_MOVED_FROM:
+                self._inotify.remove_tree(path)
+                self.batcher.add(path, REMOVE_TREE)
+            elif mask & IN_DELETE:
+                self.batcher.add(path, REMOVE_TREE)
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self.batcher.add(path, WRITE)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self.batcher.add(path, REMOVE)
+        elif mask & IN_DELETE_SELF:
+            self.batcher.add(path, REMOVE_TREE)
+
+    def _resync(self) -> None:
+        """
+        Queues the changes lost to an overflow of the kernel queue, by comparing the
+        tree against the state it was last synced in.
+        """
+        files = self._inotify.add_tree(self.local_dir, self._ignored)
+        with self._lock:
+            self.stats["overflows"] += 1
+            synced = dict(self._synced)
+
+        for file in files:
+            if synced.get(file) != _state(file):
+                self.batcher.add(file, WRITE)
+        for file in set(synced) - set(files):
+            self.batcher.add(file, REMOVE)
+
+    def _forget(self, path: str, operation: str) -> None:
+        prefix = f"{path}/"
+        with self._lock:
+            self._synced.pop(path, None)
+            if operation == REMOVE_TREE:
+                for file in [key for key in self._synced if key.startswith(prefix)]:
+                    del self._synced[file]
+
+    def _upload(self, transport, path: str, remote_path: str):
+        state = _state(path)
+        if state is None:
+            return None
+
+        directory = os.path.dirname(remote_path)
+        if directory not in self._directories:
+            transport.makedirs(directory)
+            self._directories.add(directory)
+
+        # Uploaded next to the file and renamed, so it is never served half-written
+        part_path = f"{remote_path}{PART_SUFFIX}"
+        try:
+            transport.put(path, part_path)
+        except FileNotFoundError:
+            if os.path.exists(path):
+                raise
+            return None
+        transport.rename(part_path, remote_path)
+        with self._lock:
+            self._synced[path] = state
+        return state[0]
+
+    def _remove(self, transport, remote_path: str, operation: str) -> None:
+        if operation == REMOVE_TREE:
+            transport.remove_tree(remote_path)
+            prefix = f"{remote_path}/"
+            self._directories = {
+                directory
+                for directory in self._directories
+                if directory != remote_path and not directory.startswith(prefix)
+            }
+            return
+
+        try:
+            transport.remove(remote_path)
+        except FileNotFoundError:
+            pass
+
+    def _with_transport(self, operation, *args):
+        """
+        Runs an operation on the persistent transport, reconnecting once if the
+        connection dropped.
+        """
+        for attempt in range(2):
+            if self._transport is None:
+                self._transport = self.transport_factory()
+            try:
+                return operation(self._transport, *args)
+            except (OSError, EOFError):
+                self.close()
+                self._directories = set()
+                if attempt == 1:
+                    raise
+
+    def _remote_path(self, path: str) -> str:
+        return f"{self.remote_dir}/{os.path.relpath(path, self.local_dir)}"
+
+    def _ignored(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+
+def _state(path: str):
+    """
+    Returns the (size, mtime) of a file, or None if it is gone.
+    """
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return file_stat.st_size, file_stat.st_mtime_ns
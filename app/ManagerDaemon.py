@@ -0,0 +1,384 @@
+import contextlib
+import io
+import json
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+import click
+
+from app import ConfigHelper, EnvFile
+from app.DaemonClient import DaemonClient
+from app.Inotify import (
+    IN_CREATE,
+    IN_DELETE,
+    IN_ISDIR,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    Inotify,
+)
+from app.SiteManager import SiteManager
+from app.constants import (
+    DAEMON_LOG,
+    DAEMON_SOCKET,
+    REGISTRY_FILE,
+    SHARED_TEMPLATES_DIR,
+    SITES_DIR,
+    TEMPLATES_DIR,
+)
+
+
+class ManagerDaemon:
+    """
+    Long-running process serving the CLI's commands from a warm SiteManager.
+
+    Commands arrive over a Unix domain socket as the argv, environment and working
+    directory they were called with and run in-process against a manager whose
+    modules, registry and .env and template caches stay loaded between calls. Their
+    output is streamed back as it is written. Commands run one at a time, as the
+    manager's state is shared. Changes made behind the daemon's back, by direct CLI
+    calls or editors, are picked up through inotify: the registry is reloaded after
+    it is rewritten and cached .env files and templates are dropped when they
+    change. Without inotify, the registry is reloaded before every command.
+    """
+
+    cli = None
+    path = None
+    manager = None
+
+    def __init__(self, cli, path: str = DAEMON_SOCKET, manager: SiteManager = None):
+        """
+        Args:
+            cli (click.Group): Command group the requests are dispatched to.
+            path (str): Path of the socket to listen on.
+            manager (SiteManager): Manager the commands run against.
+        """
+        self.cli = cli
+        self.path = path
+        self.manager = manager or SiteManager(initialize_ports=False)
+        self.stats = {"pid": os.getpid(), "started": time.time(), "requests": 0}
+        self._lock = threading.Lock()
+        self._server = None
+        self._inotify = None
+        self._registry_stale = False
+        self._stopped = threading.Event()
+
+    def serve(self, on_ready=None) -> None:
+        """
+        Listens on the socket until a stop request arrives.
+
+        Args:
+            on_ready (callable): Called once the socket accepts connections.
+        """
+        if DaemonClient(self.path).ping() is not None:
+            raise RuntimeError(f"A manager daemon is already listening on '{self.path}'")
+        with contextlib.suppress(FileNotFoundError):
+            # Left behind by a daemon that did not shut down cleanly
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        watcher = self._start_watching()
+        self._server = _Server(self.path, _Handler)
+        self._server.manager_daemon = self
+        try:
+            if on_ready is not None:
+                on_ready()
+            self._server.serve_forever(poll_interval=0.2)
+        finally:
+            self._stopped.set()
+            self._server.server_close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+            if watcher is not None:
+                watcher.join()
+                self._inotify.close()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown).start()
+
+    def handle(self, message: dict, write=None) -> dict:
+        """
+        Answers a request. ``write`` receives the output of a command as it runs.
+        """
+        operation = message.get("op")
+        if operation == "ping":
+            return {**self.stats, "uptime": round(time.time() - self.stats["started"], 3)}
+        if operation == "stop":
+            self.stop()
+            return {"stopping": True}
+        if operation == "run":
+            return self.run(
+                message.get("argv") or [],
+                write=write,
+                env=message.get("env"),
+                cwd=message.get("cwd"),
+            )
+        return {"error": f"Unknown operation: {operation}"}
+
+    def run(self, argv: list, write=None, env: dict = None, cwd: str = None) -> dict:
+        """
+        Runs a CLI command and returns its exit code, or ``interactive`` when the
+        command prompted for input, before it did anything. Commands whose working
+        directory is not the daemon's are not run and ``direct`` is returned, as the
+        daemon's state only holds its own sites.
+
+        Args:
+            argv (list): Arguments of the command.
+            write (callable): Called with "stdout" or "stderr" and every line the
+                command writes. Without it, the output is returned in ``output``.
+            env (dict): Environment to run the command in, defaults to the daemon's.
+            cwd (str): Working directory the command was called from.
+        """
+        start = time.perf_counter()
+        if cwd is not None and os.path.realpath(cwd) != os.path.realpath(os.getcwd()):
+            return {"direct": True}
+
+        output = None
+        if write is None:
+            output = io.StringIO()
+
+            def write(stream, text):
+                output.write(text)
+
+        with self._lock:
+            self._refresh()
+            try:
+                with _redirected(write), _no_prompts(), _environment(env):
+                    exit_code = self._invoke(argv)
+            except _Interactive:
+                return {"interactive": True}
+            self.stats["requests"] += 1
+
+        reply = {
+            "exit_code": exit_code,
+            "seconds": round(time.perf_counter() - start, 6),
+        }
+        if output is not None:
+            reply["output"] = output.getvalue()
+        return reply
+
+    def _invoke(self, argv: list) -> int:
+        try:
+            result = self.cli.main(
+                argv, prog_name="main.py", obj=self.manager, standalone_mode=False
+            )
+            return result if isinstance(result, int) else 0
+        except click.ClickException as e:
+            e.show()
+            return e.exit_code
+        except click.exceptions.Abort:
+            click.echo("Aborted!", err=True)
+            return 1
+        except click.exceptions.Exit as e:
+            return e.exit_code
+        except SystemExit as e:
+            # Mirrors how the interpreter exits on an uncaught SystemExit
+            if e.code is None:
+                return 0
+            if isinstance(e.code, int):
+                return e.code
+            print(e.code, file=sys.stderr)
+            return 1
+        except _Interactive:
+            raise
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+    def _refresh(self) -> None:
+        """
+        Drops the state that may be stale since the previous command.
+        """
+        if self._registry_stale or self._inotify is None:
+            self._registry_stale = False
+            self.manager.registry.sites = None
+        # Listening ports are only read when ports are allocated, but change anytime
+        self.manager.listening_ports = None
+
+    def _start_watching(self):
+        try:
+            self._inotify = Inotify()
+        except RuntimeError:
+            return None
+
+        os.makedirs(SITES_DIR, exist_ok=True)
+        self._inotify.add_watch(SITES_DIR)
+        for name in os.listdir(SITES_DIR):
+            if not name.startswith("."):
+                self._inotify.add_watch(os.path.join(SITES_DIR, name))
+        for directory in (TEMPLATES_DIR, SHARED_TEMPLATES_DIR):
+            self._inotify.add_watch(directory)
+
+        watcher = threading.Thread(target=self._watch, daemon=True)
+        watcher.start()
+        return watcher
+
+    def _watch(self) -> None:
+        while not self._stopped.is_set():
+            for path, mask in self._inotify.read(timeout=0.2):
+                self._invalidate(path, mask)
+
+    def _invalidate(self, path: str, mask: int) -> None:
+        if path is None:
+            # Events were lost, so nothing cached can be trusted
+            self._registry_stale = True
+            EnvFile.invalidate()
+            ConfigHelper.invalidate_template()
+            return
+
+        if path == REGISTRY_FILE:
+            self._registry_stale = True
+        elif os.path.dirname(path) == SITES_DIR and mask & IN_ISDIR:
+            if os.path.basename(path).startswith("."):
+                return
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._inotify.add_watch(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._inotify.remove_tree(path)
+        else:
+            EnvFile.invalidate(path)
+            ConfigHelper.invalidate_template(path)
+
+
+def spawn(main_path: str) -> subprocess.Popen:
+    """
+    Starts a detached daemon running ``main.py daemon start --foreground`` in the
+    current directory, logging to DAEMON_LOG.
+    """
+    os.makedirs(os.path.dirname(DAEMON_LOG) or ".", exist_ok=True)
+    with open(DAEMON_LOG, "a") as log:
+        return subprocess.Popen(
+            [sys.executable, main_path, "daemon", "start", "--foreground"],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    manager_daemon = None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            self._send({"error": f"Invalid request: {e}"})
+            return
+        # Output frames are sent as the command writes them, then the reply
+        self._send(self.server.manager_daemon.handle(message, self._send_output))
+
+    def setup(self):
+        super().setup()
+        self._send_lock = threading.Lock()
+        self._disconnected = False
+
+    def _send_output(self, stream: str, text: str) -> None:
+        if text:
+            self._send({stream: text})
+
+    def _send(self, frame: dict) -> None:
+        # Commands may write from several threads, and keep running if the client left
+        with self._send_lock:
+            if self._disconnected:
+                return
+            try:
+                self.wfile.write(json.dumps(frame).encode() + b"\n")
+                self.wfile.flush()
+            except OSError:
+                self._disconnected = True
+
+
+class _Interactive(Exception):
+    """
+    Raised when a command prompts, as the daemon has no terminal to ask on.
+    """
+
+
+def _prompt(*args, **kwargs):
+    raise _Interactive()
+
+
+@contextlib.contextmanager
+def _no_prompts():
+    termui = click.termui
+    visible, hidden = termui.visible_prompt_func, termui.hidden_prompt_func
+    termui.visible_prompt_func = termui.hidden_prompt_func = _prompt
+    try:
+        yield
+    finally:
+        termui.visible_prompt_func, termui.hidden_prompt_func = visible, hidden
+
+
+class _Output(io.TextIOBase):
+    """
+    Line-buffered text stream passing every line on to a callback, tagged with the
+    stream name. A prompt's text is left unsent, so a command found to be
+    interactive has written nothing.
+    """
+
+    def __init__(self, write, stream: str):
+        self._write = write
+        self._stream = stream
+        self._pending = ""
+
+    @property
+    def encoding(self) -> str:
+        return "utf-8"
+
+    @property
+    def errors(self) -> str:
+        return "strict"
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        # Click takes streams accepting bytes for binary ones and wraps them
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        lines, newline, self._pending = (self._pending + text).rpartition("\n")
+        if newline:
+            self._write(self._stream, lines + newline)
+        return len(text)
+
+    def send_rest(self) -> None:
+        if self._pending:
+            self._write(self._stream, self._pending)
+            self._pending = ""
+
+
+@contextlib.contextmanager
+def _redirected(write):
+    stdout, stderr = _Output(write, "stdout"), _Output(write, "stderr")
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        yield
+    stdout.send_rest()
+    stderr.send_rest()
+
+
+@contextlib.contextmanager
+def _environment(env: dict):
+    if env is None:
+        yield
+        return
+
+    saved = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
@@ -0,0 +1,114 @@
+import errno
+import os
+import shutil
+import time
+
+from app.SitePackager import walk
+from app.Tracer import current_span, traced
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - fcntl is not available on Windows
+    fcntl = None
+
+# ioctl request for cloning a whole file into another (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+
+# Errors meaning the filesystem can't reflink between these two paths
+_UNSUPPORTED = {
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+    errno.EPERM,
+}
+
+
+class Materializer:
+    """
+    Materializes a template tree into a new site directory without copying file
+    contents where the filesystem allows it.
+
+    Every file is reflinked when the filesystem supports it, so the site shares disk
+    blocks with the template until either side writes. Otherwise, files are copied:
+    WordPress core updates, plugin updaters and edits through the bind mount write
+    core files in place, so sharing them by hardlink would change the template and
+    every other site along with them. Files or directories listed in ``skip`` are
+    left out entirely, for callers that render them directly into the destination.
+    """
+
+    source_dir = None
+    skip = None
+
+    def __init__(self, source_dir: str, skip: tuple = ()):
+        self.source_dir = source_dir
+        self.skip = set(skip)
+        self._reflink = fcntl is not None
+
+    @traced("materialize")
+    def materialize(self, destination: str) -> dict:
+        """
+        Creates ``destination`` as a copy of the source tree and returns per-method
+        file counts.
+
+        Args:
+            destination (str): Directory to create; must not exist yet.
+        """
+        start = time.perf_counter()
+        stats = {"files": 0, "reflinked": 0, "copied": 0}
+
+        os.makedirs(destination)
+        for path, arcname in walk(self.source_dir):
+            if arcname in self.skip or arcname.split("/", 1)[0] in self.skip:
+                continue
+
+            target = os.path.join(destination, arcname)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), target)
+            elif os.path.isdir(path):
+                os.mkdir(target)
+                shutil.copymode(path, target)
+            else:
+                stats[self.materialize_file(path, target)] += 1
+                stats["files"] += 1
+
+        shutil.copymode(self.source_dir, destination)
+        current_span().add(**stats)
+        stats["seconds"] = round(time.perf_counter() - start, 6)
+        return stats
+
+    def materialize_file(self, path: str, target: str) -> str:
+        """
+        Creates ``target`` from ``path`` by reflink when the filesystem supports it
+        and by copy otherwise, and returns which one was used.
+        """
+        if self._reflink:
+            try:
+                reflink(path, target)
+                return "reflinked"
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                # Only probe once per run, every later file would fail the same way
+                self._reflink = False
+
+        shutil.copy2(path, target)
+        return "copied"
+
+
+def reflink(source: str, target: str) -> None:
+    """
+    Clones ``source`` into a new file at ``target`` sharing the same disk blocks.
+    Raises OSError when the filesystem doesn't support reflinks.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+
+    with open(source, "rb") as source_file, open(target, "xb") as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            target_file.close()
+            os.remove(target)
+            raise
+    shutil.copystat(source, target)
@@ -0,0 +1,107 @@
+import heapq
+
+from app.constants import PHPMYADMIN_PORT_RANGE, WORDPRESS_PORT_RANGE
+
+PROC_NET_TCP_FILES = ("/proc/net/tcp", "/proc/net/tcp6")
+TCP_LISTEN_STATE = "0A"
+
+
+class PortAllocator:
+    """
+    Allocates WordPress and phpMyAdmin port pairs.
+
+    Slot ``i`` maps to the i-th port of both ranges. A bitmap records which slots are in
+    use and a min-heap of free slots hands out the lowest one first, so allocate and
+    release are O(log n) (amortized) regardless of how many sites exist. Reserved slots
+    stay in the heap and are skipped when popped.
+    """
+
+    def __init__(
+        self,
+        wordpress_range: tuple = WORDPRESS_PORT_RANGE,
+        phpmyadmin_range: tuple = PHPMYADMIN_PORT_RANGE,
+    ):
+        size = min(
+            wordpress_range[1] - wordpress_range[0],
+            phpmyadmin_range[1] - phpmyadmin_range[0],
+        )
+        if size <= 0:
+            raise ValueError("Port ranges must contain at least one port")
+
+        self.wordpress_range = wordpress_range
+        self.phpmyadmin_range = phpmyadmin_range
+        self._used = bytearray(size)
+        self._free = list(range(size))
+
+    def allocate(self) -> dict:
+        """
+        Reserves the lowest free slot and returns its ports.
+        """
+        while self._free:
+            slot = heapq.heappop(self._free)
+            if not self._used[slot]:
+                self._used[slot] = 1
+                return self._get_ports(slot)
+
+        raise RuntimeError("No available ports left in the configured ranges")
+
+    def release(self, ports: dict) -> None:
+        """
+        Returns the slots used by ``ports`` to the free slots.
+        """
+        for port in ports.values():
+            slot = self._get_slot(port)
+            if slot is not None and self._used[slot]:
+                self._used[slot] = 0
+                heapq.heappush(self._free, slot)
+
+    def reserve(self, port: int) -> None:
+        """
+        Marks the slot containing ``port`` as used. Ports outside both ranges are ignored.
+        """
+        slot = self._get_slot(port)
+        if slot is not None:
+            self._used[slot] = 1
+
+    def reserve_ports(self, ports) -> None:
+        for port in ports:
+            self.reserve(port)
+
+    def is_reserved(self, port: int) -> bool:
+        slot = self._get_slot(port)
+        return slot is not None and bool(self._used[slot])
+
+    def _get_slot(self, port: int):
+        if port is None:
+            return None
+        for start, end in (self.wordpress_range, self.phpmyadmin_range):
+            if start <= port < end and port - start < len(self._used):
+                return port - start
+        return None
+
+    def _get_ports(self, slot: int) -> dict:
+        return {
+            "wordpress": self.wordpress_range[0] + slot,
+            "phpmyadmin": self.phpmyadmin_range[0] + slot,
+        }
+
+
+def listening_ports(paths: tuple = PROC_NET_TCP_FILES) -> set:
+    """
+    Returns the local TCP ports in the LISTEN state on this host, read from procfs.
+    Missing files (e.g. on non-Linux hosts) are skipped.
+    """
+    ports = set()
+
+    for path in paths:
+        try:
+            with open(path, "r") as file:
+                next(file, None)
+                for line in file:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == TCP_LISTEN_STATE:
+                        ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+        except OSError:
+            continue
+
+    return ports
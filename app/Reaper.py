@@ -0,0 +1,159 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.FileLock import FileLock
+from app.Tracer import traced
+from app.constants import REAPER_LOG, TRASH_DIR
+
+
+class Reaper:
+    """
+    Deletes removed sites from the trash directory.
+
+    Removing a site only renames it into TRASH_DIR, which is instant. The reaper then
+    deletes the trashed trees and reports the bytes reclaimed. Directories are fed
+    to the workers as they are found, so a site whose files nearly all sit under
+    src/ is still spread over every worker. Deletions tolerate files disappearing
+    underneath them, so a tree can be reclaimed by a waiting removal and a
+    background reaper at once.
+    """
+
+    trash_dir = None
+    workers = None
+
+    def __init__(self, trash_dir: str = TRASH_DIR, workers: int = 8):
+        """
+        Args:
+            trash_dir (str): Directory holding the removed sites.
+            workers (int): Number of directories emptied concurrently.
+        """
+        self.trash_dir = trash_dir
+        self.workers = workers
+
+    @traced("reclaim", counters=("files", "bytes"))
+    def reclaim(self, path: str) -> dict:
+        """
+        Deletes a tree and returns the number of files and bytes it held and how long
+        the deletion took.
+
+        Args:
+            path (str): Path of the trashed site.
+        """
+        start = time.perf_counter()
+        files, size = 0, 0
+        directories = [path]
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            pending = {executor.submit(_empty_directory, path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count, freed, subdirectories = future.result()
+                    files, size = files + count, size + freed
+                    directories.extend(subdirectories)
+                    pending.update(
+                        executor.submit(_empty_directory, directory)
+                        for directory in subdirectories
+                    )
+
+        # Directories are found after their parents, so children go first
+        for directory in reversed(directories):
+            _remove_directory(directory)
+        return {
+            "name": os.path.basename(path),
+            "files": files,
+            "bytes": size,
+            "seconds": round(time.perf_counter() - start, 6),
+        }
+
+    def reclaim_all(self) -> list:
+        """
+        Reclaims every tree in the trash directory, including trees left behind by an
+        interrupted reaper, and logs each result to REAPER_LOG. Reapers running at the
+        same time take turns, and each one empties the trash before exiting.
+        """
+        results = []
+        with FileLock(f"{self.trash_dir}.lock"):
+            while True:
+                try:
+                    names = sorted(os.listdir(self.trash_dir))
+                except FileNotFoundError:
+                    names = []
+                if not names:
+                    return results
+
+                for name in names:
+                    result = self.reclaim(os.path.join(self.trash_dir, name))
+                    _log(result)
+                    results.append(result)
+
+    def spawn(self) -> subprocess.Popen:
+        """
+        Starts a detached reaper process emptying the trash directory, so the caller
+        can exit right away.
+        """
+        # The reaper imports this package, which may not be on the default path
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        python_path = os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))
+
+        os.makedirs(os.path.dirname(REAPER_LOG) or ".", exist_ok=True)
+        with open(REAPER_LOG, "a") as log:
+            return subprocess.Popen(
+                [sys.executable, "-m", "app.Reaper", self.trash_dir, str(self.workers)],
+                env={**os.environ, "PYTHONPATH": python_path},
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                start_new_session=True,
+            )
+
+
+def _empty_directory(path: str) -> tuple:
+    """
+    Deletes the files and symlinks directly in ``path``. Returns the number of files
+    and bytes deleted and the subdirectories left to empty.
+    """
+    files, size = 0, 0
+    subdirectories = []
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        entries = []
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirectories.append(entry.path)
+        else:
+            count, freed = _remove_file(entry.path)
+            files, size = files + count, size + freed
+    return files, size, subdirectories
+
+
+def _remove_file(path: str) -> tuple:
+    try:
+        stat = os.lstat(path)
+        os.unlink(path)
+    except FileNotFoundError:
+        return 0, 0
+    # Blocks still linked from elsewhere, e.g. a site's template, are not freed
+    return 1, stat.st_size if stat.st_nlink == 1 else 0
+
+
+def _remove_directory(path: str) -> None:
+    try:
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+
+
+def _log(result: dict) -> None:
+    with open(REAPER_LOG, "a") as log:
+        log.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    Reaper(sys.argv[1], int(sys.argv[2])).reclaim_all()
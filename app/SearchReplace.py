@@ -0,0 +1,230 @@
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_SIZE = 16 * 1024 * 1024
+STATEMENT_END = b";\n"
+SQL_STRING = re.compile(rb"'[^'\\]*(?:\\.[^'\\]*)*'", re.S)
+SERIALIZED_PREFIXES = (b"a:", b"s:", b"O:", b"i:", b"d:", b"b:", b"N;")
+SQL_UNESCAPES = {
+    b"0": b"\x00",
+    b"b": b"\x08",
+    b"n": b"\n",
+    b"r": b"\r",
+    b"t": b"\t",
+    b"Z": b"\x1a",
+}
+SQL_ESCAPES = {
+    b"\x00": b"\\0",
+    b"\n": b"\\n",
+    b"\r": b"\\r",
+    b"\x1a": b"\\Z",
+    b"\\": b"\\\\",
+    b"'": b"\\'",
+    b'"': b'\\"',
+}
+SQL_ESCAPE = re.compile(rb"[\x00\n\r\x1a\\'\"]")
+SQL_UNESCAPE = re.compile(rb"\\(.)", re.S)
+
+
+class SearchReplace:
+    """
+    Streaming search-and-replace for SQL dumps that understands PHP serialization.
+
+    The dump is read in chunks cut on statement boundaries and the chunks are
+    processed by a pool of worker processes, in order. Within a statement only string
+    literals containing a search term are decoded; serialized PHP values are rewritten
+    token by token so every ``s:N:"..."`` length prefix matches its new contents.
+    """
+
+    def __init__(
+        self, replacements: list, workers: int = None, chunk_size: int = CHUNK_SIZE
+    ):
+        """
+        Args:
+            replacements (list): (search, replace) string pairs applied in order.
+            workers (int): Number of worker processes, defaults to the CPU count. A value
+                of 1 processes the dump in the calling process.
+            chunk_size (int): Approximate number of bytes handed to a worker at a time.
+        """
+        self.replacements = [
+            (search.encode(), replace.encode()) for search, replace in replacements
+        ]
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def process_file(self, input_path: str, output_path: str) -> dict:
+        with open(input_path, "rb") as source, open(output_path, "wb") as destination:
+            return self.process_stream(source, destination)
+
+    def process_stream(self, source, destination) -> dict:
+        """
+        Rewrites the dump read from ``source`` into ``destination`` and returns
+        throughput statistics.
+        """
+        start = time.perf_counter()
+        stats = {"bytes": 0, "rows": 0, "replacements": 0}
+        chunks = _read_statements(source, self.chunk_size)
+
+        if self.workers == 1:
+            for chunk in chunks:
+                _write(destination, process_chunk(chunk, self.replacements), stats)
+        else:
+            with ProcessPoolExecutor(self.workers) as executor:
+                # Keep a bounded window of chunks in flight so memory stays flat
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(
+                        executor.submit(process_chunk, chunk, self.replacements)
+                    )
+                    if len(pending) >= self.workers * 2:
+                        _write(destination, pending.popleft().result(), stats)
+                while pending:
+                    _write(destination, pending.popleft().result(), stats)
+
+        seconds = time.perf_counter() - start
+        stats["seconds"] = round(seconds, 6)
+        stats["bytes_per_second"] = int(stats["bytes"] / seconds) if seconds > 0 else 0
+        stats["rows_per_second"] = int(stats["rows"] / seconds) if seconds > 0 else 0
+        return stats
+
+
+def process_chunk(chunk: bytes, replacements: list) -> tuple:
+    """
+    Applies ``replacements`` to every string literal of the SQL statements in
+    ``chunk``. Returns the rewritten chunk, the number of bytes read, the number of
+    rows seen in INSERT statements and the number of literals changed.
+    """
+    rows = 0
+    for statement in chunk.split(STATEMENT_END):
+        if statement.lstrip().startswith(b"INSERT"):
+            rows += statement.count(b"),(") + 1
+
+    needles = [search for search, _ in replacements]
+    needles += [_escape(search) for search in needles]
+    if not any(needle in chunk for needle in needles):
+        return chunk, len(chunk), rows, 0
+
+    changed = 0
+
+    def replace_literal(match: re.Match) -> bytes:
+        nonlocal changed
+        literal = match.group(0)
+        if not any(needle in literal for needle in needles):
+            return literal
+
+        value = _unescape(literal[1:-1])
+        replaced = replace_value(value, replacements)
+        if replaced == value:
+            return literal
+
+        changed += 1
+        return b"'" + _escape(replaced) + b"'"
+
+    return SQL_STRING.sub(replace_literal, chunk), len(chunk), rows, changed
+
+
+def replace_value(value: bytes, replacements: list) -> bytes:
+    """
+    Applies ``replacements`` to a single database value. Serialized PHP values are
+    rewritten structurally so string lengths stay valid; anything else is replaced
+    as plain text.
+    """
+    if value.startswith(SERIALIZED_PREFIXES):
+        try:
+            replaced, end = _replace_serialized(value, 0, replacements)
+            if end == len(value):
+                return replaced
+        except (ValueError, IndexError):
+            pass
+
+    for search, replace in replacements:
+        value = value.replace(search, replace)
+    return value
+
+
+def _replace_serialized(data: bytes, position: int, replacements: list) -> tuple:
+    """
+    Rewrites the serialized value starting at ``position``. Returns the new bytes and
+    the position right after the value. Raises ValueError on malformed input.
+    """
+    if data.startswith(b"s:", position):
+        length_start = position + 2
+        colon = data.index(b":", length_start)
+        start = colon + 2
+        end = start + int(data[length_start:colon])
+        if not data.startswith(b'"', colon + 1) or not data.startswith(b'";', end):
+            raise ValueError("Malformed serialized string")
+
+        value = replace_value(data[start:end], replacements)
+        return b's:%d:"%s";' % (len(value), value), end + 2
+
+    if data.startswith((b"i:", b"d:", b"b:", b"r:", b"R:"), position):
+        end = data.index(b";", position) + 1
+        return data[position:end], end
+
+    if data.startswith(b"N;", position):
+        return b"N;", position + 2
+
+    if data.startswith((b"a:", b"O:"), position):
+        brace = data.index(b"{", position)
+        header = data[position:brace]
+        count = int(header[:-1].rsplit(b":", 1)[1])
+        parts = [header, b"{"]
+        position = brace + 1
+        for _ in range(count * 2):
+            value, position = _replace_serialized(data, position, replacements)
+            parts.append(value)
+        if not data.startswith(b"}", position):
+            raise ValueError("Malformed serialized array")
+        parts.append(b"}")
+        return b"".join(parts), position + 1
+
+    raise ValueError(f"Unsupported serialized value at {position}")
+
+
+def _read_statements(source, chunk_size: int):
+    """
+    Yields chunks of roughly ``chunk_size`` bytes that end on a statement boundary.
+    mysqldump escapes newlines inside strings, so ``;\\n`` only occurs between
+    statements.
+    """
+    remainder = b""
+
+    while True:
+        data = source.read(chunk_size)
+        if not data:
+            break
+
+        buffer = remainder + data
+        boundary = buffer.rfind(STATEMENT_END)
+        if boundary == -1:
+            remainder = buffer
+            continue
+
+        boundary += len(STATEMENT_END)
+        yield buffer[:boundary]
+        remainder = buffer[boundary:]
+
+    if remainder:
+        yield remainder
+
+
+def _write(destination, result: tuple, stats: dict) -> None:
+    output, read, rows, changed = result
+    destination.write(output)
+    stats["bytes"] += read
+    stats["rows"] += rows
+    stats["replacements"] += changed
+
+
+def _unescape(value: bytes) -> bytes:
+    return SQL_UNESCAPE.sub(
+        lambda match: SQL_UNESCAPES.get(match.group(1), match.group(1)), value
+    )
+
+
+def _escape(value: bytes) -> bytes:
+    return SQL_ESCAPE.sub(lambda match: SQL_ESCAPES[match.group(0)], value)
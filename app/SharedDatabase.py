@@ -0,0 +1,159 @@
+import hashlib
+import os
+import re
+import secrets
+import subprocess
+
+from app.AtomicFile import write_if_changed
+from app.DatabasePipeline import DockerMysqlClient
+from app.EnvFile import EnvFile
+from app.constants import (
+    COMPOSE_FILE,
+    SHARED_DIR,
+    SHARED_MYSQL_CONTAINER,
+    SHARED_NETWORK,
+    SHARED_PHPMYADMIN_CONTAINER,
+    SHARED_SERVER_TEMPLATE,
+    SHARED_TEMPLATES_DIR,
+)
+
+# MySQL 5.7 limits user names to 32 characters
+MAX_IDENTIFIER_LENGTH = 32
+
+
+class SharedDatabase:
+    """
+    A single MySQL server, and optionally phpMyAdmin, shared by every site created
+    in shared database mode.
+
+    The server is its own compose project under SHARED_DIR, on a network the sites
+    join. Each site gets its own database and a user whose privileges are limited to
+    that database, so sites stay isolated from one another.
+    """
+
+    path = None
+    templates_dir = None
+    docker = None
+
+    def __init__(
+        self,
+        path: str = SHARED_DIR,
+        templates_dir: str = SHARED_TEMPLATES_DIR,
+        docker: str = "docker",
+    ):
+        self.path = path
+        self.templates_dir = templates_dir
+        self.docker = docker
+
+    def ensure(self, phpmyadmin_port: int = None) -> DockerMysqlClient:
+        """
+        Provisions the shared server on first use, starts it and waits until it
+        accepts connections. Returns a root client.
+
+        Args:
+            phpmyadmin_port (int): Also run a shared phpMyAdmin on this port. Once set,
+                the port is remembered for later calls.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.templates_dir, SHARED_SERVER_TEMPLATE), "r") as file:
+            write_if_changed(os.path.join(self.path, COMPOSE_FILE), file.read())
+
+        # Compose reads the values from the project's .env file
+        env_file = EnvFile(os.path.join(self.path, ".env"))
+        env_file.update(
+            {
+                "MYSQL_CONTAINER_NAME": SHARED_MYSQL_CONTAINER,
+                "MYSQL_ROOT_PASSWORD": env_file.get("MYSQL_ROOT_PASSWORD")
+                or secrets.token_urlsafe(24),
+                "PHPMYADMIN_CONTAINER_NAME": SHARED_PHPMYADMIN_CONTAINER,
+                "PHPMYADMIN_PORT": phpmyadmin_port or env_file.get("PHPMYADMIN_PORT"),
+                "SHARED_NETWORK_NAME": SHARED_NETWORK,
+            }
+        )
+        env_file.save()
+
+        command = [self.docker, "compose"]
+        if env_file.get("PHPMYADMIN_PORT"):
+            command += ["--profile", "phpmyadmin"]
+        subprocess.run([*command, "up", "-d"], cwd=self.path, check=True)
+
+        client = self.root_client()
+        client.wait()
+        return client
+
+    def root_client(self) -> DockerMysqlClient:
+        password = EnvFile(os.path.join(self.path, ".env")).get("MYSQL_ROOT_PASSWORD")
+        if not password:
+            raise RuntimeError("The shared database server has not been provisioned.")
+
+        return DockerMysqlClient(SHARED_MYSQL_CONTAINER, "mysql", "root", password)
+
+    def create_database(self, site_name: str) -> dict:
+        """
+        Creates the database and user of a site and returns its connection settings.
+        Raises RuntimeError when either already exists, as they belong to another
+        site.
+
+        Args:
+            site_name (str): Name of the site.
+        """
+        identifier = database_identifier(site_name)
+        password = secrets.token_urlsafe(24)
+        try:
+            self._execute(f"CREATE DATABASE `{identifier}`;\n")
+        except RuntimeError as e:
+            raise RuntimeError(
+                f"Could not create database '{identifier}' on the shared server, "
+                "it may belong to another site."
+            ) from e
+
+        try:
+            self._execute(
+                f"CREATE USER '{identifier}'@'%' IDENTIFIED BY '{password}';\n"
+                f"GRANT ALL PRIVILEGES ON `{identifier}`.* TO '{identifier}'@'%';\n"
+            )
+        except RuntimeError as e:
+            # The database was created above, so it is ours to drop
+            self._execute(f"DROP DATABASE IF EXISTS `{identifier}`;\n")
+            raise RuntimeError(
+                f"Could not create user '{identifier}' on the shared server, "
+                "it may belong to another site."
+            ) from e
+        return {
+            "host": SHARED_MYSQL_CONTAINER,
+            "name": identifier,
+            "user": identifier,
+            "password": password,
+            "network": SHARED_NETWORK,
+        }
+
+    def drop_database(self, database: dict) -> None:
+        """
+        Drops a site's database and user.
+
+        Args:
+            database (dict): Connection settings returned by create_database.
+        """
+        self._execute(
+            f"DROP DATABASE IF EXISTS `{database['name']}`;\n"
+            f"DROP USER IF EXISTS '{database['user']}'@'%';\n"
+        )
+
+    def _execute(self, sql: str) -> None:
+        with self.root_client().load() as destination:
+            destination.write(sql.encode())
+
+
+def database_identifier(site_name: str) -> str:
+    """
+    Returns the database and user name of a site. Names that had characters replaced,
+    and so may collide with another site's, or that are too long for a MySQL user get
+    a hash suffix.
+    """
+    base = re.sub(r"\W", "_", site_name)
+    identifier = f"wp_{base}"
+    if base == site_name and len(identifier) <= MAX_IDENTIFIER_LENGTH:
+        return identifier
+
+    digest = hashlib.sha256(site_name.encode()).hexdigest()[:8]
+    return f"wp_{base[:20]}_{digest}"
@@ -0,0 +1,162 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.SitePackager import throughput
+from app.SshTransport import file_checksum
+from app.Tracer import traced
+
+CHUNK_SIZE = 8 * 1024 * 1024
+CHECKSUM_BATCH_SIZE = 200
+PART_SUFFIX = ".part"
+
+
+class SiteDownloader:
+    """
+    Mirrors a remote directory into a local one over a pool of transports.
+
+    The remote tree is listed in parallel and compared with the local tree by size and
+    mtime, so only missing or changed files are fetched. Each file is streamed into a
+    ``.part`` file (resuming from its current size if a previous download stopped
+    half-way), checked against the remote SHA-256 and renamed into place.
+    """
+
+    def __init__(self, pool, workers: int = 4, chunk_size: int = CHUNK_SIZE):
+        """
+        Args:
+            pool (TransportPool): Pool of transports to the remote server.
+            workers (int): Number of concurrent listings and downloads.
+            chunk_size (int): Size of each ranged read in bytes.
+        """
+        self.pool = pool
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    @traced("download", counters=("files", "bytes", "skipped"))
+    def download(self, remote_dir: str, local_dir: str) -> dict:
+        """
+        Fetches every file under ``remote_dir`` that is missing or differs locally.
+        Local files absent from the remote are left untouched.
+        """
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            remote = self._list_remote(executor, remote_dir)
+            local = _list_local(local_dir)
+            changed = sorted(
+                path
+                for path, attributes in remote.items()
+                if local.get(path) != attributes
+            )
+
+            checksums = {}
+            for batch in executor.map(
+                lambda batch: self._checksums(remote_dir, batch),
+                _batches(changed, CHECKSUM_BATCH_SIZE),
+            ):
+                checksums.update(batch)
+
+            received = sum(
+                executor.map(
+                    lambda path: self._fetch(
+                        f"{remote_dir}/{path}",
+                        os.path.join(local_dir, path),
+                        remote[path],
+                        checksums[path],
+                    ),
+                    changed,
+                )
+            )
+
+        stats = throughput(len(changed), received, time.perf_counter() - start)
+        stats["skipped"] = len(remote) - len(changed)
+        return stats
+
+    def _list_remote(self, executor: ThreadPoolExecutor, remote_dir: str) -> dict:
+        """
+        Lists the remote tree breadth-first, one directory per task. Returns
+        ``{relative path: (size, mtime)}`` for every file.
+        """
+        files = {}
+        futures = {executor.submit(self._listdir, remote_dir): ""}
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                prefix = futures.pop(future)
+                for name, is_dir, size, mtime in future.result():
+                    path = f"{prefix}{name}"
+                    if is_dir:
+                        child = executor.submit(self._listdir, f"{remote_dir}/{path}")
+                        futures[child] = f"{path}/"
+                    else:
+                        files[path] = (size, int(mtime))
+
+        return files
+
+    def _listdir(self, path: str) -> list:
+        with self.pool.connection() as transport:
+            return transport.listdir(path)
+
+    def _checksums(self, remote_dir: str, paths: list) -> dict:
+        with self.pool.connection() as transport:
+            checksums = transport.checksums([f"{remote_dir}/{path}" for path in paths])
+        return {path: checksums[f"{remote_dir}/{path}"] for path in paths}
+
+    def _fetch(self, remote_path: str, local_path: str, attributes: tuple, checksum):
+        size, mtime = attributes
+        part_path = f"{local_path}{PART_SUFFIX}"
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset > size:
+            offset = 0
+        received = 0
+
+        with open(part_path, "r+b" if offset else "wb") as file:
+            file.seek(offset)
+            file.truncate()
+            with self.pool.connection() as transport:
+                while offset < size:
+                    data = transport.read_at(remote_path, offset, self.chunk_size)
+                    if not data:
+                        raise RuntimeError(f"Remote file '{remote_path}' was truncated")
+                    file.write(data)
+                    offset += len(data)
+                    received += len(data)
+
+        if file_checksum(part_path) != checksum:
+            os.remove(part_path)
+            raise RuntimeError(f"Checksum mismatch after downloading '{remote_path}'")
+
+        os.replace(part_path, local_path)
+        os.utime(local_path, (mtime, mtime))
+        return received
+
+
+def _batches(items: list, size: int):
+    for index in range(0, len(items), size):
+        end = index + size
+        yield items[index:end]
+
+
+def _list_local(local_dir: str) -> dict:
+    files = {}
+    stack = [(local_dir, "")]
+
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+
+        for entry in entries:
+            path = f"{prefix}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                stack.append((entry.path, f"{path}/"))
+            elif entry.is_file(follow_symlinks=False):
+                entry_stat = entry.stat(follow_symlinks=False)
+                files[path] = (entry_stat.st_size, int(entry_stat.st_mtime))
+
+    return files
@@ -1,50 +1,218 @@
+import fnmatch
 import os
-from dotenv import dotenv_values
 
+from app.EnvFile import EnvFile
 from app.WpSite import WpSite
+from app.PortAllocator import PortAllocator, listening_ports
+from app.SiteRegistry import SiteRegistry
+from app.Tracer import span, traced
 from app.constants import SITES_DIR
 
 
 class SiteManager:
     site = None
-    reserved_ports = []
+    registry = None
+    allocator = None
+    listening_ports = None
 
     def __init__(self, initialize_ports=True):
-        self.site = WpSite()
+        # Modules only some commands need are imported by the methods using them, so
+        # listing sites doesn't pay for asyncio, the database pipeline and the like.
+        # The registry is read on first use and the allocator is rebuilt whenever a
+        # site is created, so constructing a manager does not touch the disk unless
+        # initialize_ports is set.
+        self.registry = SiteRegistry()
+        self.allocator = PortAllocator()
+        self.site = WpSite(self.registry, self.allocator)
+        self.listening_ports = None
         if initialize_ports:
             self._initialize_reserved_ports()
 
-    def create_site(self, name):
-        ports = self._get_available_ports()
-        return self.site.create(name, ports)
+    @traced("create_site")
+    def create_site(self, name, shared_database=False):
+        """
+        Creates a site with freshly allocated ports. With ``shared_database`` set, the
+        site gets its own database and user on the shared MySQL server instead of a
+        MySQL container of its own.
+        """
+        # Ports are allocated against a freshly loaded registry while holding its lock
+        # and reserved before the lock is released, so concurrent processes never hand
+        # out the same ports while their sites are materialized in parallel.
+        with span("allocate_ports"), self.registry.transaction():
+            self._expire_pending()
+            self._initialize_reserved_ports()
+            ports = self._get_available_ports()
+            site_name = self.site.reserve(name, ports)
+
+        shared = None
+        if shared_database:
+            from app.SharedDatabase import SharedDatabase
+
+            shared = SharedDatabase()
+        database = None
+        try:
+            if shared is not None:
+                shared.ensure()
+                database = shared.create_database(site_name)
+            return self.site.create(site_name, ports, database)
+        except Exception:
+            if database is not None:
+                shared.drop_database(database)
+            with self.registry.transaction():
+                self.registry.remove(site_name)
+            self.allocator.release(ports)
+            raise
+
+    @traced("clone_site")
+    def clone_site(self, source_name, name, database=True, workers=4):
+        """
+        Clones an existing site under a new name with freshly allocated ports. With
+        ``database`` set, the new site's database is started and the source database
+        is piped into it table by table, rewriting the site URL on the way. Clones of
+        sites on the shared MySQL server get a database of their own on it.
+        """
+        source = WpSite(self.registry)
+        source.load(source_name)
+        shared = None
+        if source.get_shared_database() is not None:
+            from app.SharedDatabase import SharedDatabase
+
+            shared = SharedDatabase()
+
+        with span("allocate_ports"), self.registry.transaction():
+            self._expire_pending()
+            self._initialize_reserved_ports()
+            source_ports = (self.registry.get(source_name) or {}).get("ports")
+            ports = self._get_available_ports()
+            site_name = self.site.reserve(name, ports)
+
+        shared_database = None
+        try:
+            if shared is not None:
+                shared.ensure()
+                shared_database = shared.create_database(site_name)
+            self.site.clone(source, site_name, ports, shared_database)
+        except Exception:
+            if shared_database is not None:
+                shared.drop_database(shared_database)
+            with self.registry.transaction():
+                self.registry.remove(site_name)
+            self.allocator.release(ports)
+            raise
+
+        if database:
+            from app.DatabasePipeline import DatabasePipeline
+            from app.SiteMigrator import get_url_replacements
+
+            replacements = None
+            if source_ports and source_ports.get("wordpress"):
+                replacements = get_url_replacements(
+                    f"http://localhost:{source_ports['wordpress']}",
+                    f"http://localhost:{ports['wordpress']}",
+                )
+            self.site.start_database()
+            pipeline = DatabasePipeline(source.get_database_client(), workers)
+            pipeline.copy(self.site.get_database_client(), replacements)
+
+        return site_name
 
     def get_site(self, name) -> WpSite:
         self.site.load(name)
         return self.site
 
     def get_site_names(self) -> list:
-        return os.listdir(SITES_DIR)
+        return self.registry.names()
 
-    def _initialize_reserved_ports(self) -> None:
-        for site in os.listdir(SITES_DIR):
-            config = dotenv_values(f"{SITES_DIR}/{site}/.env")
+    @traced("reindex")
+    def reindex(self) -> int:
+        with self.registry.transaction():
+            self.registry.reindex()
+            self._initialize_reserved_ports()
+        return len(self.registry.names())
 
-            if config.get("PHPMYADMIN_PORT") is not None:
-                self.reserved_ports.append(int(config.get("PHPMYADMIN_PORT")))
+    def select_sites(self, selectors=(), all_sites=False) -> list:
+        """
+        Returns the names of the sites matching any of the glob ``selectors``, or every
+        site when ``all_sites`` is set. Raises ValueError for a selector matching no
+        site.
+        """
+        names = self.registry.names()
+        if all_sites:
+            return names
+
+        selected = []
+        for selector in selectors:
+            matches = fnmatch.filter(names, selector)
+            if not matches:
+                raise ValueError(f"No site matches '{selector}'.")
+            selected.extend(name for name in matches if name not in selected)
+        return selected
+
+    def orchestrate(self, action, names, concurrency=8, on_progress=None) -> list:
+        from app.ContainerOrchestrator import ContainerOrchestrator
+
+        orchestrator = ContainerOrchestrator(concurrency, on_progress=on_progress)
+        return orchestrator.run(
+            action, [(name, os.path.join(SITES_DIR, name)) for name in names]
+        )
+
+    def hibernate(self, names, idle_timeout=900, on_event=None) -> None:
+        from app.Hibernator import Hibernator
+
+        sites = []
+        for name in names:
+            path = os.path.join(SITES_DIR, name)
+            ports = dict(self.registry.get(name)["ports"])
+            if EnvFile(os.path.join(path, ".env")).get("DATABASE_MODE") == "shared":
+                # Shared sites use the shared phpMyAdmin, so only WordPress is proxied
+                ports.pop("phpmyadmin", None)
+            sites.append((name, path, ports))
+        Hibernator(idle_timeout, on_event=on_event).serve(sites)
+
+    def health(self, names, timeout=5, samples=1) -> list:
+        """
+        Probes the WordPress and phpMyAdmin endpoints of every site, on the ports set
+        in the site's .env file. Sites on the shared database server only have
+        WordPress.
+        """
+        endpoints = []
+        for name in names:
+            config = EnvFile(os.path.join(SITES_DIR, name, ".env")).get_many(
+                ["WORDPRESS_PORT", "PHPMYADMIN_PORT", "DATABASE_MODE"]
+            )
+            services = ["wordpress"]
+            if config["DATABASE_MODE"] != "shared":
+                services.append("phpmyadmin")
+            for service in services:
+                port = config[f"{service.upper()}_PORT"]
+                if port:
+                    endpoints.append((name, service, int(port)))
+
+        from app.HealthProbe import HealthProbe
+
+        return HealthProbe(timeout, samples).probe(endpoints)
+
+    def upgrade_templates(self, dry_run=False, workers=8) -> list:
+        from app.TemplateUpgrader import TemplateUpgrader
+
+        return TemplateUpgrader(self.registry, workers=workers).upgrade(dry_run)
+
+    def _expire_pending(self) -> None:
+        """
+        Drops the reservations and staging directories of creates whose process was
+        killed, so their names and ports become available again.
+        """
+        self.registry.expire_pending()
+        self.site.sweep_staging()
+
+    def _initialize_reserved_ports(self) -> None:
+        if self.listening_ports is None:
+            self.listening_ports = listening_ports()
 
-            if config.get("WORDPRESS_PORT") is not None:
-                self.reserved_ports.append(int(config.get("WORDPRESS_PORT")))
+        self.allocator = PortAllocator()
+        self.site.allocator = self.allocator
+        self.allocator.reserve_ports(self.registry.reserved_ports())
+        self.allocator.reserve_ports(self.listening_ports)
 
     def _get_available_ports(self) -> dict:
-        ports = {}
-
-        for port in range(8000, 9000):
-            if (
-                port not in self.reserved_ports
-                and (port + 1000) not in self.reserved_ports
-            ):
-                ports["wordpress"] = port
-                ports["phpmyadmin"] = port + 1000
-                break
-
-        return ports
+        return self.allocator.allocate()
@@ -1,6 +1,118 @@
+import os
+import shutil
+
+from app.DatabasePipeline import DATA_SUFFIX, DatabasePipeline
+from app.EnvFile import EnvFile
+from app.SearchReplace import SearchReplace
+from app.SitePackager import open_compressed, open_decompressed
+from app.Tracer import traced
+
+
 class SiteMigrator:
     def __init__(self):
         pass
 
-    def migrate(self, site):
-        pass
+    @traced("migrate", counters=("files", "bytes", "rows", "replacements"))
+    def migrate(
+        self,
+        site,
+        dump_dir: str,
+        output_dir: str,
+        to_production: bool = True,
+        workers: int = None,
+    ) -> dict:
+        """
+        Rewrites the site's URLs in the table dumps of ``dump_dir`` into
+        ``output_dir``, fixing PHP-serialized string lengths along the way. Schema
+        dumps are copied unchanged.
+
+        Args:
+            site (WpSite): Loaded site whose local and production URLs are used.
+            dump_dir (str): Directory containing the table dumps.
+            output_dir (str): Directory to write the rewritten dumps to.
+            to_production (bool): Rewrite local URLs to production ones, or the reverse.
+            workers (int): Number of worker processes, defaults to the CPU count.
+        """
+        if not os.path.isdir(dump_dir):
+            raise FileNotFoundError(f"Dump path: '{dump_dir}' not found.")
+
+        local_url, production_url = self._get_urls(site)
+        source, target = (
+            (local_url, production_url) if to_production else (production_url, local_url)
+        )
+        engine = SearchReplace(get_url_replacements(source, target), workers)
+
+        os.makedirs(output_dir, exist_ok=True)
+        stats = {"files": 0, "bytes": 0, "rows": 0, "replacements": 0, "seconds": 0}
+
+        for name in sorted(os.listdir(dump_dir)):
+            input_path = os.path.join(dump_dir, name)
+            output_path = os.path.join(output_dir, name)
+            if DATA_SUFFIX not in name:
+                shutil.copyfile(input_path, output_path)
+                continue
+
+            with open_decompressed(input_path) as reader:
+                with open_compressed(output_path) as writer:
+                    file_stats = engine.process_stream(reader, writer)
+
+            stats["files"] += 1
+            for key in ("bytes", "rows", "replacements", "seconds"):
+                stats[key] += file_stats[key]
+
+        seconds = stats["seconds"]
+        stats["bytes_per_second"] = int(stats["bytes"] / seconds) if seconds > 0 else 0
+        stats["rows_per_second"] = int(stats["rows"] / seconds) if seconds > 0 else 0
+        return stats
+
+    def dump_database(self, site, output_dir: str, workers: int = 4) -> dict:
+        """
+        Dumps the site's database as one compressed stream per table.
+
+        Args:
+            site (WpSite): Loaded site whose database is dumped.
+            output_dir (str): Directory to write the table dumps to.
+            workers (int): Number of mysqldump processes dumping tables at once.
+        """
+        pipeline = DatabasePipeline(site.get_database_client(), workers)
+        return pipeline.dump(output_dir)
+
+    def restore_database(self, site, input_dir: str, workers: int = 4) -> dict:
+        """
+        Restores table dumps written by dump_database into the site's database.
+
+        Args:
+            site (WpSite): Loaded site whose database is restored.
+            input_dir (str): Directory containing the table dumps.
+            workers (int): Number of tables loaded concurrently.
+        """
+        if not os.path.isdir(input_dir):
+            raise FileNotFoundError(f"Dump path: '{input_dir}' not found.")
+
+        pipeline = DatabasePipeline(site.get_database_client(), workers)
+        return pipeline.restore(input_dir)
+
+    def _get_urls(self, site) -> tuple:
+        config = EnvFile(os.path.join(site.path, ".env")).get_many(
+            ["WORDPRESS_PORT", "SSH_DOMAIN"]
+        )
+        if not config.get("WORDPRESS_PORT") or not config.get("SSH_DOMAIN"):
+            raise ValueError(
+                "WORDPRESS_PORT and SSH_DOMAIN must be set in the site's .env"
+            )
+
+        return (
+            f"http://localhost:{config.get('WORDPRESS_PORT')}",
+            f"https://{config.get('SSH_DOMAIN')}",
+        )
+
+
+def get_url_replacements(source: str, target: str) -> list:
+    """
+    Returns the replacements moving ``source`` URLs to ``target``, including the
+    slash-escaped form WordPress stores in JSON values.
+    """
+    return [
+        (source, target),
+        (source.replace("/", "\\/"), target.replace("/", "\\/")),
+    ]
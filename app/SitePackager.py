@@ -0,0 +1,203 @@
+import gzip
+import hashlib
+import json
+import os
+import tarfile
+import time
+
+from app.Tracer import current_span, traced
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is an optional dependency
+    zstandard = None
+
+BUFFER_SIZE = 1024 * 1024
+MANIFEST_FILE = "manifest.json"
+MEDIA_ARCHIVE = "media.tar"
+
+# Formats that are already compressed; recompressing them only burns CPU
+STORED_EXTENSIONS = {
+    ".7z",
+    ".avif",
+    ".bz2",
+    ".gif",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".m4a",
+    ".mov",
+    ".mp3",
+    ".mp4",
+    ".ogg",
+    ".pdf",
+    ".png",
+    ".rar",
+    ".webm",
+    ".webp",
+    ".woff",
+    ".woff2",
+    ".xz",
+    ".zip",
+    ".zst",
+}
+
+
+class SitePackager:
+    """
+    Streams a site's source tree into a package directory.
+
+    Compressible files go into ``files.tar.zst`` (compressed with zstd worker threads,
+    or ``files.tar.gz`` when zstandard is not installed) while already-compressed media
+    is stored as-is in ``media.tar``. Files are read in fixed-size buffers, so neither
+    a file nor the archive is ever held in memory. A manifest with per-file sizes,
+    SHA-256 hashes and throughput statistics is written next to the archives.
+    """
+
+    source_dir = None
+    threads = None
+    level = None
+
+    def __init__(self, source_dir: str, threads: int = -1, level: int = 3):
+        self.source_dir = source_dir
+        self.threads = threads
+        self.level = level
+
+    @traced("package")
+    def package(self, output_dir: str) -> dict:
+        """
+        Packages the source directory into ``output_dir`` and returns the manifest.
+
+        Args:
+            output_dir (str): Directory to write the archives and manifest to.
+        """
+        if not os.path.isdir(self.source_dir):
+            raise FileNotFoundError(f"Source path: '{self.source_dir}' not found.")
+
+        os.makedirs(output_dir, exist_ok=True)
+        compression = "zstd" if zstandard is not None else "gzip"
+        files_archive = f"files.tar.{compression_extension()}"
+        entries = []
+        start = time.perf_counter()
+
+        with open_compressed(
+            os.path.join(output_dir, files_archive), self.level, self.threads
+        ) as stream:
+            with open(os.path.join(output_dir, MEDIA_ARCHIVE), "wb") as media_file:
+                with tarfile.open(fileobj=stream, mode="w|") as files_tar:
+                    with tarfile.open(fileobj=media_file, mode="w|") as media_tar:
+                        for path, arcname in walk(self.source_dir):
+                            stored = _is_stored(arcname)
+                            tar = media_tar if stored else files_tar
+                            entry = _add(tar, path, arcname)
+                            if entry is not None:
+                                entry["archive"] = (
+                                    MEDIA_ARCHIVE if stored else files_archive
+                                )
+                                entries.append(entry)
+
+        total_bytes = sum(entry["size"] for entry in entries)
+        manifest = {
+            "compression": compression,
+            "files": entries,
+            "stats": throughput(len(entries), total_bytes, time.perf_counter() - start),
+        }
+
+        with open(os.path.join(output_dir, MANIFEST_FILE), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+        current_span().add(files=len(entries), bytes=total_bytes)
+        return manifest
+
+
+class _HashingReader:
+    """
+    File wrapper that hashes the bytes as tarfile streams them into the archive.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.hash.update(data)
+        return data
+
+
+def open_compressed(path: str, level: int = 3, threads: int = -1):
+    """
+    Opens ``path`` for writing through a zstd stream using ``threads`` worker threads,
+    falling back to single-threaded gzip when zstandard is not installed.
+    """
+    if zstandard is None:
+        return gzip.open(path, "wb", compresslevel=6)
+
+    compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+    return compressor.stream_writer(open(path, "wb"), closefd=True)
+
+
+def open_decompressed(path: str):
+    """
+    Opens a file written by open_compressed for streaming reads, picking the codec
+    from its extension.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+
+    if zstandard is None:
+        raise RuntimeError("zstandard must be installed to read .zst files")
+
+    decompressor = zstandard.ZstdDecompressor()
+    return decompressor.stream_reader(open(path, "rb"), closefd=True)
+
+
+def compression_extension() -> str:
+    return "zst" if zstandard is not None else "gz"
+
+
+def throughput(files: int, total_bytes: int, seconds: float) -> dict:
+    return {
+        "files": files,
+        "bytes": total_bytes,
+        "seconds": round(seconds, 6),
+        "bytes_per_second": int(total_bytes / seconds) if seconds > 0 else 0,
+    }
+
+
+def walk(root: str):
+    """
+    Yields (path, archive name) pairs for every entry below ``root`` using os.scandir.
+    Directories are yielded before their contents.
+    """
+    stack = [(root, "")]
+
+    while stack:
+        directory, prefix = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                arcname = f"{prefix}{entry.name}"
+                yield entry.path, arcname
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, f"{arcname}/"))
+
+
+def _is_stored(arcname: str) -> bool:
+    return os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+
+
+def _add(tar: tarfile.TarFile, path: str, arcname: str) -> dict:
+    """
+    Adds a single entry to ``tar`` and returns its manifest entry for regular files.
+    """
+    tarinfo = tar.gettarinfo(path, arcname)
+
+    if not tarinfo.isfile():
+        tar.addfile(tarinfo)
+        return None
+
+    with open(path, "rb") as file:
+        reader = _HashingReader(file)
+        tar.addfile(tarinfo, reader)
+
+    return {"path": arcname, "size": tarinfo.size, "sha256": reader.hash.hexdigest()}
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from app.EnvFile import EnvFile
+from app.FileLock import FileLock
+from app.Tracer import current_span, traced
+from app.constants import (
+    COMPOSE_FILE,
+    REGISTRY_FILE,
+    SITES_DIR,
+    TEMPLATE_STATE_FILE,
+    TEMPLATES_DIR,
+)
+
+REGISTRY_VERSION = 1
+# Seconds after which a pending entry expires even if its pid is alive, in case the
+# pid was reused by another process
+PENDING_TIMEOUT = 24 * 60 * 60
+
+
+class SiteRegistry:
+    """
+    On-disk index of every site under SITES_DIR.
+
+    Each entry records the site's name, ports, SSH target and the hash of the compose
+    template it was rendered from, so the CLI can answer most questions with a single
+    read instead of scanning every site's .env file.
+    """
+
+    path = None
+    lock_path = None
+    sites = None
+
+    def __init__(self, path: str = REGISTRY_FILE):
+        self.path = path
+        self.lock_path = os.path.join(os.path.dirname(path), ".lock")
+        self.sites = None
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Holds the registry lock, reloads the index from disk and saves it on success.
+        Nested transactions join the outermost one.
+        """
+        with FileLock(self.lock_path):
+            self._depth += 1
+            try:
+                if self._depth == 1:
+                    self.load()
+                yield self
+                if self._depth == 1:
+                    self.save()
+            finally:
+                self._depth -= 1
+
+    @traced("registry.load")
+    def load(self) -> None:
+        """
+        Loads the registry from disk, rebuilding it from SITES_DIR if it is missing,
+        unreadable or outdated.
+        """
+        data = self._read()
+
+        if data is None:
+            # Re-check under the lock so a concurrent writer's index is never replaced
+            # by a rebuild that cannot see its pending entries.
+            with FileLock(self.lock_path):
+                data = self._read()
+                if data is None:
+                    self.reindex()
+                    self.save()
+                    return
+
+        self.sites = data.get("sites", {})
+
+    @traced("registry.save")
+    def save(self) -> None:
+        """
+        Writes the registry to disk through a temporary file so readers never see a
+        partially written index.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"version": REGISTRY_VERSION, "sites": self._sites()}, file)
+        os.replace(temp_path, self.path)
+
+    @traced("registry.reindex")
+    def reindex(self) -> None:
+        """
+        Rebuilds the registry by scanning SITES_DIR and parsing each site's .env file.
+        Template hashes are read from each site's .template.json, falling back to the
+        previous index for sites created before it was recorded.
+        """
+        previous = self.sites or {}
+        sites = {}
+
+        if os.path.isdir(SITES_DIR):
+            for name in sorted(os.listdir(SITES_DIR)):
+                site_path = os.path.join(SITES_DIR, name)
+                if name.startswith(".") or not os.path.isdir(site_path):
+                    continue
+
+                config = EnvFile(os.path.join(site_path, ".env")).values()
+                sites[name] = _create_entry(
+                    name,
+                    _get_ports(config),
+                    _get_ssh_target(config),
+                    _read_template_hash(site_path)
+                    or previous.get(name, {}).get("template_hash"),
+                )
+
+        self.sites = sites
+        current_span().add(files=len(sites))
+
+    def add(
+        self, name: str, ports: dict, template_hash: str = None, pending: bool = False
+    ) -> None:
+        entry = _create_entry(name, ports, None, template_hash)
+        if pending:
+            # The owner is recorded so entries of killed processes can be expired
+            entry.update(pending=True, pid=os.getpid(), reserved=time.time())
+        self._sites()[name] = entry
+
+    def expire_pending(self) -> list:
+        """
+        Removes the pending entries of processes that are gone or that are older than
+        PENDING_TIMEOUT, releasing their names and ports, and returns their names.
+        Must be called inside a transaction.
+        """
+        sites = self._sites()
+        now = time.time()
+        expired = [
+            name
+            for name, entry in sites.items()
+            if entry.get("pending")
+            and (
+                not is_process_running(entry.get("pid"))
+                or now - entry.get("reserved", 0) > PENDING_TIMEOUT
+            )
+        ]
+        for name in expired:
+            del sites[name]
+        return expired
+
+    def update(self, name: str, **fields) -> None:
+        sites = self._sites()
+        if name not in sites:
+            raise KeyError(f"Site '{name}' is not registered.")
+        sites[name].update(fields)
+
+    def remove(self, name: str) -> None:
+        self._sites().pop(name, None)
+
+    def get(self, name: str) -> dict:
+        return self._sites().get(name)
+
+    def names(self) -> list:
+        return [name for name, entry in self._sites().items() if not entry.get("pending")]
+
+    def reserved_ports(self) -> list:
+        ports = []
+        for entry in self._sites().values():
+            for key in ("phpmyadmin", "wordpress"):
+                if entry["ports"].get(key) is not None:
+                    ports.append(entry["ports"][key])
+        return ports
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if data.get("version") != REGISTRY_VERSION:
+            return None
+
+        return data
+
+    def _sites(self) -> dict:
+        if self.sites is None:
+            self.load()
+        return self.sites
+
+
+def template_hash(templates_dir: str = TEMPLATES_DIR) -> str:
+    """
+    Returns the SHA-256 hash of the docker compose template sites are rendered from.
+    """
+    with open(os.path.join(templates_dir, COMPOSE_FILE), "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def is_process_running(pid: int) -> bool:
+    """
+    Returns whether a process with this pid exists on this host.
+    """
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Owned by another user, but alive
+        return True
+    return True
+
+
+def _read_template_hash(site_path: str) -> str:
+    try:
+        with open(os.path.join(site_path, TEMPLATE_STATE_FILE), "r") as file:
+            return json.load(file).get("template_hash")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _create_entry(name: str, ports: dict, ssh: str, template_hash: str) -> dict:
+    return {
+        "name": name,
+        "ports": {
+            "phpmyadmin": ports.get("phpmyadmin"),
+            "wordpress": ports.get("wordpress"),
+        },
+        "ssh": ssh,
+        "template_hash": template_hash,
+    }
+
+
+def _get_ports(config: dict) -> dict:
+    ports = {}
+
+    if config.get("PHPMYADMIN_PORT") is not None:
+        ports["phpmyadmin"] = int(config.get("PHPMYADMIN_PORT"))
+
+    if config.get("WORDPRESS_PORT") is not None:
+        ports["wordpress"] = int(config.get("WORDPRESS_PORT"))
+
+    return ports
+
+
+def _get_ssh_target(config: dict) -> str:
+    if not config.get("SSH_USER") or not config.get("SSH_DOMAIN"):
+        return None
+    return f"{config.get('SSH_USER')}@{config.get('SSH_DOMAIN')}"
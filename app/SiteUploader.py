@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.SitePackager import throughput, walk
+from app.SshTransport import file_checksum
+from app.Tracer import traced
+
+CHUNK_SIZE = 8 * 1024 * 1024
+JOURNAL_SUFFIX = ".upload.json"
+PART_SUFFIX = ".part"
+
+
+class SiteUploader:
+    """
+    Uploads files in fixed-size chunks over a pool of reused transports.
+
+    Each file is written to ``<remote>.part`` at chunk offsets by several workers at
+    once. Completed chunks are recorded in a journal next to the local file, so an
+    interrupted upload resumes with the missing chunks only. Once every chunk is sent,
+    the remote SHA-256 is compared with the local one before the part file is renamed
+    into place.
+    """
+
+    def __init__(
+        self,
+        pool,
+        chunk_size: int = CHUNK_SIZE,
+        workers: int = 4,
+        bandwidth: int = None,
+    ):
+        """
+        Args:
+            pool (TransportPool): Pool the chunk writes are spread over.
+            chunk_size (int): Size of each chunk in bytes.
+            workers (int): Number of chunks sent concurrently.
+            bandwidth (int): Upper bound on bytes sent per second, unlimited if None.
+        """
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.limiter = RateLimiter(bandwidth) if bandwidth else None
+
+    @traced("upload", counters=("files", "bytes"))
+    def upload(self, local_path: str, remote_path: str) -> dict:
+        """
+        Uploads ``local_path`` to ``remote_path``, resuming a previous attempt if its
+        journal matches the local file. Returns transfer statistics.
+        """
+        start = time.perf_counter()
+        local_stat = os.stat(local_path)
+        part_path = f"{remote_path}{PART_SUFFIX}"
+        journal = _Journal(f"{local_path}{JOURNAL_SUFFIX}")
+        journal.load(remote_path, local_stat, self.chunk_size)
+
+        with self.pool.connection() as transport:
+            if not journal.done or transport.size(part_path) != local_stat.st_size:
+                journal.reset()
+                transport.makedirs(os.path.dirname(remote_path))
+                transport.allocate(part_path, local_stat.st_size)
+                journal.save()
+
+        chunk_count = math.ceil(local_stat.st_size / self.chunk_size)
+        pending = [index for index in range(chunk_count) if index not in journal.done]
+        sent = 0
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            for size in executor.map(
+                lambda index: self._send_chunk(local_path, part_path, index, journal),
+                pending,
+            ):
+                sent += size
+
+        with self.pool.connection() as transport:
+            local_checksum = file_checksum(local_path)
+            if transport.checksum(part_path) != local_checksum:
+                journal.remove()
+                raise RuntimeError(f"Checksum mismatch after uploading '{local_path}'")
+            transport.rename(part_path, remote_path)
+
+        journal.remove()
+        stats = throughput(1, sent, time.perf_counter() - start)
+        stats["resumed_chunks"] = chunk_count - len(pending)
+        stats["sha256"] = local_checksum
+        return stats
+
+    @traced("upload_directory", counters=("files", "bytes"))
+    def upload_directory(self, local_dir: str, remote_dir: str) -> dict:
+        """
+        Uploads every file below ``local_dir`` to the same relative path under
+        ``remote_dir``.
+        """
+        start = time.perf_counter()
+        files = 0
+        sent = 0
+
+        for path, arcname in walk(local_dir):
+            if not os.path.isfile(path) or arcname.endswith(JOURNAL_SUFFIX):
+                continue
+            sent += self.upload(path, f"{remote_dir}/{arcname}")["bytes"]
+            files += 1
+
+        return throughput(files, sent, time.perf_counter() - start)
+
+    def _send_chunk(self, local_path: str, part_path: str, index: int, journal) -> int:
+        offset = index * self.chunk_size
+        with open(local_path, "rb") as file:
+            file.seek(offset)
+            data = file.read(self.chunk_size)
+
+        if self.limiter is not None:
+            self.limiter.consume(len(data))
+
+        with self.pool.connection() as transport:
+            transport.write_at(part_path, offset, data)
+
+        journal.mark_done(index)
+        return len(data)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers, refilled at ``rate`` bytes per second.
+    """
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _Journal:
+    """
+    Resume journal recording which chunks of a file reached the remote.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {}
+        self.done = set()
+        self.lock = threading.Lock()
+
+    def load(self, remote_path: str, local_stat: os.stat_result, chunk_size: int):
+        self.state = {
+            "remote": remote_path,
+            "size": local_stat.st_size,
+            "mtime_ns": local_stat.st_mtime_ns,
+            "chunk_size": chunk_size,
+        }
+        try:
+            with open(self.path, "r") as file:
+                saved = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if all(saved.get(key) == value for key, value in self.state.items()):
+            self.done = set(saved.get("done", []))
+
+    def reset(self) -> None:
+        self.done = set()
+
+    def mark_done(self, index: int) -> None:
+        with self.lock:
+            self.done.add(index)
+            self.save()
+
+    def save(self) -> None:
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({**self.state, "done": sorted(self.done)}, file)
+        os.replace(temp_path, self.path)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,493 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.AtomicFile import write_if_changed
+from app.FileLock import FileLock
+from app.Materializer import reflink
+from app.SitePackager import walk
+from app.Tracer import current_span, span, traced
+from app.constants import PACKAGES_DIR, SNAPSHOTS_DIR
+
+BUFFER_SIZE = 1024 * 1024
+OBJECTS_DIR = "objects"
+MANIFESTS_DIR = "manifests"
+CACHE_DIR = "cache"
+TEMP_DIR = "tmp"
+
+
+class SnapshotStore:
+    """
+    Content-addressed store of site snapshots, shared by every site on the host.
+
+    Each file is stored once under objects/, named by the SHA-256 of its contents, so
+    identical files are only kept once across snapshots and across sites. A snapshot
+    is a manifest mapping the site's paths to object hashes, plus the compressed
+    per-table dumps of its database, stored as objects as well.
+
+    Files are hashed again only when their (mtime, size) changed since the site's last
+    snapshot, and rollback only rewrites the files that differ from the snapshot.
+    """
+
+    path = None
+    workers = None
+
+    def __init__(self, path: str = SNAPSHOTS_DIR, workers: int = None):
+        """
+        Args:
+            path (str): Directory of the store.
+            workers (int): Number of files hashed or verified concurrently.
+        """
+        self.path = path
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+
+    @traced("snapshot")
+    def snapshot(
+        self, site_name: str, site_path: str, label: str = None, dump=None
+    ) -> dict:
+        """
+        Records a snapshot of the site and returns its manifest.
+
+        Args:
+            site_name (str): Name of the site.
+            site_path (str): Path of the site.
+            label (str): Free text describing the snapshot.
+            dump (callable): Called with a directory to write the site's database
+                table dumps to, or None to leave the database out.
+        """
+        start = time.perf_counter()
+        with FileLock(self._lock_path()):
+            cache = self._read_json(self._cache_path(site_name)) or {}
+            with span("scan") as trace:
+                files, symlinks, directories = _scan(site_path)
+                trace.add(files=len(files))
+
+            changed = [
+                arcname
+                for arcname, entry in files.items()
+                if cache.get(arcname, [None, None])[:2]
+                != [entry["mtime_ns"], entry["size"]]
+            ]
+            for arcname, entry in files.items():
+                if arcname not in changed:
+                    entry["hash"] = cache[arcname][2]
+
+            with span("store") as trace, ThreadPoolExecutor(self.workers) as executor:
+                results = executor.map(
+                    lambda arcname: self._store(os.path.join(site_path, arcname)),
+                    changed,
+                )
+                stored = 0
+                for arcname, (digest, written) in zip(changed, results):
+                    files[arcname]["hash"] = digest
+                    stored += written
+                trace.add(files=len(changed), bytes=stored)
+
+            database = None
+            if dump is not None:
+                database, written = self._store_database(dump)
+                stored += written
+
+            manifest = {
+                "site": site_name,
+                "id": self._new_id(site_name),
+                "created": time.time(),
+                "label": label,
+                "files": files,
+                "symlinks": symlinks,
+                "directories": directories,
+                "database": database,
+                "stats": {
+                    "files": len(files),
+                    "hashed": len(changed),
+                    "stored_bytes": stored,
+                    "seconds": round(time.perf_counter() - start, 6),
+                },
+            }
+            self._write_json(self._manifest_path(site_name, manifest["id"]), manifest)
+            self._write_json(
+                self._cache_path(site_name),
+                {
+                    arcname: [entry["mtime_ns"], entry["size"], entry["hash"]]
+                    for arcname, entry in files.items()
+                },
+            )
+
+        current_span().add(files=len(changed), bytes=stored)
+        return manifest
+
+    def snapshots(self, site_name: str) -> list:
+        """
+        Returns the manifests of the site's snapshots, oldest first, without their
+        file lists.
+        """
+        directory = os.path.join(self.path, MANIFESTS_DIR, site_name)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+
+        snapshots = []
+        for name in names:
+            manifest = self._read_json(os.path.join(directory, name))
+            if manifest is not None:
+                for key in ("files", "symlinks", "directories"):
+                    del manifest[key]
+                snapshots.append(manifest)
+        return sorted(snapshots, key=lambda manifest: manifest["created"])
+
+    def get(self, site_name: str, snapshot_id: str = None) -> dict:
+        """
+        Returns the manifest of a snapshot, or of the site's latest snapshot.
+        """
+        if snapshot_id is None:
+            snapshots = self.snapshots(site_name)
+            if not snapshots:
+                raise FileNotFoundError(f"Site '{site_name}' has no snapshots.")
+            snapshot_id = snapshots[-1]["id"]
+
+        manifest = self._read_json(self._manifest_path(site_name, snapshot_id))
+        if manifest is None:
+            raise FileNotFoundError(
+                f"Snapshot '{snapshot_id}' of site '{site_name}' not found."
+            )
+        return manifest
+
+    @traced("rollback")
+    def rollback(
+        self, site_name: str, site_path: str, snapshot_id: str = None, restore=None
+    ) -> dict:
+        """
+        Restores the site to a snapshot and returns how many files were restored,
+        deleted and left untouched.
+
+        Files whose (mtime, size) match the snapshot are assumed unchanged, files with
+        the same size are hashed to check, and only differing files are rewritten, by
+        reflink where the filesystem allows it and by copy otherwise. Objects are
+        never hardlinked into the site, where an in-place edit would corrupt them.
+
+        Args:
+            site_name (str): Name of the site.
+            site_path (str): Path of the site.
+            snapshot_id (str): Snapshot to restore, defaults to the latest.
+            restore (callable): Called with a directory holding the snapshot's table
+                dumps to restore the database, or None to leave the database as is.
+        """
+        start = time.perf_counter()
+        manifest = self.get(site_name, snapshot_id)
+        stats = {"restored": 0, "deleted": 0, "unchanged": 0, "bytes": 0}
+
+        with FileLock(self._lock_path()):
+            files, symlinks, directories = _scan(site_path)
+            for arcname in sorted(set(files) - set(manifest["files"])):
+                os.remove(os.path.join(site_path, arcname))
+                stats["deleted"] += 1
+            for arcname in sorted(set(symlinks) - set(manifest["symlinks"])):
+                os.remove(os.path.join(site_path, arcname))
+            for arcname in sorted(set(directories) - set(manifest["directories"]))[::-1]:
+                shutil.rmtree(os.path.join(site_path, arcname), ignore_errors=True)
+            for arcname in manifest["directories"]:
+                os.makedirs(os.path.join(site_path, arcname), exist_ok=True)
+
+            with ThreadPoolExecutor(self.workers) as executor:
+                differs = list(
+                    executor.map(
+                        lambda item: _differs(site_path, files.get(item[0]), *item),
+                        manifest["files"].items(),
+                    )
+                )
+
+            for (arcname, entry), changed in zip(manifest["files"].items(), differs):
+                if not changed:
+                    stats["unchanged"] += 1
+                    continue
+
+                target = os.path.join(site_path, arcname)
+                if os.path.lexists(target):
+                    os.remove(target)
+                _restore(self._object_path(entry["hash"]), target)
+                os.chmod(target, entry["mode"])
+                os.utime(target, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+                stats["restored"] += 1
+                stats["bytes"] += entry["size"]
+
+            for arcname, link in manifest["symlinks"].items():
+                target = os.path.join(site_path, arcname)
+                if os.path.lexists(target):
+                    if os.path.islink(target) and os.readlink(target) == link:
+                        continue
+                    os.remove(target)
+                os.symlink(link, target)
+
+            if restore is not None and manifest["database"] is not None:
+                with self._database_dir(manifest["database"]) as input_dir:
+                    stats["database"] = restore(input_dir)
+
+            # Files restored from the snapshot need no hashing on the next snapshot
+            self._write_json(
+                self._cache_path(site_name),
+                {
+                    arcname: [entry["mtime_ns"], entry["size"], entry["hash"]]
+                    for arcname, entry in manifest["files"].items()
+                },
+            )
+
+        stats["id"] = manifest["id"]
+        stats["seconds"] = round(time.perf_counter() - start, 6)
+        current_span().add(files=stats["restored"], bytes=stats["bytes"])
+        return stats
+
+    @traced("prune")
+    def prune(self, site_name: str, keep_last: int = None, keep_days: float = None):
+        """
+        Deletes the site's snapshots outside the retention policy, then the objects no
+        snapshot refers to anymore. A snapshot is kept when it is one of the
+        ``keep_last`` latest or younger than ``keep_days``. Without either, every
+        snapshot is kept.
+
+        Returns the removed snapshot ids and the objects and bytes reclaimed.
+        """
+        removed = []
+        with FileLock(self._lock_path()):
+            if keep_last is not None or keep_days is not None:
+                snapshots = self.snapshots(site_name)[::-1]
+                cutoff = time.time() - (keep_days or 0) * 86400
+                for index, manifest in enumerate(snapshots):
+                    recent = keep_last is not None and index < keep_last
+                    young = keep_days is not None and manifest["created"] >= cutoff
+                    if not recent and not young:
+                        os.remove(self._manifest_path(site_name, manifest["id"]))
+                        removed.append(manifest["id"])
+
+            result = self.collect_garbage()
+        result["removed"] = removed
+        return result
+
+    def collect_garbage(self) -> dict:
+        """
+        Deletes the objects no snapshot of any site refers to, and drops them from the
+        sites' hash caches so the next snapshot stores them again.
+        """
+        objects, size = 0, 0
+        with FileLock(self._lock_path()):
+            referenced = set()
+            for manifest in self._manifests():
+                referenced.update(entry["hash"] for entry in manifest["files"].values())
+                referenced.update(
+                    entry["hash"] for entry in (manifest["database"] or {}).values()
+                )
+
+            for digest, path in self._objects():
+                if digest not in referenced:
+                    size += os.lstat(path).st_size
+                    os.remove(path)
+                    objects += 1
+
+            for path in self._cache_paths():
+                cache = self._read_json(path) or {}
+                self._write_json(
+                    path,
+                    {
+                        arcname: entry
+                        for arcname, entry in cache.items()
+                        if entry[2] in referenced
+                    },
+                )
+
+        return {"objects": objects, "bytes": size}
+
+    @traced("verify")
+    def verify(self) -> dict:
+        """
+        Re-hashes every object in parallel and checks that every object a snapshot
+        refers to exists. Returns the number of objects checked and the hashes of the
+        corrupt and missing ones.
+        """
+        objects = list(self._objects())
+        with ThreadPoolExecutor(self.workers) as executor:
+            hashes = list(executor.map(lambda item: file_hash(item[1]), objects))
+
+        stored = {digest for digest, _ in objects}
+        corrupt = sorted(
+            digest for (digest, _), actual in zip(objects, hashes) if digest != actual
+        )
+        missing = set()
+        for manifest in self._manifests():
+            entries = [
+                *manifest["files"].values(),
+                *(manifest["database"] or {}).values(),
+            ]
+            missing.update(e["hash"] for e in entries if e["hash"] not in stored)
+
+        current_span().add(files=len(objects))
+        return {"objects": len(objects), "corrupt": corrupt, "missing": sorted(missing)}
+
+    def _store(self, path: str) -> tuple:
+        """
+        Adds a file to the store unless an identical one is already there. Returns its
+        hash and the number of bytes written.
+        """
+        digest = file_hash(path)
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            return digest, 0
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        temp_path = f"{object_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            reflink(path, temp_path)
+        except OSError:
+            shutil.copyfile(path, temp_path)
+        # The file may have changed since it was hashed
+        if file_hash(temp_path) != digest:
+            os.remove(temp_path)
+            return self._store(path)
+
+        os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(temp_path, object_path)
+        return digest, os.path.getsize(object_path)
+
+    def _store_database(self, dump) -> tuple:
+        output_dir = os.path.join(self.path, TEMP_DIR, uuid.uuid4().hex)
+        os.makedirs(output_dir)
+        try:
+            dump(output_dir)
+            database, stored = {}, 0
+            for name in sorted(os.listdir(output_dir)):
+                path = os.path.join(output_dir, name)
+                digest, written = self._store(path)
+                database[name] = {"hash": digest, "size": os.path.getsize(path)}
+                stored += written
+            return database, stored
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def _database_dir(self, database: dict):
+        """
+        Yields a temporary directory holding the table dumps of a snapshot.
+        """
+        input_dir = os.path.join(self.path, TEMP_DIR, uuid.uuid4().hex)
+        os.makedirs(input_dir)
+        try:
+            for name, entry in database.items():
+                shutil.copyfile(
+                    self._object_path(entry["hash"]), os.path.join(input_dir, name)
+                )
+            yield input_dir
+        finally:
+            shutil.rmtree(input_dir, ignore_errors=True)
+
+    def _manifests(self):
+        directory = os.path.join(self.path, MANIFESTS_DIR)
+        if not os.path.isdir(directory):
+            return
+        for site_name in sorted(os.listdir(directory)):
+            for name in sorted(os.listdir(os.path.join(directory, site_name))):
+                manifest = self._read_json(os.path.join(directory, site_name, name))
+                if manifest is not None:
+                    yield manifest
+
+    def _objects(self):
+        objects_dir = self._objects_dir()
+        if not os.path.isdir(objects_dir):
+            return
+        for prefix in sorted(os.listdir(objects_dir)):
+            for name in sorted(os.listdir(os.path.join(objects_dir, prefix))):
+                if not name.endswith(".tmp"):
+                    yield prefix + name, os.path.join(objects_dir, prefix, name)
+
+    def _cache_paths(self):
+        directory = os.path.join(self.path, CACHE_DIR)
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            yield os.path.join(directory, name)
+
+    def _new_id(self, site_name: str) -> str:
+        snapshot_id = time.strftime("%Y%m%d-%H%M%S")
+        suffix = 1
+        candidate = snapshot_id
+        while os.path.exists(self._manifest_path(site_name, candidate)):
+            suffix += 1
+            candidate = f"{snapshot_id}-{suffix}"
+        return candidate
+
+    def _objects_dir(self) -> str:
+        return os.path.join(self.path, OBJECTS_DIR)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, OBJECTS_DIR, digest[:2], digest[2:])
+
+    def _manifest_path(self, site_name: str, snapshot_id: str) -> str:
+        return os.path.join(self.path, MANIFESTS_DIR, site_name, f"{snapshot_id}.json")
+
+    def _cache_path(self, site_name: str) -> str:
+        return os.path.join(self.path, CACHE_DIR, f"{site_name}.json")
+
+    def _lock_path(self) -> str:
+        return os.path.join(self.path, ".lock")
+
+    def _read_json(self, path: str):
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_json(self, path: str, data) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_if_changed(path, json.dumps(data))
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(BUFFER_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scan(site_path: str) -> tuple:
+    """
+    Returns the regular files of a site with their stat, its symlinks and its
+    directories, leaving out the packages directory.
+    """
+    files, symlinks, directories = {}, {}, []
+    for path, arcname in walk(site_path):
+        if arcname == PACKAGES_DIR or arcname.startswith(f"{PACKAGES_DIR}/"):
+            continue
+
+        file_stat = os.lstat(path)
+        if stat.S_ISLNK(file_stat.st_mode):
+            symlinks[arcname] = os.readlink(path)
+        elif stat.S_ISDIR(file_stat.st_mode):
+            directories.append(arcname)
+        elif stat.S_ISREG(file_stat.st_mode):
+            files[arcname] = {
+                "size": file_stat.st_size,
+                "mtime_ns": file_stat.st_mtime_ns,
+                "mode": stat.S_IMODE(file_stat.st_mode),
+            }
+    return files, symlinks, directories
+
+
+def _restore(object_path: str, target: str) -> None:
+    try:
+        reflink(object_path, target)
+    except OSError:
+        shutil.copyfile(object_path, target)
+
+
+def _differs(site_path: str, current: dict, arcname: str, entry: dict) -> bool:
+    if current is None or current["size"] != entry["size"]:
+        return True
+    if current["mtime_ns"] == entry["mtime_ns"]:
+        return False
+    return file_hash(os.path.join(site_path, arcname)) != entry["hash"]
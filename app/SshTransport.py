@@ -0,0 +1,227 @@
+import hashlib
+import os
+import queue
+import shlex
+import shutil
+import stat
+import threading
+from contextlib import contextmanager
+
+BUFFER_SIZE = 1024 * 1024
+
+
+class SftpTransport:
+    """
+    File transport to a remote host over a single SSH connection and SFTP session.
+    Remote hashes are computed on the server with ``sha256sum``.
+    """
+
+    def __init__(self, host: str, user: str, password: str, port: int = 22):
+        try:
+            import paramiko
+        except ImportError as e:
+            raise RuntimeError("paramiko must be installed to transfer over SSH") from e
+
+        self.client = paramiko.SSHClient()
+        self.client.load_system_host_keys()
+        self.client.connect(host, port=port, username=user, password=password)
+        self.sftp = self.client.open_sftp()
+
+    def makedirs(self, path: str) -> None:
+        current = ""
+        for part in path.strip("/").split("/"):
+            current = f"{current}/{part}" if current or path.startswith("/") else part
+            try:
+                self.sftp.stat(current)
+            except FileNotFoundError:
+                self.sftp.mkdir(current)
+
+    def size(self, path: str):
+        try:
+            return self.sftp.stat(path).st_size
+        except FileNotFoundError:
+            return None
+
+    def allocate(self, path: str, size: int) -> None:
+        with self.sftp.open(path, "wb") as file:
+            file.truncate(size)
+
+    def write_at(self, path: str, offset: int, data: bytes) -> None:
+        with self.sftp.open(path, "r+b") as file:
+            file.seek(offset)
+            file.write(data)
+
+    def read_at(self, path: str, offset: int, length: int) -> bytes:
+        with self.sftp.open(path, "rb") as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def listdir(self, path: str) -> list:
+        """
+        Returns (name, is_dir, size, mtime) tuples for the entries of ``path``.
+        """
+        return [
+            (attr.filename, stat.S_ISDIR(attr.st_mode), attr.st_size, attr.st_mtime)
+            for attr in self.sftp.listdir_attr(path)
+        ]
+
+    def checksum(self, path: str) -> str:
+        return self.checksums([path])[path]
+
+    def checksums(self, paths: list) -> dict:
+        """
+        Hashes several remote files with a single ``sha256sum`` invocation.
+        """
+        arguments = " ".join(shlex.quote(path) for path in paths)
+        _, stdout, _ = self.client.exec_command(f"sha256sum -- {arguments}")
+        output = stdout.read().decode()
+        if stdout.channel.recv_exit_status() != 0 or not output:
+            raise RuntimeError(f"Could not compute the checksums of {paths}")
+
+        checksums = {}
+        for line in output.splitlines():
+            checksum, path = line.split(None, 1)
+            checksums[path.lstrip("*")] = checksum
+        return checksums
+
+    def put(self, local_path: str, path: str) -> None:
+        self.sftp.put(local_path, path)
+
+    def rename(self, source: str, destination: str) -> None:
+        self.sftp.posix_rename(source, destination)
+
+    def remove(self, path: str) -> None:
+        self.sftp.remove(path)
+
+    def remove_tree(self, path: str) -> None:
+        _, stdout, _ = self.client.exec_command(f"rm -rf -- {shlex.quote(path)}")
+        if stdout.channel.recv_exit_status() != 0:
+            raise RuntimeError(f"Could not remove '{path}'")
+
+    def close(self) -> None:
+        self.sftp.close()
+        self.client.close()
+
+
+class LocalTransport:
+    """
+    Transport with the same interface as SftpTransport that operates on a local
+    directory, e.g. a mounted remote. Relative remote paths resolve against ``root``.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def makedirs(self, path: str) -> None:
+        os.makedirs(self._path(path), exist_ok=True)
+
+    def size(self, path: str):
+        try:
+            return os.path.getsize(self._path(path))
+        except FileNotFoundError:
+            return None
+
+    def allocate(self, path: str, size: int) -> None:
+        with open(self._path(path), "wb") as file:
+            file.truncate(size)
+
+    def write_at(self, path: str, offset: int, data: bytes) -> None:
+        with open(self._path(path), "r+b") as file:
+            file.seek(offset)
+            file.write(data)
+
+    def read_at(self, path: str, offset: int, length: int) -> bytes:
+        with open(self._path(path), "rb") as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def listdir(self, path: str) -> list:
+        entries = []
+        with os.scandir(self._path(path)) as iterator:
+            for entry in iterator:
+                entry_stat = entry.stat(follow_symlinks=False)
+                entries.append(
+                    (
+                        entry.name,
+                        entry.is_dir(follow_symlinks=False),
+                        entry_stat.st_size,
+                        int(entry_stat.st_mtime),
+                    )
+                )
+        return entries
+
+    def checksum(self, path: str) -> str:
+        return file_checksum(self._path(path))
+
+    def checksums(self, paths: list) -> dict:
+        return {path: self.checksum(path) for path in paths}
+
+    def put(self, local_path: str, path: str) -> None:
+        shutil.copyfile(local_path, self._path(path))
+
+    def rename(self, source: str, destination: str) -> None:
+        os.replace(self._path(source), self._path(destination))
+
+    def remove(self, path: str) -> None:
+        os.remove(self._path(path))
+
+    def remove_tree(self, path: str) -> None:
+        shutil.rmtree(self._path(path), ignore_errors=True)
+
+    def close(self) -> None:
+        pass
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, path.lstrip("/"))
+
+
+class TransportPool:
+    """
+    Bounded pool of reusable transports. Connections are opened lazily, up to ``size``
+    at a time, and handed back to the pool after each use.
+    """
+
+    def __init__(self, factory, size: int = 4):
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._available = threading.Semaphore(size)
+
+    @contextmanager
+    def connection(self):
+        self._available.acquire()
+        try:
+            try:
+                transport = self._idle.get_nowait()
+            except queue.Empty:
+                transport = self.factory()
+                with self._lock:
+                    self._all.append(transport)
+
+            try:
+                yield transport
+            except Exception:
+                # A failed operation may leave the session unusable, so drop it
+                with self._lock:
+                    self._all.remove(transport)
+                transport.close()
+                raise
+            self._idle.put(transport)
+        finally:
+            self._available.release()
+
+    def close(self) -> None:
+        with self._lock:
+            transports, self._all = self._all, []
+        for transport in transports:
+            transport.close()
+
+
+def file_checksum(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for data in iter(lambda: file.read(BUFFER_SIZE), b""):
+            file_hash.update(data)
+    return file_hash.hexdigest()
@@ -0,0 +1,165 @@
+import difflib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.AtomicFile import write_if_changed
+from app.ConfigHelper import ConfigHelper
+from app.SiteRegistry import template_hash
+from app.constants import (
+    COMPOSE_FILE,
+    SHARED_TEMPLATES_DIR,
+    SITES_DIR,
+    TEMPLATE_STATE_FILE,
+    TEMPLATES_DIR,
+)
+
+
+class TemplateUpgrader:
+    """
+    Re-renders the compose file of every site built from an outdated template.
+
+    Each site records the hash of the template and the inputs it was rendered with
+    in its .template.json, so stale sites are found by comparing hashes and
+    re-rendered from the current template without touching up-to-date ones.
+    """
+
+    registry = None
+    templates_dir = None
+    shared_templates_dir = None
+    workers = None
+
+    def __init__(
+        self,
+        registry,
+        templates_dir: str = TEMPLATES_DIR,
+        workers: int = 8,
+        shared_templates_dir: str = SHARED_TEMPLATES_DIR,
+    ):
+        """
+        Args:
+            registry (SiteRegistry): Registry listing the sites to upgrade.
+            templates_dir (str): Directory holding the current templates.
+            workers (int): Number of sites rendered concurrently.
+            shared_templates_dir (str): Directory holding the current templates of
+                sites on the shared database server.
+        """
+        self.registry = registry
+        self.templates_dir = templates_dir
+        self.shared_templates_dir = shared_templates_dir
+        self.workers = workers
+
+    def upgrade(self, dry_run: bool = False) -> list:
+        """
+        Re-renders every stale site and returns one result per site with its status
+        ("current", "stale" on a dry run, or "upgraded") and a unified diff of its
+        compose file.
+
+        Args:
+            dry_run (bool): Only report what would change.
+        """
+        current_hashes = {self.templates_dir: template_hash(self.templates_dir)}
+        if os.path.isdir(self.shared_templates_dir):
+            current_hashes[self.shared_templates_dir] = template_hash(
+                self.shared_templates_dir
+            )
+
+        with self.registry.transaction():
+            names = self.registry.names()
+            entries = [self.registry.get(name) for name in names]
+
+            with ThreadPoolExecutor(self.workers) as executor:
+                results = list(
+                    executor.map(
+                        lambda entry: self._upgrade_site(entry, current_hashes, dry_run),
+                        entries,
+                    )
+                )
+
+            if not dry_run:
+                for result in results:
+                    if result["status"] == "upgraded":
+                        self.registry.update(
+                            result["name"], template_hash=result["template_hash"]
+                        )
+
+        return results
+
+    def _upgrade_site(self, entry: dict, current_hashes: dict, dry_run: bool) -> dict:
+        site_path = os.path.join(SITES_DIR, entry["name"])
+        state = read_template_state(site_path) or {
+            "template_hash": entry.get("template_hash"),
+            "inputs": {"site_name": entry["name"], "ports": entry["ports"]},
+        }
+        inputs = state["inputs"]
+        database = inputs.get("database")
+        templates_dir = (
+            self.templates_dir if database is None else self.shared_templates_dir
+        )
+        current_hash = current_hashes[templates_dir]
+        result = {
+            "name": entry["name"],
+            "status": "current",
+            "diff": "",
+            "template_hash": current_hash,
+        }
+        if state["template_hash"] == current_hash:
+            return result
+
+        compose_path = os.path.join(site_path, COMPOSE_FILE)
+        rendered = ConfigHelper.render_compose(
+            os.path.join(templates_dir, COMPOSE_FILE),
+            inputs["site_name"],
+            inputs["ports"],
+            database,
+        )
+        try:
+            with open(compose_path, "r") as compose_file:
+                previous = compose_file.read()
+        except FileNotFoundError:
+            previous = ""
+
+        result["diff"] = "".join(
+            difflib.unified_diff(
+                previous.splitlines(keepends=True),
+                rendered.splitlines(keepends=True),
+                f"{entry['name']}/{COMPOSE_FILE}",
+                f"{entry['name']}/{COMPOSE_FILE}",
+            )
+        )
+        if dry_run:
+            result["status"] = "stale"
+            return result
+
+        write_if_changed(compose_path, rendered)
+        write_template_state(site_path, current_hash, inputs)
+        result["status"] = "upgraded"
+        return result
+
+
+def read_template_state(site_path: str) -> dict:
+    """
+    Returns the template hash and render inputs recorded for a site, or None for
+    sites created before they were recorded.
+    """
+    try:
+        with open(os.path.join(site_path, TEMPLATE_STATE_FILE), "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_template_state(site_path: str, digest: str, inputs: dict) -> None:
+    """
+    Records the hash of the template a site was rendered from and the inputs used.
+
+    Args:
+        site_path (str): Path of the site.
+        digest (str): Hash of the compose template.
+        inputs (dict): Render inputs, the site name, its ports and, for sites on the
+            shared database server, its database settings.
+    """
+    write_if_changed(
+        os.path.join(site_path, TEMPLATE_STATE_FILE),
+        json.dumps({"template_hash": digest, "inputs": inputs}, indent=2),
+    )
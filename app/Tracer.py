@@ -0,0 +1,215 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+
+# Span currently open in this thread or task, parent of the next span started
+_current = contextvars.ContextVar("span", default=None)
+_tracer = None
+
+
+class Span:
+    """
+    A timed operation with the bytes and files it processed and its child spans.
+    """
+
+    def __init__(self, name: str, attributes: dict = None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.counters = {}
+        self.children = []
+        self.thread = threading.get_ident()
+        self.start = None
+        self.end = None
+        self._token = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def add(self, **counters) -> None:
+        """
+        Adds to the span's counters, e.g. ``add(bytes=size, files=1)``.
+        """
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.perf_counter()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        return False
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            "start": round(self.start - origin, 6),
+            "seconds": round(self.seconds, 6),
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **({"counters": self.counters} if self.counters else {}),
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class _NoopSpan:
+    """
+    Stands in for every span while tracing is disabled.
+    """
+
+    def add(self, **counters) -> None:
+        pass
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Collects the spans started while it is active, under a root span covering the
+    whole traced run.
+
+    Spans nest under the span open in the same thread or asyncio task. Spans started
+    in worker threads, which do not inherit the caller's context, nest under the root.
+    """
+
+    def __init__(self, name: str = "main"):
+        self.origin = time.perf_counter()
+        self.root = Span(name)
+        self.root.start = self.origin
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, attributes: dict) -> Span:
+        parent = _current.get() or self.root
+        span = Span(name, attributes)
+        with self._lock:
+            parent.children.append(span)
+        return span
+
+    def to_json(self) -> dict:
+        return self.root.to_dict(self.origin)
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Returns the spans in the Chrome trace event format, for chrome://tracing or
+        Perfetto.
+        """
+        events = []
+        pid = os.getpid()
+        stack = [self.root]
+        while stack:
+            span = stack.pop()
+            events.append(
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": round((span.start - self.origin) * 1e6, 3),
+                    "dur": round(span.seconds * 1e6, 3),
+                    "pid": pid,
+                    "tid": span.thread,
+                    "args": {**span.attributes, **span.counters},
+                }
+            )
+            stack.extend(span.children)
+
+        events.sort(key=lambda event: event["ts"])
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def format_tree(self) -> str:
+        lines = []
+        stack = [(self.root, 0)]
+        while stack:
+            span, depth = stack.pop()
+            details = " ".join(f"{key}={value}" for key, value in span.counters.items())
+            lines.append(
+                f"{'  ' * depth}{span.name:<{max(40 - 2 * depth, 1)}}"
+                f"{span.seconds * 1000:10.1f} ms  {details}".rstrip()
+            )
+            stack.extend((child, depth + 1) for child in reversed(span.children))
+        return "\n".join(lines)
+
+
+def span(name: str, **attributes):
+    """
+    Returns a span timing the ``with`` block, or a no-op span when tracing is
+    disabled.
+
+    Args:
+        name (str): Name of the operation.
+        attributes: Values describing the operation, shown in the trace.
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.start_span(name, attributes)
+
+
+def traced(name: str = None, counters: tuple = ()):
+    """
+    Decorator running every call of the function in a span, named after the
+    function unless ``name`` is given.
+
+    Args:
+        name (str): Name of the span.
+        counters (tuple): Keys of the stats dict returned by the function to add to
+            the span's counters, e.g. ("files", "bytes").
+    """
+
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+
+            with _tracer.start_span(span_name, {}) as span:
+                result = function(*args, **kwargs)
+                if counters and isinstance(result, dict):
+                    span.add(**{key: result[key] for key in counters if key in result})
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def current_span():
+    """
+    Returns the innermost open span, to add counters to it, or a no-op span when
+    tracing is disabled.
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    return _current.get() or _tracer.root
+
+
+def start_tracing(name: str = "main") -> Tracer:
+    global _tracer
+    _tracer = Tracer(name)
+    return _tracer
+
+
+def stop_tracing() -> Tracer:
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.root.end = time.perf_counter()
+    return tracer
@@ -1,20 +1,137 @@
 import os
 import shutil
+import subprocess
+import time
+import uuid
 
-from app.constants import SITES_DIR, TEMPLATES_DIR
-from app.ConfigHelper import ConfigHelper
+from app.constants import (
+    CHUNK_STORE_DIR,
+    COMPOSE_FILE,
+    DATABASE_DIR,
+    HIBERNATE_FILE,
+    PACKAGES_DIR,
+    REMOTE_DIR,
+    REMOTE_WORDPRESS_DIR,
+    SHARED_NETWORK,
+    SHARED_TEMPLATES_DIR,
+    SITES_DIR,
+    SOURCE_DIR,
+    STAGING_DIR,
+    TEMPLATE_STATE_FILE,
+    TEMPLATES_DIR,
+    TRASH_DIR,
+)
+from app.ConfigHelper import SUBSTITUTIONS, ConfigHelper
+from app.EnvFile import EnvFile
+from app.SiteRegistry import PENDING_TIMEOUT, is_process_running, template_hash
+from app.Tracer import span, traced
+
+# The modules behind packaging, transfers, snapshots and databases are imported by
+# the methods using them, so commands that only read site names stay cheap
 
 
 class WpSite:
     path = None
+    registry = None
+    allocator = None
+
+    def __init__(self, registry=None, allocator=None):
+        self.registry = registry
+        self.allocator = allocator
 
-    def create(self, name: str, ports: dict):
+    def reserve(self, name: str, ports: dict) -> str:
+        """
+        Records a pending registry entry for a site about to be created so its name and
+        ports are taken before the (unlocked) materialization starts. Must be called
+        inside a registry transaction.
+        """
         site_name = self._sanitize_site_name(name)
-        self.path = self._create_site_path(site_name)
-        if not os.path.exists(self.path):
-            shutil.copytree(TEMPLATES_DIR, self.path)
+        if self.registry.get(site_name) is not None or os.path.exists(
+            self._create_site_path(site_name)
+        ):
+            raise FileExistsError(f"Site '{site_name}' already exists.")
+
+        self.registry.add(site_name, ports, pending=True)
+        return site_name
+
+    def sweep_staging(self) -> list:
+        """
+        Deletes the staging directories left behind by creates that were killed, and
+        returns their paths. Staging directories are named <site>.<pid>.<uuid>, those
+        without a pid are only deleted once older than PENDING_TIMEOUT.
+        """
+        try:
+            names = os.listdir(STAGING_DIR)
+        except FileNotFoundError:
+            return []
+
+        swept = []
+        for name in names:
+            path = os.path.join(STAGING_DIR, name)
+            parts = name.rsplit(".", 2)
+            if len(parts) == 3 and parts[1].isdigit():
+                stale = not is_process_running(int(parts[1]))
+            else:
+                try:
+                    stale = time.time() - os.lstat(path).st_mtime > PENDING_TIMEOUT
+                except FileNotFoundError:
+                    continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+                swept.append(path)
+        return swept
+
+    @traced("site.create")
+    def create(self, name: str, ports: dict, database: dict = None):
+        site_name = self._sanitize_site_name(name)
+        digest = self._build(
+            site_name,
+            ports,
+            TEMPLATES_DIR,
+            (COMPOSE_FILE, os.path.basename(SHARED_TEMPLATES_DIR)),
+            database,
+        )
+
+        if self.registry is not None:
+            with self.registry.transaction():
+                self.registry.add(site_name, ports, digest)
+
+        return site_name
+
+    @traced("site.clone")
+    def clone(self, source, name: str, ports: dict, database: dict = None) -> str:
+        """
+        Creates a site from the files of an existing one. Files are reflinked, so they
+        share disk blocks with the source site until either side writes, or copied
+        when the filesystem can't reflink; the clone never shares an inode with the
+        live source. Only the compose file and ports are rendered anew. Packages of
+        the source site are not carried over.
+
+        Args:
+            source (WpSite): Loaded site to clone.
+            name (str): Name of the new site.
+            ports (dict): Ports allocated for the new site.
+            database (dict): Shared database settings of the new site.
+        """
+        if source.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        site_name = self._sanitize_site_name(name)
+        digest = self._build(
+            site_name,
+            ports,
+            source.path,
+            (COMPOSE_FILE, HIBERNATE_FILE, PACKAGES_DIR, TEMPLATE_STATE_FILE),
+            database,
+        )
+
+        if self.registry is not None:
+            with self.registry.transaction():
+                entry = self.registry.get(os.path.basename(source.path)) or {}
+                self.registry.add(site_name, ports, digest)
+                if entry.get("ssh"):
+                    self.registry.update(site_name, ssh=entry["ssh"])
 
-        ConfigHelper.update_compose_file(self.path, site_name, ports)
         return site_name
 
     def load(self, name: str):
@@ -23,9 +140,26 @@ class WpSite:
             raise FileNotFoundError(f"Folder '{path}' not found.")
         self.path = path
 
-    def remove(self):
+    @traced("site.remove")
+    def remove(self, wait: bool = False) -> dict:
+        """
+        Removes the site. Its directory is renamed into the trash and its registry
+        entry and ports are released right away, while the files are deleted by a
+        background reaper. With ``wait`` set, the files are deleted before returning
+        and the bytes reclaimed are returned.
+        """
+        # Dropped first, so a failure leaves the site in place to retry the removal
+        database = self.get_shared_database() if self.path is not None else None
+        if database is not None:
+            from app.SharedDatabase import SharedDatabase
+
+            SharedDatabase().drop_database(database)
+
+        name = os.path.basename(self.path)
+        trash_path = os.path.join(TRASH_DIR, f"{name}.{uuid.uuid4().hex}")
         try:
-            shutil.rmtree(self.path)
+            os.makedirs(TRASH_DIR, exist_ok=True)
+            os.rename(self.path, trash_path)
         except FileNotFoundError as e:
             print(f"Folder '{self.path}' not found.")
             raise e
@@ -36,6 +170,21 @@ class WpSite:
             print(f"An error occurred: {e}")
             raise e
 
+        if self.registry is not None:
+            with self.registry.transaction():
+                entry = self.registry.get(name)
+                if entry is not None and self.allocator is not None:
+                    self.allocator.release(entry["ports"])
+                self.registry.remove(name)
+
+        from app.Reaper import Reaper
+
+        reaper = Reaper()
+        if wait:
+            return reaper.reclaim(trash_path)
+        reaper.spawn()
+        return None
+
     def set_ssh_details(self, user: str, domain: str, password: str):
         if self.path is None:
             raise ValueError("Site path is not set. Please load or create a site first.")
@@ -48,17 +197,351 @@ class WpSite:
 
         ConfigHelper.update_env_file(env_path, properties)
 
-    def package(self, name: str):
-        # Zips all source and database files from site path
-        pass
+        if self.registry is not None:
+            with self.registry.transaction():
+                self.registry.update(os.path.basename(self.path), ssh=f"{user}@{domain}")
 
-    def upload(self):
-        # Uploads packaged site files to remote server
-        pass
+    @traced("site.package")
+    def package(
+        self, name: str = None, incremental: bool = False, database: bool = False
+    ) -> dict:
+        """
+        Packages the site's source files into <site>/packages/<name> and returns the
+        package manifest.
 
-    def download(self):
-        # Downloads source and database files from remote server
-        pass
+        Args:
+            name (str): Package name, defaults to the current timestamp.
+            incremental (bool): Only ship chunks that earlier packages don't contain.
+            database (bool): Also dump the site's database into <package>/db.
+        """
+        if self.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        name = name or time.strftime("%Y%m%d-%H%M%S")
+        source_dir = os.path.join(self.path, SOURCE_DIR)
+        output_dir = os.path.join(self.path, PACKAGES_DIR, name)
+
+        if incremental:
+            from app.ChunkStore import ChunkStore
+
+            store = ChunkStore(os.path.join(self.path, PACKAGES_DIR, CHUNK_STORE_DIR))
+            manifest = store.package(source_dir, output_dir)
+        else:
+            from app.SitePackager import SitePackager
+
+            manifest = SitePackager(source_dir).package(output_dir)
+
+        if database:
+            from app.DatabasePipeline import DatabasePipeline
+
+            pipeline = DatabasePipeline(self.get_database_client())
+            manifest["database"] = pipeline.dump(os.path.join(output_dir, DATABASE_DIR))
+
+        return manifest
+
+    @traced("site.upload")
+    def upload(
+        self,
+        name: str = None,
+        workers: int = 4,
+        bandwidth: int = None,
+        database: bool = False,
+    ) -> dict:
+        """
+        Uploads a package to the remote server configured by set_ssh_details. When no
+        package name is given, an incremental package is created first.
+
+        Args:
+            name (str): Name of the package under <site>/packages to upload.
+            workers (int): Number of concurrent SSH connections.
+            bandwidth (int): Upper bound on bytes sent per second, unlimited if None.
+            database (bool): Include a database dump in the package created.
+        """
+        if name is None:
+            name = time.strftime("%Y%m%d-%H%M%S")
+            self.package(name, incremental=True, database=database)
+
+        package_dir = os.path.join(self.path, PACKAGES_DIR, name)
+        if not os.path.isdir(package_dir):
+            raise FileNotFoundError(f"Package: '{package_dir}' not found.")
+
+        from app.SiteUploader import SiteUploader
+        from app.SshTransport import TransportPool
+
+        config = self._get_ssh_config()
+        pool = TransportPool(lambda: self._create_transport(config), workers)
+        try:
+            uploader = SiteUploader(pool, workers=workers, bandwidth=bandwidth)
+            return uploader.upload_directory(
+                package_dir, f"{config['remote_path']}/{PACKAGES_DIR}/{name}"
+            )
+        finally:
+            pool.close()
+
+    @traced("site.download")
+    def download(self, workers: int = 4) -> dict:
+        """
+        Mirrors the remote WordPress tree into the site's src folder, fetching only
+        missing or changed files.
+
+        Args:
+            workers (int): Number of concurrent SSH connections.
+        """
+        from app.SiteDownloader import SiteDownloader
+        from app.SshTransport import TransportPool
+
+        config = self._get_ssh_config()
+        pool = TransportPool(lambda: self._create_transport(config), workers)
+        try:
+            downloader = SiteDownloader(pool, workers=workers)
+            return downloader.download(
+                config["wordpress_path"], os.path.join(self.path, SOURCE_DIR)
+            )
+        finally:
+            pool.close()
+
+    def live_sync(self, debounce: float = 0.2, max_delay: float = 2.0):
+        """
+        Returns a LiveSync pushing the site's src folder to the remote WordPress tree
+        over one SSH connection. Call its run() to start watching.
+
+        Args:
+            debounce (float): Seconds without changes before a batch is pushed.
+            max_delay (float): Upper bound in seconds on how long a change waits.
+        """
+        from app.LiveSync import LiveSync
+
+        config = self._get_ssh_config()
+        return LiveSync(
+            lambda: self._create_transport(config),
+            os.path.join(self.path, SOURCE_DIR),
+            config["wordpress_path"],
+            debounce,
+            max_delay,
+        )
+
+    @traced("site.snapshot")
+    def snapshot(self, label: str = None, database: bool = True) -> dict:
+        """
+        Records a snapshot of the site's files, leaving out its packages, in the
+        host's snapshot store and returns its manifest.
+
+        Args:
+            label (str): Free text describing the snapshot.
+            database (bool): Also store a dump of the site's database.
+        """
+        if self.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        from app.DatabasePipeline import DatabasePipeline
+        from app.SnapshotStore import SnapshotStore
+
+        dump = None
+        if database:
+            dump = DatabasePipeline(self.get_database_client()).dump
+        return SnapshotStore().snapshot(
+            os.path.basename(self.path), self.path, label, dump
+        )
+
+    def snapshots(self) -> list:
+        """
+        Returns the site's snapshots, oldest first.
+        """
+        if self.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        from app.SnapshotStore import SnapshotStore
+
+        return SnapshotStore().snapshots(os.path.basename(self.path))
+
+    @traced("site.rollback")
+    def rollback(self, snapshot_id: str = None, database: bool = True) -> dict:
+        """
+        Restores the site to a snapshot, rewriting only the files that differ from it.
+
+        Args:
+            snapshot_id (str): Snapshot to restore, defaults to the latest.
+            database (bool): Also restore the database dump of the snapshot.
+        """
+        if self.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        from app.DatabasePipeline import DatabasePipeline
+        from app.SnapshotStore import SnapshotStore
+
+        restore = None
+        if database:
+            restore = DatabasePipeline(self.get_database_client()).restore
+        return SnapshotStore().rollback(
+            os.path.basename(self.path), self.path, snapshot_id, restore
+        )
+
+    def get_database_client(self):
+        """
+        Returns a client for the site's MySQL container, or for its own database on
+        the shared server in shared database mode.
+        """
+        if self.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        from app.DatabasePipeline import DockerMysqlClient
+
+        database = self.get_shared_database()
+        if database is not None:
+            return DockerMysqlClient(
+                database["host"], database["name"], database["user"], database["password"]
+            )
+
+        name = os.path.basename(self.path)
+        return DockerMysqlClient(
+            SUBSTITUTIONS["MYSQL_CONTAINER_NAME"].format(site=name),
+            SUBSTITUTIONS["MYSQL_DATABASE"],
+            "root",
+            SUBSTITUTIONS["MYSQL_ROOT_PASSWORD"],
+        )
+
+    def get_shared_database(self) -> dict:
+        """
+        Returns the site's shared database settings, or None for a site running its
+        own MySQL container.
+        """
+        config = EnvFile(os.path.join(self.path, ".env")).get_many(
+            [
+                "DATABASE_MODE",
+                "WORDPRESS_DB_HOST",
+                "WORDPRESS_DB_NAME",
+                "WORDPRESS_DB_USER",
+                "WORDPRESS_DB_PASSWORD",
+            ]
+        )
+        if config["DATABASE_MODE"] != "shared":
+            return None
+
+        return {
+            "host": config["WORDPRESS_DB_HOST"],
+            "name": config["WORDPRESS_DB_NAME"],
+            "user": config["WORDPRESS_DB_USER"],
+            "password": config["WORDPRESS_DB_PASSWORD"],
+            "network": SHARED_NETWORK,
+        }
+
+    def _get_ssh_config(self) -> dict:
+        if self.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        config = EnvFile(os.path.join(self.path, ".env")).get_many(
+            [
+                "SSH_USER",
+                "SSH_DOMAIN",
+                "SSH_PASSWORD",
+                "SSH_REMOTE_PATH",
+                "SSH_WORDPRESS_PATH",
+            ]
+        )
+        if not config.get("SSH_USER") or not config.get("SSH_DOMAIN"):
+            raise ValueError("SSH details are not set. Please integrate the site first.")
+
+        return {
+            "user": config.get("SSH_USER"),
+            "domain": config.get("SSH_DOMAIN"),
+            "password": config.get("SSH_PASSWORD"),
+            "remote_path": config.get("SSH_REMOTE_PATH")
+            or f"{REMOTE_DIR}/{os.path.basename(self.path)}",
+            "wordpress_path": config.get("SSH_WORDPRESS_PATH") or REMOTE_WORDPRESS_DIR,
+        }
+
+    @traced("site.start_database")
+    def start_database(self) -> None:
+        """
+        Starts the site's MySQL container, or the shared server in shared database
+        mode, and waits until it accepts connections.
+        """
+        if self.path is None:
+            raise ValueError("Site path is not set. Please load or create a site first.")
+
+        if self.get_shared_database() is not None:
+            from app.SharedDatabase import SharedDatabase
+
+            SharedDatabase().ensure()
+            return
+
+        subprocess.run(
+            ["docker", "compose", "up", "-d", "mysql"], cwd=self.path, check=True
+        )
+        self.get_database_client().wait()
+
+    def _build(
+        self,
+        site_name: str,
+        ports: dict,
+        source_dir: str,
+        skip: tuple,
+        database: dict = None,
+    ) -> str:
+        """
+        Builds the site from ``source_dir`` and returns the hash of the compose
+        template it was rendered from. Sites with a shared ``database`` are rendered
+        from the shared template, without a MySQL container of their own.
+        """
+        from app.Materializer import Materializer
+        from app.TemplateUpgrader import write_template_state
+
+        templates_dir = TEMPLATES_DIR if database is None else SHARED_TEMPLATES_DIR
+        inputs = {"site_name": site_name, "ports": ports}
+        properties = {
+            "PHPMYADMIN_PORT": ports.get("phpmyadmin"),
+            "WORDPRESS_PORT": ports.get("wordpress"),
+        }
+        if database is not None:
+            inputs["database"] = database
+            properties.update(
+                {
+                    "DATABASE_MODE": "shared",
+                    "WORDPRESS_DB_HOST": database["host"],
+                    "WORDPRESS_DB_NAME": database["name"],
+                    "WORDPRESS_DB_USER": database["user"],
+                    "WORDPRESS_DB_PASSWORD": database["password"],
+                }
+            )
+
+        self.path = self._create_site_path(site_name)
+        if os.path.exists(self.path):
+            raise FileExistsError(f"Site '{site_name}' already exists.")
+
+        # Build the site in a staging directory and rename it into place, so an
+        # interrupted create never leaves a half-copied site under SITES_DIR.
+        staging_path = os.path.join(
+            STAGING_DIR, f"{site_name}.{os.getpid()}.{uuid.uuid4().hex}"
+        )
+        try:
+            os.makedirs(STAGING_DIR, exist_ok=True)
+            # Files are reflinked rather than copied where the filesystem allows it,
+            # and the compose file is rendered straight from the template
+            Materializer(source_dir, skip=skip).materialize(staging_path)
+
+            with span("template_hash"):
+                digest = template_hash(templates_dir)
+            ConfigHelper.update_compose_file(
+                staging_path,
+                site_name,
+                ports,
+                template_path=os.path.join(templates_dir, COMPOSE_FILE),
+                database=database,
+            )
+            write_template_state(staging_path, digest, inputs)
+            ConfigHelper.update_env_file(os.path.join(staging_path, ".env"), properties)
+
+            os.rename(staging_path, self.path)
+        except Exception:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            raise
+
+        return digest
+
+    def _create_transport(self, config: dict):
+        from app.SshTransport import SftpTransport
+
+        return SftpTransport(config["domain"], config["user"], config["password"])
 
     def _create_site_path(self, name: str) -> str:
         return os.path.join(SITES_DIR, name)
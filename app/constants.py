@@ -1,3 +1,28 @@
 SITES_DIR = "sites"
 TEMPLATES_DIR = "templates"
 PROJECT_DIRECTORY = "projects/"
+REGISTRY_FILE = f"{SITES_DIR}/.registry.json"
+WORDPRESS_PORT_RANGE = (8000, 9000)
+PHPMYADMIN_PORT_RANGE = (9000, 10000)
+STAGING_DIR = f"{SITES_DIR}/.staging"
+TRASH_DIR = f"{SITES_DIR}/.trash"
+REAPER_LOG = f"{SITES_DIR}/.reaper.log"
+SNAPSHOTS_DIR = f"{SITES_DIR}/.snapshots"
+DAEMON_SOCKET = f"{SITES_DIR}/.manager.sock"
+DAEMON_LOG = f"{SITES_DIR}/.manager.log"
+SOURCE_DIR = "src"
+PACKAGES_DIR = "packages"
+CHUNK_STORE_DIR = ".store"
+REMOTE_DIR = "cms-manager"
+REMOTE_WORDPRESS_DIR = "public_html"
+DATABASE_DIR = "db"
+COMPOSE_FILE = "docker-compose.yml"
+TEMPLATE_STATE_FILE = ".template.json"
+HIBERNATE_FILE = ".hibernate.yml"
+HIBERNATE_PORT_OFFSET = 20000
+SHARED_DIR = f"{SITES_DIR}/.shared"
+SHARED_TEMPLATES_DIR = f"{TEMPLATES_DIR}/shared"
+SHARED_SERVER_TEMPLATE = "server.yml"
+SHARED_MYSQL_CONTAINER = "cms_mysql"
+SHARED_PHPMYADMIN_CONTAINER = "cms_phpmyadmin"
+SHARED_NETWORK = "cms_shared"
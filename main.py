@@ -1,14 +1,115 @@
 import click
+import functools
+import os
+import sys
+import time
 import urllib.parse
 
-from app.SiteManager import SiteManager
+# Commands the manager daemon serves when it is running. Commands prompting for a
+# missing option are run directly once the daemon reports it.
+DAEMON_COMMANDS = {
+    "list",
+    "reindex",
+    "new",
+    "clone",
+    "up",
+    "down",
+    "restart",
+    "status",
+    "health",
+    "upgrade-templates",
+    "snapshot",
+    "snapshots",
+    "rollback",
+    "verify-snapshots",
+}
+
+
+def pass_site_manager(f):
+    """
+    Passes the site manager to the command, constructing it on first use.
+
+    The manager (and the modules behind it) is only imported once a command actually
+    runs, so `--help` stays cheap. Its state is loaded lazily as well: commands that
+    only list names read the registry, while `new` only builds the port allocator.
+    """
+
+    @click.pass_context
+    def wrapper(ctx, *args, **kwargs):
+        root = ctx.find_root()
+        if root.obj is None:
+            from app.SiteManager import SiteManager
 
-site_manager = SiteManager()
+            root.obj = SiteManager(initialize_ports=False)
+        return ctx.invoke(f, root.obj, *args, **kwargs)
+
+    return functools.update_wrapper(wrapper, f)
 
 
 @click.group()
-def cli():
-    pass
+@click.option("--profile", is_flag=True, help="Trace the command and report its spans.")
+@click.option(
+    "--profile-format",
+    type=click.Choice(["tree", "json", "chrome"]),
+    default="tree",
+    show_default=True,
+    help="Print a span tree, or write JSON or a Chrome trace.",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File the JSON or Chrome trace is written to.",
+)
+@click.option(
+    "--cprofile",
+    "cprofile_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Also write cProfile statistics to this file.",
+)
+@click.pass_context
+def cli(ctx, profile, profile_format, profile_output, cprofile_path):
+    if profile:
+        start_profile(ctx, profile_format, profile_output)
+    if cprofile_path:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def dump():
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+
+        ctx.call_on_close(dump)
+
+
+def start_profile(ctx, output_format, output_path):
+    """
+    Traces the command and writes the spans out once it finishes.
+    """
+    from app import Tracer
+
+    tracer = Tracer.start_tracing(ctx.invoked_subcommand or "cli")
+
+    def finish():
+        Tracer.stop_tracing()
+        if output_format == "tree":
+            click.echo(tracer.format_tree(), err=True)
+            return
+
+        import json
+
+        if output_format == "json":
+            trace, default_path = tracer.to_json(), "profile.json"
+        else:
+            trace, default_path = tracer.to_chrome_trace(), "trace.json"
+        with open(output_path or default_path, "w") as file:
+            json.dump(trace, file)
+        click.echo(f"Profile written to {output_path or default_path}.", err=True)
+
+    ctx.call_on_close(finish)
 
 
 @cli.command()
@@ -19,14 +120,76 @@ def cli():
     prompt="Enter your site's name",
     help="Enter your site's name",
 )
-def new(name):
+@click.option(
+    "--shared-db/--no-shared-db",
+    default=False,
+    show_default=True,
+    help="Use a database on the shared MySQL server instead of a MySQL container.",
+)
+@pass_site_manager
+def new(site_manager, name, shared_db):
     """Create a new site"""
-    site_name = site_manager.create_site(name)
+    site_name = site_manager.create_site(name, shared_db)
     click.echo(f"Site created: {site_name}.")
 
 
 @cli.command()
-def integrate_site():
+@click.option(
+    "-p",
+    "--phpmyadmin-port",
+    type=int,
+    help="Also serve a phpMyAdmin for every shared database on this port.",
+)
+def shared_db(phpmyadmin_port):
+    """Start the MySQL server shared by sites created with --shared-db"""
+    from app.SharedDatabase import SharedDatabase
+
+    SharedDatabase().ensure(phpmyadmin_port)
+    click.echo("Shared database server is running.")
+
+
+@cli.command()
+@click.option(
+    "-n",
+    "--name",
+    metavar="SITE_NAME",
+    prompt="Enter the new site's name",
+    help="Enter the new site's name",
+)
+@click.option(
+    "--database/--no-database",
+    default=True,
+    show_default=True,
+    help="Copy the source site's database into the new site.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=4,
+    show_default=True,
+    help="Number of tables copied concurrently.",
+)
+@pass_site_manager
+def clone(site_manager, name, database, workers):
+    """Clone an existing site"""
+    sites = site_manager.get_site_names()
+    for index, site in enumerate(sites):
+        click.echo(f"{index+1}. {site}")
+
+    click.echo("Which site would you like to clone")
+    option = click.prompt("Enter your choice", type=int)
+
+    if option > len(sites) or option < 1:
+        click.echo(f"Invalid option {option}. Please try again")
+        return
+
+    site_name = site_manager.clone_site(sites[option - 1], name, database, workers)
+    click.echo(f"Site cloned: {site_name}.")
+
+
+@cli.command()
+@pass_site_manager
+def integrate_site(site_manager):
     """Defines SSH details for an existing site"""
     sites = site_manager.get_site_names()
     for index, site in enumerate(sites):
@@ -49,7 +212,13 @@ def integrate_site():
 
 
 @cli.command()
-def remove():
+@click.option(
+    "--wait",
+    is_flag=True,
+    help="Delete the site's files before returning instead of in the background.",
+)
+@pass_site_manager
+def remove(site_manager, wait):
     """Remove an existing site"""
     sites = site_manager.get_site_names()
     for index, site in enumerate(sites):
@@ -62,12 +231,20 @@ def remove():
         click.echo(f"Invalid option {option}. Please try again")
         return
 
-    site = site_manager.get_site(sites[option - 1])
-    site.remove()
+    name = sites[option - 1]
+    result = site_manager.get_site(name).remove(wait)
+    if result is None:
+        click.echo(f"Site removed: {name}. Its files are deleted in the background.")
+    else:
+        click.echo(
+            f"Site removed: {name}. Reclaimed {result['bytes'] / 2**20:.1f} MiB"
+            + f" in {result['files']} files ({result['seconds']:.1f}s)."
+        )
 
 
 @cli.command()
-def list():
+@pass_site_manager
+def list(site_manager):
     """List all sites"""
     sites = site_manager.get_site_names()
     for index, site in enumerate(sites):
@@ -75,7 +252,257 @@ def list():
 
 
 @cli.command()
-def import_site():
+@pass_site_manager
+def reindex(site_manager):
+    """Rebuild the site registry from disk"""
+    count = site_manager.reindex()
+    click.echo(f"Indexed {count} sites.")
+
+
+def site_selection(f):
+    """
+    Adds the site selectors shared by the container lifecycle commands.
+    """
+    f = click.option(
+        "-c",
+        "--concurrency",
+        default=8,
+        show_default=True,
+        help="Number of sites handled at once.",
+    )(f)
+    f = click.option("-a", "--all", "all_sites", is_flag=True, help="Select all sites.")(
+        f
+    )
+    return click.argument("selectors", nargs=-1)(f)
+
+
+def orchestrate(site_manager, action, selectors, all_sites, concurrency):
+    if not selectors and not all_sites:
+        raise click.UsageError("Select sites by name or glob, or pass --all.")
+
+    try:
+        names = site_manager.select_sites(selectors, all_sites)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    completed = 0
+
+    def on_progress(result):
+        nonlocal completed
+        completed += 1
+        outcome = "ok" if result["returncode"] == 0 else "failed"
+        click.echo(
+            f"[{completed}/{len(names)}] {result['name']}: {action} {outcome}"
+            + f" ({result['seconds']:.1f}s)"
+        )
+        if result["returncode"] != 0:
+            click.echo(result["output"].rstrip(), err=True)
+
+    results = site_manager.orchestrate(action, names, concurrency, on_progress)
+    failed = [result["name"] for result in results if result["returncode"] != 0]
+    if failed:
+        click.echo(f"{len(failed)} of {len(results)} sites failed: {', '.join(failed)}")
+        raise click.exceptions.Exit(1)
+    return results
+
+
+@cli.command()
+@site_selection
+@pass_site_manager
+def up(site_manager, selectors, all_sites, concurrency):
+    """Start the containers of the selected sites"""
+    orchestrate(site_manager, "up", selectors, all_sites, concurrency)
+
+
+@cli.command()
+@site_selection
+@pass_site_manager
+def down(site_manager, selectors, all_sites, concurrency):
+    """Stop the containers of the selected sites"""
+    orchestrate(site_manager, "down", selectors, all_sites, concurrency)
+
+
+@cli.command()
+@site_selection
+@pass_site_manager
+def restart(site_manager, selectors, all_sites, concurrency):
+    """Restart the containers of the selected sites"""
+    orchestrate(site_manager, "restart", selectors, all_sites, concurrency)
+
+
+@cli.command()
+@site_selection
+@pass_site_manager
+def status(site_manager, selectors, all_sites, concurrency):
+    """Show the container state of the selected sites"""
+    results = orchestrate(site_manager, "status", selectors, all_sites, concurrency)
+    for result in results:
+        services = ", ".join(
+            f"{service['service']}={service['state']}" for service in result["services"]
+        )
+        click.echo(f"{result['name']}: {services or 'no containers'}")
+
+
+@cli.command()
+@click.argument("selectors", nargs=-1)
+@click.option(
+    "-t",
+    "--timeout",
+    default=5.0,
+    show_default=True,
+    help="Seconds before a request counts as failed.",
+)
+@click.option(
+    "-s",
+    "--samples",
+    default=1,
+    show_default=True,
+    help="Requests sent to every endpoint.",
+)
+@click.option("-w", "--watch", is_flag=True, help="Probe again every interval.")
+@click.option(
+    "-n",
+    "--interval",
+    default=10.0,
+    show_default=True,
+    help="Seconds between probes with --watch.",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the results as JSON.")
+@pass_site_manager
+def health(site_manager, selectors, timeout, samples, watch, interval, as_json):
+    """Probe the response times of the selected sites, or of all of them"""
+    try:
+        names = site_manager.select_sites(selectors, not selectors)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    while True:
+        results = site_manager.health(names, timeout, samples)
+        if as_json:
+            import json
+
+            click.echo(json.dumps(results, indent=None if watch else 2))
+        else:
+            if watch:
+                click.clear()
+            print_health(results)
+
+        if not watch:
+            if not all(result["up"] for result in results):
+                raise click.exceptions.Exit(1)
+            return
+
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            return
+
+
+def print_health(results):
+    def milliseconds(result, key):
+        p50, p95 = result[f"{key}_p50"], result[f"{key}_p95"]
+        if p50 is None:
+            return "-"
+        return f"{p50 * 1000:.0f}/{p95 * 1000:.0f}"
+
+    rows = [("SITE", "SERVICE", "PORT", "STATUS", "TTFB P50/P95", "TOTAL P50/P95")]
+    for result in results:
+        state = result["status"] if result["error"] is None else result["error"]
+        rows.append(
+            (
+                result["name"],
+                result["service"],
+                str(result["port"]),
+                str(state if result["up"] else f"DOWN {state}"),
+                milliseconds(result, "ttfb"),
+                milliseconds(result, "total"),
+            )
+        )
+
+    widths = [max(len(row[index]) for row in rows) for index in range(len(rows[0]))]
+    for row in rows:
+        click.echo("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+    up = sum(result["up"] for result in results)
+    click.echo(f"{up} of {len(results)} endpoints up, latencies in ms.")
+
+
+@cli.command()
+@click.argument("selectors", nargs=-1)
+@click.option("-a", "--all", "all_sites", is_flag=True, help="Select all sites.")
+@click.option(
+    "-i",
+    "--idle-timeout",
+    default=900,
+    show_default=True,
+    help="Seconds without connections before a site is stopped.",
+)
+@pass_site_manager
+def hibernate(site_manager, selectors, all_sites, idle_timeout):
+    """Stop idle sites and start them again on the next request"""
+    if not selectors and not all_sites:
+        raise click.UsageError("Select sites by name or glob, or pass --all.")
+
+    try:
+        names = site_manager.select_sites(selectors, all_sites)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    click.echo(f"Hibernating {len(names)} sites, press Ctrl+C to stop.")
+    try:
+        site_manager.hibernate(
+            names,
+            idle_timeout,
+            lambda name, event: click.echo(f"{name}: {event}"),
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command()
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Only report the sites that would be re-rendered.",
+)
+@click.option(
+    "-d",
+    "--diff",
+    "show_diff",
+    is_flag=True,
+    help="Print the changes made to each compose file.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=8,
+    show_default=True,
+    help="Number of sites rendered concurrently.",
+)
+@pass_site_manager
+def upgrade_templates(site_manager, dry_run, show_diff, workers):
+    """Re-render sites built from an outdated template"""
+    results = site_manager.upgrade_templates(dry_run, workers)
+    changed = [result for result in results if result["status"] != "current"]
+    for result in changed:
+        click.echo(f"{result['status'].capitalize()}: {result['name']}")
+        if show_diff or dry_run:
+            click.echo(result["diff"], nl=False)
+
+    action = "would be upgraded" if dry_run else "upgraded"
+    click.echo(f"{len(changed)} of {len(results)} sites {action}.")
+
+
+@cli.command()
+@click.option(
+    "-w",
+    "--workers",
+    default=4,
+    show_default=True,
+    help="Number of concurrent SSH connections.",
+)
+@pass_site_manager
+def import_site(site_manager, workers):
     """Download site from remote server"""
     sites = site_manager.get_site_names()
     for index, site in enumerate(sites):
@@ -85,11 +512,42 @@ def import_site():
     option = click.prompt("Enter your choice", type=int)
 
     site = site_manager.get_site(sites[option - 1])
-    site.download()
+    stats = site.download(workers)
+    click.echo(
+        f"Downloaded {stats['files']} files ({stats['bytes']} bytes)"
+        + f" in {stats['seconds']}s, {stats['skipped']} unchanged."
+    )
 
 
 @cli.command()
-def export_site():
+@click.option(
+    "-p",
+    "--package",
+    "package_name",
+    default=None,
+    help="Package to upload. Defaults to a new incremental package.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=4,
+    show_default=True,
+    help="Number of concurrent SSH connections.",
+)
+@click.option(
+    "-b",
+    "--bandwidth",
+    type=int,
+    default=None,
+    help="Maximum upload rate in bytes per second.",
+)
+@click.option(
+    "--database/--no-database",
+    default=False,
+    help="Include a database dump in the new package.",
+)
+@pass_site_manager
+def export_site(site_manager, package_name, workers, bandwidth, database):
     """Upload site from remote server"""
     sites = site_manager.get_site_names()
     for index, site in enumerate(sites):
@@ -99,7 +557,241 @@ def export_site():
     option = click.prompt("Enter your choice", type=int)
 
     site = site_manager.get_site(sites[option - 1])
-    site.upload()
+    stats = site.upload(package_name, workers, bandwidth, database)
+    click.echo(
+        f"Uploaded {stats['files']} files ({stats['bytes']} bytes)"
+        + f" in {stats['seconds']}s."
+    )
+
+
+@cli.command()
+@click.argument("name")
+@click.option(
+    "-w",
+    "--watch",
+    is_flag=True,
+    help="Keep pushing changes as they happen instead of syncing once.",
+)
+@click.option(
+    "--debounce",
+    type=float,
+    default=0.2,
+    show_default=True,
+    help="Seconds without changes before a batch is pushed.",
+)
+@click.option(
+    "--max-delay",
+    type=float,
+    default=2.0,
+    show_default=True,
+    help="Longest a change waits in seconds during a burst of changes.",
+)
+@pass_site_manager
+def sync(site_manager, name, watch, debounce, max_delay):
+    """Push a site's source files to its web server"""
+    live_sync = site_manager.get_site(name).live_sync(debounce, max_delay)
+    if not watch:
+        stats = live_sync.sync_all()
+        live_sync.close()
+        click.echo(f"Pushed {stats['files']} files ({stats['bytes']} bytes).")
+        return
+
+    def on_batch(stats):
+        click.echo(
+            f"Pushed {stats['files']} files ({stats['bytes']} bytes),"
+            + f" removed {stats['removed']} in {stats['seconds']:.2f}s."
+        )
+
+    click.echo(f"Watching {live_sync.local_dir}, press Ctrl+C to stop.")
+    try:
+        live_sync.run(on_batch)
+    except KeyboardInterrupt:
+        live_sync.stop()
+    totals = live_sync.stats
+    click.echo(
+        f"Pushed {totals['files']} files ({totals['bytes']} bytes) and removed"
+        + f" {totals['removed']} in {totals['batches']} batches."
+    )
+
+
+@cli.command()
+@click.argument("name")
+@click.option("-l", "--label", default=None, help="Describe the snapshot.")
+@click.option(
+    "--database/--no-database",
+    default=True,
+    show_default=True,
+    help="Include a dump of the site's database.",
+)
+@click.option("--keep-last", type=int, default=None, help="Keep the N latest snapshots.")
+@click.option(
+    "--keep-days",
+    type=float,
+    default=None,
+    help="Keep the snapshots younger than this many days.",
+)
+@pass_site_manager
+def snapshot(site_manager, name, label, database, keep_last, keep_days):
+    """Record a snapshot of a site"""
+    manifest = site_manager.get_site(name).snapshot(label, database)
+    stats = manifest["stats"]
+    click.echo(
+        f"Snapshot {manifest['id']} of {name}: {stats['files']} files,"
+        + f" {stats['hashed']} changed, {stats['stored_bytes']} new bytes stored"
+        + f" in {stats['seconds']:.1f}s."
+    )
+
+    if keep_last is not None or keep_days is not None:
+        from app.SnapshotStore import SnapshotStore
+
+        result = SnapshotStore().prune(name, keep_last, keep_days)
+        click.echo(
+            f"Pruned {len(result['removed'])} snapshots, reclaimed"
+            + f" {result['bytes']} bytes in {result['objects']} objects."
+        )
+
+
+@cli.command()
+@click.argument("name")
+@pass_site_manager
+def snapshots(site_manager, name):
+    """List the snapshots of a site"""
+    for manifest in site_manager.get_site(name).snapshots():
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(manifest["created"]))
+        database = "with database" if manifest["database"] else "files only"
+        label = f"  {manifest['label']}" if manifest["label"] else ""
+        click.echo(f"{manifest['id']:<20}{created}  {database}{label}")
+
+
+@cli.command()
+@click.argument("name")
+@click.argument("snapshot_id", required=False)
+@click.option(
+    "--database/--no-database",
+    default=True,
+    show_default=True,
+    help="Restore the database dump of the snapshot.",
+)
+@pass_site_manager
+def rollback(site_manager, name, snapshot_id, database):
+    """Restore a site to a snapshot, the latest by default"""
+    stats = site_manager.get_site(name).rollback(snapshot_id, database)
+    click.echo(
+        f"Restored {name} to {stats['id']}: {stats['restored']} files restored,"
+        + f" {stats['deleted']} deleted, {stats['unchanged']} unchanged"
+        + f" in {stats['seconds']:.1f}s."
+    )
+
+
+@cli.command()
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of objects hashed concurrently.",
+)
+def verify_snapshots(workers):
+    """Check the integrity of the snapshot store"""
+    from app.SnapshotStore import SnapshotStore
+
+    result = SnapshotStore(workers=workers).verify()
+    click.echo(f"Checked {result['objects']} objects.")
+    for digest in result["corrupt"]:
+        click.echo(f"Corrupt object: {digest}")
+    for digest in result["missing"]:
+        click.echo(f"Missing object: {digest}")
+    if result["corrupt"] or result["missing"]:
+        raise click.exceptions.Exit(1)
+
+
+@cli.group()
+def daemon():
+    """Keep the manager running to answer later commands faster"""
+
+
+@daemon.command()
+@click.option(
+    "--foreground",
+    is_flag=True,
+    help="Serve in this process instead of starting a background daemon.",
+)
+def start(foreground):
+    """Start the manager daemon"""
+    from app.DaemonClient import DaemonClient
+
+    client = DaemonClient()
+    if client.ping() is not None:
+        click.echo("The manager daemon is already running.")
+        return
+
+    if foreground:
+        from app.ManagerDaemon import ManagerDaemon
+
+        ManagerDaemon(cli).serve(
+            lambda: click.echo(f"Listening on {client.path} (pid {os.getpid()}).")
+        )
+        return
+
+    from app.ManagerDaemon import spawn
+
+    process = spawn(os.path.abspath(__file__))
+    deadline = time.monotonic() + 30
+    while client.ping() is None:
+        if process.poll() is not None or time.monotonic() > deadline:
+            raise click.ClickException("The manager daemon failed to start.")
+        time.sleep(0.05)
+    click.echo(f"Manager daemon started (pid {process.pid}).")
+
+
+@daemon.command()
+def stop():
+    """Stop the manager daemon"""
+    from app.DaemonClient import DaemonClient
+
+    if DaemonClient().stop():
+        click.echo("Manager daemon stopped.")
+    else:
+        click.echo("The manager daemon is not running.")
+
+
+@daemon.command("status")
+def daemon_status():
+    """Show whether the manager daemon is running"""
+    from app.DaemonClient import DaemonClient
+
+    status = DaemonClient().ping()
+    if status is None:
+        click.echo("The manager daemon is not running.")
+    else:
+        click.echo(
+            f"Manager daemon running (pid {status['pid']}), up {status['uptime']:.0f}s,"
+            + f" {status['requests']} commands served."
+        )
+
+
+def main(argv=None):
+    """
+    Runs the CLI, through the manager daemon when it is running and serves the
+    command. Set CMS_MANAGER_NO_DAEMON to always run commands directly.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if _served_by_daemon(argv):
+        from app.DaemonClient import forward
+
+        exit_code = forward(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    cli(argv)
+
+
+def _served_by_daemon(argv) -> bool:
+    if not argv or argv[0] not in DAEMON_COMMANDS:
+        return False
+    if os.environ.get("CMS_MANAGER_NO_DAEMON"):
+        return False
+    # Watching never finishes, so it would hold the daemon forever
+    return not (argv[0] == "health" and {"-w", "--watch"} & set(argv))
 
 
 @click.command()
@@ -130,7 +822,7 @@ def generate_site(name, url, sync):
 
 
 if __name__ == "__main__":
-    cli()
+    main()
 
 
 # Provide your site's name
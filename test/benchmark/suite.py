@@ -0,0 +1,286 @@
+"""
+Scalability benchmarks of the site operations, run against synthetic sites/ trees.
+
+    python -m test.benchmark.suite --sizes 10,100,1000,5000 --output baseline.json
+    python -m test.benchmark.suite --compare baseline.json --threshold 0.25
+
+Every benchmark runs once per tree size and records the median and minimum of its
+samples. With --compare, the run fails when a median is slower than the baseline by
+more than the threshold, ignoring differences below the noise floor.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.ConfigHelper import ConfigHelper
+from app.SiteManager import SiteManager
+from app.SiteRegistry import SiteRegistry, template_hash
+from app.TemplateUpgrader import write_template_state
+from app.constants import COMPOSE_FILE, SITES_DIR, TEMPLATES_DIR, WORDPRESS_PORT_RANGE
+
+ROOT = Path(__file__).resolve().parents[2]
+MAIN = ROOT / "main.py"
+SIZES = (10, 100, 1000, 5000)
+REPEAT = 5
+THRESHOLD = 0.25
+# Seconds below which a slowdown is considered noise
+NOISE_FLOOR = 0.002
+# Slots left free in the port ranges, so create_site works at every size
+FREE_SLOTS = 10
+
+ENV_TEMPLATE = """# MySQL
+MYSQL_CONTAINER_NAME=mysql_{name}
+MYSQL_DATABASE=mysqldb
+MYSQL_USER=mysqluser
+MYSQL_PASSWORD=mysqlpassword
+MYSQL_ROOT_PASSWORD=password
+
+# PhpMyAdmin
+PMA_HOST=mysql_{name}
+PHPMYADMIN_CONTAINER_NAME=phpmyadmin_{name}
+PHPMYADMIN_PORT={phpmyadmin}
+
+# Wordpress
+WORDPRESS_CONTAINER_NAME=wordpress_{name}
+WORDPRESS_PORT={wordpress}
+WORDPRESS_DB_NAME=mysqldb
+WORDPRESS_DB_USER=mysqluser
+WORDPRESS_DB_PASSWORD=mysqlpassword
+WORDPRESS_DB_HOST=mysql_{name}
+WORDPRESS_TABLE_PREFIX=sEi_
+
+# Network
+NETWORK_NAME={name}_network
+
+# Remote
+SSH_USER=deploy
+SSH_DOMAIN={name}.example.com
+SSH_PASSWORD=secret
+"""
+
+
+def generate_sites(root: Path, count: int) -> None:
+    """
+    Creates ``count`` sites under ``root`` the way `new` leaves them, with the
+    repository's templates, and indexes them in the registry.
+
+    The port ranges only fit a thousand sites, so sites beyond that use ports outside
+    the ranges, which the registry tracks but the allocator ignores.
+    """
+    shutil.copytree(ROOT / TEMPLATES_DIR, root / TEMPLATES_DIR)
+    template_path = os.path.join(TEMPLATES_DIR, COMPOSE_FILE)
+    slots = WORDPRESS_PORT_RANGE[1] - WORDPRESS_PORT_RANGE[0] - FREE_SLOTS
+
+    with _working_directory(root):
+        digest = template_hash()
+        for index in range(count):
+            name = f"site{index}"
+            offset = index if index < slots else 20000 + index
+            ports = {"phpmyadmin": 9000 + offset, "wordpress": 8000 + offset}
+            site_path = os.path.join(SITES_DIR, name)
+            os.makedirs(os.path.join(site_path, "src"))
+            with open(os.path.join(site_path, ".env"), "w") as file:
+                file.write(ENV_TEMPLATE.format(name=name, **ports))
+            ConfigHelper.update_compose_file(site_path, name, ports, template_path)
+            write_template_state(site_path, digest, {"site_name": name, "ports": ports})
+
+        registry = SiteRegistry()
+        with registry.transaction():
+            registry.reindex()
+
+
+def run_suite(sizes=SIZES, repeat: int = REPEAT, on_result=None) -> dict:
+    """
+    Runs every benchmark against a tree of each size and returns the results keyed
+    by benchmark and size.
+
+    Args:
+        sizes (list): Numbers of sites to generate.
+        repeat (int): Samples taken of every benchmark.
+        on_result (callable): Called with the benchmark, size and result as each
+            benchmark finishes.
+    """
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            root = Path(directory)
+            generate_sites(root, size)
+            with _working_directory(root):
+                for name, samples in _run_benchmarks(root, size, repeat):
+                    result = {
+                        "median": statistics.median(samples),
+                        "min": min(samples),
+                        "samples": len(samples),
+                    }
+                    results.setdefault(name, {})[str(size)] = result
+                    if on_result is not None:
+                        on_result(name, size, result)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = THRESHOLD, noise=NOISE_FLOOR
+) -> list:
+    """
+    Returns the benchmarks whose median got slower than ``threshold`` times the
+    baseline, for every benchmark and size present in both runs.
+    """
+    regressions = []
+    for name, sizes in current["results"].items():
+        for size, result in sizes.items():
+            previous = baseline["results"].get(name, {}).get(size)
+            if previous is None:
+                continue
+
+            slowdown = result["median"] - previous["median"]
+            if slowdown > noise and slowdown > previous["median"] * threshold:
+                regressions.append(
+                    {
+                        "benchmark": name,
+                        "sites": int(size),
+                        "baseline": previous["median"],
+                        "current": result["median"],
+                        "ratio": result["median"] / max(previous["median"], 1e-9),
+                    }
+                )
+
+    return regressions
+
+
+def _run_benchmarks(root: Path, size: int, repeat: int):
+    yield "cold_start", [_time(_cli, root, "list") for _ in range(repeat)]
+    _cli(root, "daemon", "start")
+    try:
+        yield "cold_start_daemon", [_time(_cli, root, "list") for _ in range(repeat)]
+    finally:
+        _cli(root, "daemon", "stop")
+    yield "get_site_names", [
+        _time(lambda: SiteManager(False).get_site_names()) for _ in range(repeat)
+    ]
+    yield "initialize_reserved_ports", [
+        _time(SiteManager(False)._initialize_reserved_ports) for _ in range(repeat)
+    ]
+
+    manager = SiteManager()
+    allocations = []
+    for _ in range(repeat):
+        allocations.append(_time(_allocate_and_release, manager))
+    yield "get_available_ports", allocations
+
+    site_path = os.path.join(SITES_DIR, "site0")
+    ports = manager.registry.get("site0")["ports"]
+    yield "update_env_file", [
+        _time(
+            ConfigHelper.update_env_file,
+            os.path.join(site_path, ".env"),
+            {"SSH_PASSWORD": f"secret{index}"},
+        )
+        for index in range(repeat)
+    ]
+    template_path = os.path.join(TEMPLATES_DIR, COMPOSE_FILE)
+    yield "update_compose_file", [
+        _time(
+            ConfigHelper.update_compose_file,
+            site_path,
+            f"site{index % 2}",
+            ports,
+            template_path,
+        )
+        for index in range(repeat)
+    ]
+
+    creates, removes = [], []
+    for index in range(repeat):
+        name = f"bench{index}"
+        creates.append(_time(lambda: SiteManager().create_site(name)))
+        removes.append(_time(lambda: SiteManager(False).get_site(name).remove(True)))
+    yield "create_site", creates
+    yield "remove", removes
+
+
+def _allocate_and_release(manager: SiteManager) -> None:
+    manager.allocator.release(manager._get_available_ports())
+
+
+def _cli(root: Path, *args) -> None:
+    subprocess.run(
+        [sys.executable, str(MAIN), *args],
+        cwd=root,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def _time(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def _working_directory(path: Path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in SIZES),
+        help="Comma separated numbers of sites.",
+    )
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against.")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    def on_result(name, size, result):
+        print(f"{name:<28}{size:>6} sites  {result['median'] * 1000:10.3f} ms")
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    current = run_suite(sizes, args.repeat, on_result)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare, "r") as file:
+        baseline = json.load(file)
+    regressions = compare(baseline, current, args.threshold)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['benchmark']} at {regression['sites']} sites: "
+            f"{regression['baseline'] * 1000:.3f} ms -> "
+            f"{regression['current'] * 1000:.3f} ms ({regression['ratio']:.2f}x)"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
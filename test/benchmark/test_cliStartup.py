@@ -0,0 +1,63 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+import pytest
+from pathlib import Path
+
+from test.benchmark.suite import MAIN, generate_sites
+
+SAMPLES = 5
+
+# Wall-clock comparisons are flaky on loaded machines, so they only run on request
+benchmark = pytest.mark.skipif(
+    not os.environ.get("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run"
+)
+
+
+def _run(root: Path, *args) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(MAIN), *args],
+        cwd=root,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def _cold_start(root: Path, *args) -> float:
+    return statistics.median(_run(root, *args) for _ in range(SAMPLES))
+
+
+@benchmark
+@pytest.mark.parametrize("command", [["--help"], ["list"]])
+def test_cold_start_is_flat_in_site_count(tmp_path: Path, command: list):
+    small = tmp_path / "small"
+    large = tmp_path / "large"
+    generate_sites(small, 10)
+    generate_sites(large, 500)
+
+    small_time = _cold_start(small, *command)
+    large_time = _cold_start(large, *command)
+
+    assert large_time < small_time * 1.5 + 0.05
+
+
+def test_list_skips_heavy_imports(tmp_path: Path):
+    generate_sites(tmp_path, 3)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(MAIN), "list"],
+        cwd=tmp_path,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    imported = {line.rsplit("|", 1)[-1].strip() for line in result.stderr.splitlines()}
+    assert "app.SiteManager" in imported
+    assert "asyncio" not in imported
+    assert "app.DatabasePipeline" not in imported
+    assert "concurrent.futures.process" not in imported
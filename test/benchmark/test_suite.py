@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+from app.SiteRegistry import SiteRegistry
+from test.benchmark.suite import compare, generate_sites, main, run_suite
+
+
+def _run(results: dict) -> dict:
+    return {"results": results}
+
+
+def test_generate_sites(tmp_path: Path, monkeypatch):
+    generate_sites(tmp_path, 20)
+
+    monkeypatch.chdir(tmp_path)
+    registry = SiteRegistry()
+    registry.load()
+    assert len(registry.names()) == 20
+    assert registry.get("site3")["ports"] == {"phpmyadmin": 9003, "wordpress": 8003}
+
+
+def test_run_suite():
+    results = []
+
+    actual = run_suite([10], repeat=1, on_result=lambda *result: results.append(result))
+
+    assert set(actual["results"]) == {
+        "cold_start",
+        "cold_start_daemon",
+        "get_site_names",
+        "initialize_reserved_ports",
+        "get_available_ports",
+        "update_env_file",
+        "update_compose_file",
+        "create_site",
+        "remove",
+    }
+    assert len(results) == len(actual["results"])
+    assert all(sizes["10"]["samples"] == 1 for sizes in actual["results"].values())
+
+
+def test_compare():
+    baseline = _run(
+        {
+            "create_site": {"10": {"median": 0.010}, "1000": {"median": 0.010}},
+            "get_site_names": {"10": {"median": 0.0001}},
+        }
+    )
+    current = _run(
+        {
+            "create_site": {"10": {"median": 0.011}, "1000": {"median": 0.020}},
+            "get_site_names": {"10": {"median": 0.0005}},
+            "remove": {"10": {"median": 1}},
+        }
+    )
+
+    regressions = compare(baseline, current, threshold=0.25)
+
+    assert [(r["benchmark"], r["sites"]) for r in regressions] == [("create_site", 1000)]
+    assert regressions[0]["ratio"] == 2
+
+
+def test_main_fails_on_regression(tmp_path: Path, monkeypatch):
+    baseline = tmp_path / "baseline.json"
+    monkeypatch.setattr(
+        "test.benchmark.suite.run_suite",
+        lambda sizes, repeat, on_result: _run({"remove": {"10": {"median": 0.5}}}),
+    )
+
+    baseline.write_text(json.dumps(_run({"remove": {"10": {"median": 0.1}}})))
+    assert main(["--sizes", "10", "--compare", str(baseline)]) == 1
+
+    baseline.write_text(json.dumps(_run({"remove": {"10": {"median": 0.45}}})))
+    assert main(["--sizes", "10", "--compare", str(baseline)]) == 0
@@ -0,0 +1,31 @@
+import os
+import pytest
+from pathlib import Path
+from unittest import mock
+
+from app.AtomicFile import write_if_changed
+
+
+def test_write_if_changed(tmp_path: Path):
+    path = tmp_path / "file.yml"
+
+    assert write_if_changed(str(path), "content") is True
+    os.utime(path, ns=(0, 0))
+    assert write_if_changed(str(path), "content") is False
+    assert path.stat().st_mtime_ns == 0
+    assert write_if_changed(str(path), "changed") is True
+    assert path.read_text() == "changed"
+
+
+@mock.patch("os.replace", side_effect=OSError)
+def test_write_if_changed_keeps_original_on_failure(
+    mock_replace: mock.MagicMock, tmp_path: Path
+):
+    path = tmp_path / "file.yml"
+    path.write_text("original")
+
+    with pytest.raises(OSError):
+        write_if_changed(str(path), "changed")
+
+    assert path.read_text() == "original"
+    assert os.listdir(tmp_path) == ["file.yml"]
@@ -0,0 +1,105 @@
+import gzip
+import io
+import json
+import tarfile
+import pytest
+from pathlib import Path
+from unittest import mock
+
+import app.SitePackager as SitePackagerModule
+from app.ChunkStore import MANIFEST_FILE, ChunkStore, _hash_chunks
+
+
+def _read_chunks(package: Path, manifest: dict) -> dict:
+    path = package / manifest["archive"]
+    if manifest["archive"].endswith(".zst"):
+        decompressor = SitePackagerModule.zstandard.ZstdDecompressor()
+        data = decompressor.stream_reader(open(path, "rb")).read()
+    else:
+        data = gzip.open(path).read()
+
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r") as tar:
+        return {member.name: tar.extractfile(member).read() for member in tar}
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    source = tmp_path / "src"
+    (source / "wp-includes").mkdir(parents=True)
+    for index in range(5):
+        (source / "wp-includes" / f"file{index}.php").write_text(f"<?php // {index}\n")
+    (source / "shared-a.txt").write_text("same content")
+    (source / "shared-b.txt").write_text("same content")
+    return source
+
+
+@pytest.fixture
+def packages(tmp_path: Path) -> Path:
+    return tmp_path / "packages"
+
+
+def test_first_package_ships_every_chunk(source: Path, packages: Path):
+    store = ChunkStore(str(packages / ".store"))
+
+    manifest = store.package(str(source), str(packages / "one"))
+
+    assert len(manifest["files"]) == 7
+    assert len(manifest["changed"]) == 7
+    assert manifest["new_chunks"] == 6
+    chunks = _read_chunks(packages / "one", manifest)
+    assert b"same content" in chunks.values()
+    assert manifest == json.loads((packages / "one" / MANIFEST_FILE).read_text())
+
+
+def test_repeat_package_only_ships_changed_files(source: Path, packages: Path):
+    ChunkStore(str(packages / ".store")).package(str(source), str(packages / "one"))
+    (source / "wp-includes" / "file1.php").write_text("<?php // changed\n")
+    (source / "shared-b.txt").unlink()
+    (source / "new.txt").write_text("same content")
+
+    store = ChunkStore(str(packages / ".store"))
+    with mock.patch("app.ChunkStore._hash_chunks", wraps=_hash_chunks) as hash_chunks:
+        manifest = store.package(str(source), str(packages / "two"))
+
+    assert sorted(manifest["changed"]) == ["new.txt", "wp-includes/file1.php"]
+    assert manifest["deleted"] == ["shared-b.txt"]
+    assert manifest["new_chunks"] == 1
+    assert hash_chunks.call_count == 2
+    assert list(_read_chunks(packages / "two", manifest).values()) == [
+        b"<?php // changed\n"
+    ]
+    assert "wp-includes/file0.php" in manifest["files"]
+
+
+def test_deleted_package_chunks_are_shipped_again(source: Path, packages: Path):
+    ChunkStore(str(packages / ".store")).package(str(source), str(packages / "one"))
+    for path in (packages / "one").iterdir():
+        path.unlink()
+    (packages / "one").rmdir()
+
+    manifest = ChunkStore(str(packages / ".store")).package(
+        str(source), str(packages / "two")
+    )
+
+    assert len(manifest["changed"]) == 7
+    assert manifest["new_chunks"] == 6
+
+
+def test_large_file_is_split_into_chunks(source: Path, packages: Path):
+    with mock.patch("app.ChunkStore.CHUNK_SIZE", 4):
+        (source / "large.bin").write_bytes(b"aaaabbbbaaaac")
+
+        manifest = ChunkStore(str(packages / ".store")).package(
+            str(source), str(packages / "one")
+        )
+
+    assert len(manifest["files"]["large.bin"]["chunks"]) == 4
+    chunks = _read_chunks(packages / "one", manifest).values()
+    assert b"aaaa" in chunks and b"bbbb" in chunks and b"c" in chunks
+
+
+def test_package_missing_source(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        ChunkStore(str(tmp_path / ".store")).package(
+            str(tmp_path / "missing"), str(tmp_path / "one")
+        )
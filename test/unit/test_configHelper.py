@@ -1,9 +1,17 @@
 import os
 import pytest
 from pathlib import Path
+from string import Template
 from unittest import mock
 
-from app.ConfigHelper import ConfigHelper, _get_substitutions, SUBSTITUTIONS
+from app.ConfigHelper import (
+    CompiledTemplate,
+    ConfigHelper,
+    _get_substitutions,
+    compile_template,
+    SUBSTITUTIONS,
+)
+from app.constants import COMPOSE_FILE, SHARED_TEMPLATES_DIR, TEMPLATES_DIR
 
 MOCK_DOCKER_COMPOSE = """version: '3'
 services:
@@ -178,3 +186,97 @@ def test_get_substitutions_invalid_port():
 
     with pytest.raises(TypeError):
         _get_substitutions(site_name, phpmyadmin_port, wordpress_port)
+
+
+def test_compiled_template_matches_string_template():
+    with open(os.path.join(TEMPLATES_DIR, COMPOSE_FILE)) as file:
+        content = file.read()
+    substitutions = _get_substitutions("my_site", 9000, 8000)
+
+    actual = CompiledTemplate(content).render(substitutions)
+
+    assert actual == Template(content).substitute(substitutions)
+
+
+def test_compiled_template_placeholders():
+    template = CompiledTemplate("$$${a} $b")
+
+    assert template.render({"a": 1, "b": "x"}) == "$1 x"
+    with pytest.raises(KeyError):
+        template.render({"a": 1})
+    with pytest.raises(ValueError):
+        CompiledTemplate("cost: $ 5")
+
+
+def test_compile_template_is_cached(tmp_path: Path):
+    path = tmp_path / "template.yml"
+    path.write_text("${NETWORK_NAME}")
+    copy = tmp_path / "copy.yml"
+    copy.write_text("${NETWORK_NAME}")
+
+    template = compile_template(str(path))
+
+    assert compile_template(str(path)) is template
+    assert compile_template(str(copy)) is template
+
+    path.write_text("name: ${NETWORK_NAME}")
+    os.utime(path, ns=(0, 0))
+
+    assert compile_template(str(path)).render({"NETWORK_NAME": "n"}) == "name: n"
+
+
+def test_render_compose_files(tmp_path: Path):
+    template_path = tmp_path / "template.yml"
+    template_path.write_text(MOCK_DOCKER_COMPOSE)
+    sites = []
+    for index in range(3):
+        (tmp_path / f"site{index}").mkdir()
+        sites.append(
+            (
+                str(tmp_path / f"site{index}"),
+                f"site{index}",
+                {"phpmyadmin": 9000 + index, "wordpress": 8000 + index},
+            )
+        )
+
+    first = ConfigHelper.render_compose_files(sites, str(template_path))
+    second = ConfigHelper.render_compose_files(sites, str(template_path))
+
+    assert first == {"rendered": 3, "unchanged": 0}
+    assert second == {"rendered": 0, "unchanged": 3}
+    compose = (tmp_path / "site2" / COMPOSE_FILE).read_text()
+    assert "wordpress_site2" in compose
+    assert "8002:80" in compose
+
+
+def test_render_compose_with_shared_database():
+    database = {
+        "host": "cms_mysql",
+        "name": "wp_blog",
+        "user": "wp_blog",
+        "password": "secret",
+        "network": "cms_shared",
+    }
+
+    compose = ConfigHelper.render_compose(
+        os.path.join(SHARED_TEMPLATES_DIR, COMPOSE_FILE),
+        "blog",
+        {"phpmyadmin": 9000, "wordpress": 8000},
+        database,
+    )
+
+    assert "mysql:" not in compose
+    assert "WORDPRESS_DB_HOST=cms_mysql" in compose
+    assert "WORDPRESS_DB_NAME=wp_blog" in compose
+    assert "WORDPRESS_DB_PASSWORD=secret" in compose
+    assert "name: cms_shared" in compose
+    assert '"8000:80"' in compose
+
+
+def test_update_env_file_with_values_containing_equals(tmp_path: Path):
+    env_path = tmp_path / ".env"
+    env_path.write_text("# Comment\nSSH_PASSWORD=old=value\nOTHER=a=b\n")
+
+    ConfigHelper.update_env_file(str(env_path), {"SSH_PASSWORD": "new=value"})
+
+    assert env_path.read_text() == "# Comment\nSSH_PASSWORD=new=value\nOTHER=a=b\n"
@@ -0,0 +1,118 @@
+import json
+import os
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.ContainerOrchestrator import ContainerOrchestrator, parse_status
+
+STUB_DOCKER = """#!{python}
+import json
+import os
+import sys
+import time
+
+log = os.environ["DOCKER_STUB_LOG"]
+site = os.path.basename(os.getcwd())
+with open(log, "a") as file:
+    file.write(json.dumps(["start", site, sys.argv[1:], time.time()]) + "\\n")
+time.sleep(0.05)
+with open(log, "a") as file:
+    file.write(json.dumps(["end", site, sys.argv[1:], time.time()]) + "\\n")
+
+if site.startswith("broken"):
+    print("no such service", file=sys.stderr)
+    sys.exit(3)
+if "ps" in sys.argv:
+    print(json.dumps({{"Service": "mysql", "State": "running"}}))
+    print(json.dumps({{"Service": "wordpress", "State": "exited"}}))
+"""
+
+
+@pytest.fixture
+def docker(tmp_path: Path, monkeypatch) -> Path:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    stub = bin_dir / "docker"
+    stub.write_text(STUB_DOCKER.format(python=sys.executable))
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    log = tmp_path / "docker.log"
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("DOCKER_STUB_LOG", str(log))
+    return log
+
+
+def _create_sites(tmp_path: Path, names: list) -> list:
+    sites = []
+    for name in names:
+        (tmp_path / name).mkdir()
+        sites.append((name, str(tmp_path / name)))
+    return sites
+
+
+def _read_log(log: Path) -> list:
+    return [json.loads(line) for line in log.read_text().splitlines()]
+
+
+def test_run_in_parallel_with_bounded_concurrency(docker: Path, tmp_path: Path):
+    sites = _create_sites(tmp_path, [f"site{index}" for index in range(6)])
+    progress = []
+
+    results = ContainerOrchestrator(concurrency=2, on_progress=progress.append).run(
+        "up", sites
+    )
+
+    assert [result["name"] for result in results] == [name for name, _ in sites]
+    assert all(result["returncode"] == 0 for result in results)
+    assert sorted(result["name"] for result in progress) == [name for name, _ in sites]
+
+    running = peak = 0
+    for event, site, args, _ in sorted(_read_log(docker), key=lambda entry: entry[3]):
+        assert args == ["compose", "up", "-d"]
+        running += 1 if event == "start" else -1
+        peak = max(peak, running)
+    assert peak == 2
+
+
+def test_run_aggregates_failures(docker: Path, tmp_path: Path):
+    sites = _create_sites(tmp_path, ["site", "broken"])
+
+    results = ContainerOrchestrator().run("down", sites)
+
+    assert [result["returncode"] for result in results] == [0, 3]
+    assert "no such service" in results[1]["output"]
+
+
+def test_status(docker: Path, tmp_path: Path):
+    sites = _create_sites(tmp_path, ["site", "broken"])
+
+    results = ContainerOrchestrator().run("status", sites)
+
+    assert results[0]["services"] == [
+        {"service": "mysql", "state": "running"},
+        {"service": "wordpress", "state": "exited"},
+    ]
+    assert results[1]["services"] == []
+
+
+def test_run_without_docker(tmp_path: Path):
+    sites = _create_sites(tmp_path, ["site"])
+
+    results = ContainerOrchestrator(docker=str(tmp_path / "missing")).run("up", sites)
+
+    assert results[0]["returncode"] == 127
+
+
+def test_run_unknown_action():
+    with pytest.raises(ValueError):
+        ContainerOrchestrator().run("destroy", [])
+
+
+def test_parse_status_array():
+    output = '[{"Service": "mysql", "State": "running", "Name": "mysql_site"}]'
+
+    assert parse_status(output) == [{"service": "mysql", "state": "running"}]
+    assert parse_status("") == []
+    assert parse_status("not json") == []
@@ -0,0 +1,344 @@
+import io
+import os
+import subprocess
+import threading
+import pytest
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+from app.DatabasePipeline import (
+    DatabasePipeline,
+    DockerMysqlClient,
+    RESTORE_HEADER,
+    split_indexes,
+)
+
+SCHEMA = """-- MySQL dump
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `wp_posts` (
+  `ID` bigint unsigned NOT NULL AUTO_INCREMENT,
+  `post_name` varchar(200) NOT NULL DEFAULT '',
+  `post_author` bigint unsigned NOT NULL DEFAULT '0',
+  PRIMARY KEY (`ID`),
+  KEY `post_name` (`post_name`(191)),
+  UNIQUE KEY `post_author` (`post_author`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+
+class FakeMysqlClient:
+    """
+    Stand-in for DockerMysqlClient that produces dumps from memory and records every
+    stream loaded into it.
+    """
+
+    def __init__(self, tables: dict, views: dict = None):
+        self.tables = tables
+        self.views = views or {}
+        self.loaded = []
+        self.dumps = []
+        self.locked = False
+        self.lock = threading.Lock()
+
+    def list_tables(self) -> list:
+        return sorted(self.tables)
+
+    def list_views(self) -> list:
+        return sorted(self.views)
+
+    @contextmanager
+    def read_lock(self, tables: list):
+        self.locked = True
+        yield
+        self.locked = False
+
+    @contextmanager
+    def dump(self, table: str, schema: bool):
+        yield io.BytesIO(self.tables[table][0 if schema else 1].encode())
+
+    @contextmanager
+    def dump_database(self, tables: list):
+        assert self.locked
+        self.dumps.append(tables)
+        sections = [b"/*!40101 SET NAMES utf8mb4 */;\n"]
+        for table in tables:
+            if table in self.views:
+                sections.append(
+                    f"--\n-- Temporary view structure for view `{table}`\n--\n"
+                    f"CREATE TABLE `{table}` (\n  `ID` tinyint\n);\n".encode()
+                )
+                continue
+            schema, data = self.tables[table]
+            sections.append(f"--\n-- Table structure for table `{table}`\n--\n".encode())
+            sections.append(schema.encode())
+            sections.append(f"--\n-- Dumping data for table `{table}`\n--\n".encode())
+            sections.append(data.encode())
+        for table in tables:
+            if table in self.views:
+                sections.append(
+                    f"--\n-- Final view structure for view `{table}`\n--\n".encode()
+                )
+                sections.append(self.views[table].encode())
+        yield io.BytesIO(b"".join(sections))
+
+    @contextmanager
+    def load(self):
+        stream = io.BytesIO()
+        yield stream
+        with self.lock:
+            self.loaded.append(stream.getvalue().decode())
+
+
+@pytest.fixture
+def client() -> FakeMysqlClient:
+    return FakeMysqlClient(
+        {
+            "wp_posts": (SCHEMA, "INSERT INTO `wp_posts` VALUES (1,'hello',1);\n"),
+            "wp_options": (
+                "CREATE TABLE `wp_options` (\n  `option_id` bigint,\n"
+                "  PRIMARY KEY (`option_id`)\n) ENGINE=InnoDB;\n",
+                "INSERT INTO `wp_options` VALUES (1);\n" * 1000,
+            ),
+        }
+    )
+
+
+def test_split_indexes():
+    create_sql, deferred_sql = split_indexes(SCHEMA)
+
+    assert "KEY `post_name`" not in create_sql
+    assert "PRIMARY KEY (`ID`)\n) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;" in create_sql
+    assert deferred_sql == (
+        "ALTER TABLE `wp_posts` ADD KEY `post_name` (`post_name`(191)), "
+        "ADD UNIQUE KEY `post_author` (`post_author`);\n"
+    )
+
+
+def test_split_indexes_keeps_character_set_statements():
+    create_sql, _ = split_indexes(SCHEMA)
+
+    assert create_sql.startswith(
+        "-- MySQL dump\n/*!40101 SET character_set_client = utf8 */;\nCREATE TABLE"
+    )
+
+
+def test_split_indexes_adds_fulltext_indexes_one_at_a_time():
+    _, deferred_sql = split_indexes(
+        "CREATE TABLE `t` (\n  `id` int,\n  `a` text,\n  `b` text,\n"
+        "  PRIMARY KEY (`id`),\n  KEY `id_a` (`id`),\n"
+        "  FULLTEXT KEY `a` (`a`),\n  FULLTEXT KEY `b` (`b`)\n) ENGINE=InnoDB;\n"
+    )
+
+    assert deferred_sql == (
+        "ALTER TABLE `t` ADD KEY `id_a` (`id`);\n"
+        "ALTER TABLE `t` ADD FULLTEXT KEY `a` (`a`);\n"
+        "ALTER TABLE `t` ADD FULLTEXT KEY `b` (`b`);\n"
+    )
+
+
+def test_split_indexes_without_secondary_indexes():
+    create_sql, deferred_sql = split_indexes(
+        "CREATE TABLE `t` (\n  `id` int,\n  PRIMARY KEY (`id`)\n) ENGINE=InnoDB;\n"
+    )
+
+    assert (
+        create_sql
+        == "CREATE TABLE `t` (\n  `id` int,\n  PRIMARY KEY (`id`)\n) ENGINE=InnoDB;\n"
+    )
+    assert deferred_sql is None
+
+
+def test_dump_and_restore(client: FakeMysqlClient, tmp_path: Path):
+    dump_dir = tmp_path / "db"
+
+    dump_stats = DatabasePipeline(client, workers=2).dump(str(dump_dir))
+
+    assert dump_stats["files"] == 2
+    assert len(os.listdir(dump_dir)) == 4
+
+    restore_stats = DatabasePipeline(client, workers=2).restore(str(dump_dir))
+
+    assert restore_stats["files"] == 2
+    # Every file repeats the dump's header
+    assert restore_stats["bytes"] > len(client.tables["wp_posts"][1]) + len(
+        client.tables["wp_options"][1]
+    )
+    creates = [sql for sql in client.loaded if "CREATE TABLE" in sql]
+    inserts = [sql for sql in client.loaded if "INSERT INTO" in sql]
+    alters = [sql for sql in client.loaded if "ALTER TABLE" in sql]
+    assert len(creates) == 2 and len(inserts) == 2 and len(alters) == 1
+    assert all(sql.startswith(RESTORE_HEADER.decode()) for sql in inserts)
+    assert any(client.tables["wp_options"][1] in sql for sql in inserts)
+    assert client.loaded.index(alters[0]) > max(
+        client.loaded.index(sql) for sql in inserts
+    )
+    assert all("DROP TABLE IF EXISTS" in sql for sql in creates)
+    assert all("SET NAMES utf8mb4" in sql for sql in creates + inserts)
+    # Both workers dumped their share of the tables while writes were locked
+    assert sorted(client.dumps) == [["wp_options"], ["wp_posts"]]
+    assert not client.locked
+
+
+def test_dump_and_restore_views(client: FakeMysqlClient, tmp_path: Path):
+    view = "CREATE VIEW `wp_drafts` AS select `ID` from `wp_posts`;\n"
+    client.views["wp_drafts"] = view
+    dump_dir = tmp_path / "db"
+
+    stats = DatabasePipeline(client, workers=2).dump(str(dump_dir))
+
+    assert stats["files"] == 3
+    assert len(os.listdir(dump_dir)) == 5
+    assert client.dumps[0] == ["wp_options", "wp_drafts"]
+    client.views["wp_stale"] = "CREATE VIEW `wp_stale` AS select 1;\n"
+
+    DatabasePipeline(client).restore(str(dump_dir))
+
+    assert "DROP VIEW IF EXISTS `wp_stale`;" in client.loaded[0]
+    assert view in client.loaded[-1]
+    assert not any("`ID` tinyint" in sql for sql in client.loaded)
+
+
+def test_restore_drops_tables_missing_from_dump(client: FakeMysqlClient, tmp_path: Path):
+    dump_dir = tmp_path / "db"
+    DatabasePipeline(client).dump(str(dump_dir))
+    client.tables["wp_new"] = ("CREATE TABLE `wp_new` (\n  `id` int\n);\n", "")
+
+    DatabasePipeline(client).restore(str(dump_dir))
+
+    assert any("DROP TABLE IF EXISTS `wp_new`;" in sql for sql in client.loaded[:2])
+    assert not any("DROP TABLE IF EXISTS `wp_posts`, " in sql for sql in client.loaded)
+
+
+@mock.patch("subprocess.run")
+def test_docker_client_list_tables(mock_run: mock.MagicMock):
+    mock_run.return_value.stdout = b"wp_options\tBASE TABLE\nwp_posts\tBASE TABLE\n"
+    client = DockerMysqlClient("mysql_site", "mysqldb", "root", "password")
+
+    assert client.list_tables() == ["wp_options", "wp_posts"]
+    assert mock_run.call_args.args[0] == [
+        "docker",
+        "exec",
+        "-e",
+        "MYSQL_PWD",
+        "mysql_site",
+        "mysql",
+        "--user=root",
+        "-N",
+        "-B",
+        "-e",
+        "SHOW FULL TABLES WHERE Table_type = 'BASE TABLE'",
+        "mysqldb",
+    ]
+    assert mock_run.call_args.kwargs["env"]["MYSQL_PWD"] == "password"
+    assert "password" not in " ".join(mock_run.call_args.args[0])
+
+
+@mock.patch("subprocess.Popen")
+def test_docker_client_dump_failure(mock_popen: mock.MagicMock):
+    mock_popen.return_value.wait.return_value = 2
+    mock_popen.return_value.stdin = None
+    client = DockerMysqlClient("mysql_site", "mysqldb", "root", "password")
+
+    with pytest.raises(RuntimeError):
+        with client.dump("wp_posts", schema=False) as stream:
+            assert stream == mock_popen.return_value.stdout
+
+    assert "--no-create-info" in mock_popen.call_args.args[0]
+    assert mock_popen.call_args.args[0][-2:] == ["mysqldb", "wp_posts"]
+    assert mock_popen.call_args.kwargs["stdout"] == subprocess.PIPE
+
+
+@mock.patch("subprocess.Popen")
+def test_docker_client_dump_database(mock_popen: mock.MagicMock):
+    mock_popen.return_value.wait.return_value = 0
+    mock_popen.return_value.stdin = None
+    client = DockerMysqlClient("mysql_site", "mysqldb", "root", "password")
+
+    with client.dump_database(["wp_options", "wp_posts"]) as stream:
+        assert stream == mock_popen.return_value.stdout
+
+    command = mock_popen.call_args.args[0]
+    assert "--single-transaction" in command
+    assert command[-3:] == ["mysqldb", "wp_options", "wp_posts"]
+    assert mock_popen.call_args.kwargs["env"]["MYSQL_PWD"] == "password"
+
+
+@mock.patch("subprocess.Popen")
+def test_docker_client_read_lock(mock_popen: mock.MagicMock):
+    process = mock_popen.return_value
+    process.wait.return_value = 0
+    process.stdout.readline.return_value = b"locked\n"
+    client = DockerMysqlClient("mysql_site", "mysqldb", "root", "password")
+
+    with client.read_lock(["wp_options", "wp_posts"]):
+        process.stdin.write.assert_called_once_with(
+            b"LOCK TABLES `wp_options` READ, `wp_posts` READ;\nSELECT 'locked';\n"
+        )
+
+    process.stdin.write.assert_called_with(b"UNLOCK TABLES;\n")
+    process.stdin.close.assert_called_once()
+
+
+@mock.patch("subprocess.Popen")
+def test_docker_client_read_lock_failure(mock_popen: mock.MagicMock):
+    mock_popen.return_value.wait.return_value = 1
+    mock_popen.return_value.stdout.readline.return_value = b""
+    client = DockerMysqlClient("mysql_site", "mysqldb", "root", "password")
+
+    with pytest.raises(RuntimeError):
+        with client.read_lock(["wp_posts"]):
+            pass
+
+
+def test_copy_rewrites_urls(client: FakeMysqlClient):
+    client.tables["wp_options"] = (
+        client.tables["wp_options"][0],
+        "INSERT INTO `wp_options` VALUES (1,'s:21:\\\"http://localhost:8000\\\";');\n",
+    )
+    target = FakeMysqlClient({})
+
+    stats = DatabasePipeline(client, workers=2).copy(
+        target, [("http://localhost:8000", "http://localhost:8001")]
+    )
+
+    assert stats["files"] == 2
+    inserts = [sql for sql in target.loaded if "INSERT INTO" in sql]
+    alters = [sql for sql in target.loaded if "ALTER TABLE" in sql]
+    assert len(inserts) == 2 and len(alters) == 1
+    assert all(sql.startswith(RESTORE_HEADER.decode()) for sql in inserts)
+    assert any('s:21:\\"http://localhost:8001\\";' in sql for sql in inserts)
+    assert target.loaded.index(alters[0]) > max(
+        target.loaded.index(sql) for sql in inserts
+    )
+
+
+def test_copy_without_replacements(client: FakeMysqlClient):
+    target = FakeMysqlClient({})
+
+    stats = DatabasePipeline(client).copy(target)
+
+    assert stats["bytes"] == len(client.tables["wp_posts"][1]) + len(
+        client.tables["wp_options"][1]
+    )
+
+
+@mock.patch("time.sleep")
+@mock.patch("subprocess.run")
+def test_docker_client_wait(mock_run: mock.MagicMock, mock_sleep: mock.MagicMock):
+    mock_run.side_effect = [mock.Mock(returncode=1), mock.Mock(returncode=0)]
+    client = DockerMysqlClient("mysql_site", "mysqldb", "root", "password")
+
+    client.wait()
+
+    assert mock_run.call_count == 2
+    assert "mysqladmin" in mock_run.call_args.args[0]
+
+
+@mock.patch("time.sleep")
+@mock.patch("subprocess.run", return_value=mock.Mock(returncode=1))
+def test_docker_client_wait_timeout(mock_run: mock.MagicMock, mock_sleep: mock.MagicMock):
+    client = DockerMysqlClient("mysql_site", "mysqldb", "root", "password")
+
+    with pytest.raises(RuntimeError):
+        client.wait(timeout=0)
@@ -0,0 +1,126 @@
+import os
+from pathlib import Path
+from unittest import mock
+
+from app.EnvFile import EnvFile
+
+CONTENT = """# MySQL
+MYSQL_PASSWORD=pass=word
+export MYSQL_USER = mysqluser  # inline comment
+
+QUOTED="a \\"quoted\\" value"
+SINGLE='single # not a comment'
+MYSQL_PASSWORD=last=wins
+"""
+
+
+def _create_env_file(tmp_path: Path, content: str = CONTENT) -> Path:
+    path = tmp_path / ".env"
+    path.write_text(content)
+    return path
+
+
+def test_parse(tmp_path: Path):
+    env_file = EnvFile(str(_create_env_file(tmp_path)))
+
+    assert env_file.values() == {
+        "MYSQL_PASSWORD": "last=wins",
+        "MYSQL_USER": "mysqluser",
+        "QUOTED": 'a "quoted" value',
+        "SINGLE": "single # not a comment",
+    }
+    assert env_file.get("MISSING", "default") == "default"
+    assert env_file.get_many(["MYSQL_USER", "MISSING"]) == {
+        "MYSQL_USER": "mysqluser",
+        "MISSING": None,
+    }
+    assert "QUOTED" in env_file
+
+
+def test_update_preserves_layout(tmp_path: Path):
+    path = _create_env_file(tmp_path)
+    env_file = EnvFile(str(path))
+
+    env_file.update({"MYSQL_USER": "root", "NEW": "two words", "PORT": 8000})
+    env_file.save()
+
+    assert path.read_text() == (
+        "# MySQL\n"
+        "MYSQL_PASSWORD=pass=word\n"
+        "export MYSQL_USER=root\n"
+        "\n"
+        'QUOTED="a \\"quoted\\" value"\n'
+        "SINGLE='single # not a comment'\n"
+        "MYSQL_PASSWORD=last=wins\n"
+        'NEW="two words"\n'
+        "PORT=8000\n"
+    )
+    assert EnvFile(str(path)).get_many(["NEW", "PORT"]) == {
+        "NEW": "two words",
+        "PORT": "8000",
+    }
+
+
+def test_delete(tmp_path: Path):
+    path = _create_env_file(tmp_path)
+    env_file = EnvFile(str(path))
+
+    env_file.delete("MYSQL_PASSWORD", "QUOTED", "MISSING")
+    env_file.set("SINGLE", "changed")
+    env_file.save()
+
+    assert path.read_text() == (
+        "# MySQL\nexport MYSQL_USER = mysqluser  # inline comment\n\nSINGLE=changed\n"
+    )
+
+
+def test_save_skips_unchanged_file(tmp_path: Path):
+    env_file = EnvFile(str(_create_env_file(tmp_path)))
+
+    assert env_file.save() is False
+
+    env_file.set("MYSQL_USER", "mysqluser")
+
+    assert env_file.save() is True
+
+
+def test_missing_file(tmp_path: Path):
+    path = tmp_path / ".env"
+    env_file = EnvFile(str(path))
+
+    assert env_file.values() == {}
+
+    env_file.set("KEY", "value")
+    env_file.save()
+
+    assert path.read_text() == "KEY=value"
+
+
+def test_parsed_file_is_cached_until_modified(tmp_path: Path):
+    path = _create_env_file(tmp_path)
+    EnvFile(str(path))
+
+    with mock.patch("builtins.open", side_effect=AssertionError) as mock_open:
+        env_file = EnvFile(str(path))
+        env_file.set("MYSQL_USER", "changed")
+
+    assert mock_open.call_count == 0
+    assert EnvFile(str(path)).get("MYSQL_USER") == "mysqluser"
+
+    path.write_text("MYSQL_USER=other\n")
+
+    assert EnvFile(str(path)).get("MYSQL_USER") == "other"
+
+
+def test_cache_detects_same_size_rewrite_within_one_tick(tmp_path: Path):
+    path = tmp_path / ".env"
+    path.write_text("MYSQL_USER=aaaa\n")
+    stat = os.stat(path)
+    assert EnvFile(str(path)).get("MYSQL_USER") == "aaaa"
+
+    replacement = tmp_path / ".env.tmp"
+    replacement.write_text("MYSQL_USER=bbbb\n")
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(replacement, path)
+
+    assert EnvFile(str(path)).get("MYSQL_USER") == "bbbb"
@@ -0,0 +1,46 @@
+import fcntl
+import multiprocessing
+import os
+from pathlib import Path
+
+from app.FileLock import FileLock
+
+
+def _try_lock(path: str, queue: multiprocessing.Queue):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        queue.put(True)
+    except BlockingIOError:
+        queue.put(False)
+    finally:
+        os.close(fd)
+
+
+def _lock_acquired_by_other_process(path: str) -> bool:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_try_lock, args=(path, queue))
+    process.start()
+    process.join()
+    return queue.get()
+
+
+def test_lock_excludes_other_processes(tmp_path: Path):
+    path = str(tmp_path / "locks" / ".lock")
+
+    with FileLock(path):
+        assert os.path.exists(path)
+        assert not _lock_acquired_by_other_process(path)
+
+    assert _lock_acquired_by_other_process(path)
+
+
+def test_lock_is_reentrant(tmp_path: Path):
+    path = str(tmp_path / ".lock")
+
+    with FileLock(path):
+        with FileLock(path):
+            assert not _lock_acquired_by_other_process(path)
+        assert not _lock_acquired_by_other_process(path)
+
+    assert _lock_acquired_by_other_process(path)
@@ -0,0 +1,126 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from app.HealthProbe import HealthProbe, parse_status_code, percentile, summarize
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeServer:
+    """
+    HTTP server answering every request with ``status`` after ``delay`` seconds,
+    running its own event loop in a background thread.
+    """
+
+    def __init__(self, status: int = 200, delay: float = 0):
+        self.status = status
+        self.delay = delay
+        self.port = _free_port()
+        self.requests = 0
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def __exit__(self, *args):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        )
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        writer.write(f"HTTP/1.1 {self.status} X\r\nContent-Length: 2\r\n\r\nok".encode())
+        await writer.drain()
+        writer.close()
+
+
+def test_probe():
+    with FakeServer(302) as up, FakeServer(502) as failing:
+        closed = _free_port()
+
+        results = HealthProbe(timeout=2, samples=3).probe(
+            [
+                ("blog", "wordpress", up.port),
+                ("blog", "phpmyadmin", failing.port),
+                ("shop", "wordpress", closed),
+            ]
+        )
+
+    assert [result["up"] for result in results] == [True, False, False]
+    assert results[0]["status"] == 302
+    assert results[0]["samples"] == 3
+    assert up.requests == 3
+    assert 0 < results[0]["ttfb_p50"] <= results[0]["total_p95"]
+    assert results[1]["status"] == 502
+    assert results[2]["status"] is None
+    assert results[2]["error"]
+    assert results[2]["ttfb_p50"] is None
+
+
+def test_probe_runs_endpoints_concurrently():
+    with FakeServer(200, delay=0.3) as server:
+        start = time.perf_counter()
+        results = HealthProbe(timeout=2).probe(
+            [(f"site{index}", "wordpress", server.port) for index in range(20)]
+        )
+        elapsed = time.perf_counter() - start
+
+    assert all(result["up"] for result in results)
+    assert elapsed < 2
+
+
+def test_probe_timeout():
+    with FakeServer(200, delay=1) as server:
+        (result,) = HealthProbe(timeout=0.1).probe([("blog", "wordpress", server.port)])
+
+    assert not result["up"]
+    assert "timed out" in result["error"]
+
+
+def test_parse_status_code():
+    assert parse_status_code(b"HTTP/1.1 404 Not Found\r\n\r\n") == 404
+    with pytest.raises(ValueError):
+        parse_status_code(b"SSH-2.0-OpenSSH\r\n")
+
+
+def test_summarize():
+    samples = [
+        {"status": 200, "ttfb": 0.1, "total": 0.2, "error": None},
+        {"status": None, "ttfb": None, "total": None, "error": "refused"},
+    ]
+
+    result = summarize("blog", "wordpress", 8000, samples)
+
+    assert not result["up"]
+    assert result["error"] == "refused"
+    assert result["ttfb_p50"] == 0.1
+
+
+def test_percentile():
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([], 50) is None
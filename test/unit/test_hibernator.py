@@ -0,0 +1,200 @@
+import asyncio
+import socket
+from pathlib import Path
+
+import pytest
+
+from app.Hibernator import Hibernator, SiteProxy, backend_port, write_override
+from app.constants import HIBERNATE_FILE
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeSite:
+    """
+    Echo server standing in for a site's containers. Readiness probes get a 502
+    for the first ``warmup`` requests, like a container whose web server is still
+    starting, and a 200 afterwards.
+    """
+
+    def __init__(self, port: int, warmup: int = 0):
+        self.port = port
+        self.warmup = warmup
+        self.server = None
+        self.starts = 0
+        self.stops = 0
+        self.probes = 0
+
+    async def start(self):
+        self.starts += 1
+        await asyncio.sleep(0.05)
+        self.server = await asyncio.start_server(self._echo, "127.0.0.1", self.port)
+
+    async def stop(self):
+        self.stops += 1
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _echo(self, reader, writer):
+        while data := await reader.read(1024):
+            if data.startswith(b"GET / HTTP/1.1") and b"cms-manager-health" in data:
+                self.probes += 1
+                status = b"502 Bad Gateway" if self.probes <= self.warmup else b"200 OK"
+                writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Length: 0\r\n\r\n")
+                break
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+
+async def _request(port: int, data: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read(len(data))
+    writer.close()
+    return response
+
+
+def test_proxy_wakes_and_hibernates_site():
+    async def scenario():
+        public_port = _free_port()
+        site = FakeSite(_free_port())
+        events = []
+        proxy = SiteProxy(
+            "site",
+            {public_port: site.port},
+            site.start,
+            site.stop,
+            idle_timeout=0.2,
+            host="127.0.0.1",
+            on_event=lambda name, event: events.append(event),
+        )
+        await proxy.listen()
+        watcher = asyncio.ensure_future(proxy.watch(interval=0.05))
+
+        responses = await asyncio.gather(
+            *(_request(public_port, f"hello {index}".encode()) for index in range(5))
+        )
+        assert responses == [f"hello {index}".encode() for index in range(5)]
+        assert site.starts == 1
+
+        await asyncio.sleep(0.5)
+        assert site.stops == 1
+        assert proxy.running is False
+
+        assert await _request(public_port, b"again") == b"again"
+        assert site.starts == 2
+        assert events == ["woke", "hibernated", "woke"]
+
+        watcher.cancel()
+        await proxy.close()
+        await site.stop()
+
+    asyncio.run(scenario())
+
+
+def test_proxy_holds_connection_until_site_answers():
+    async def scenario():
+        public_port = _free_port()
+        site = FakeSite(_free_port(), warmup=2)
+        proxy = SiteProxy(
+            "site", {public_port: site.port}, site.start, site.stop, host="127.0.0.1"
+        )
+        await proxy.listen()
+
+        assert await _request(public_port, b"hello") == b"hello"
+        assert site.probes == 3
+
+        await proxy.close()
+        await site.stop()
+
+    asyncio.run(scenario())
+
+
+def test_proxy_closes_connection_when_start_fails():
+    async def scenario():
+        public_port = _free_port()
+
+        async def start():
+            raise RuntimeError("docker compose up failed")
+
+        proxy = SiteProxy(
+            "site", {public_port: _free_port()}, start, None, host="127.0.0.1"
+        )
+        await proxy.listen()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", public_port)
+        assert await reader.read() == b""
+        assert proxy.connections == 0
+
+        writer.close()
+        await proxy.close()
+
+    asyncio.run(scenario())
+
+
+def test_serve_restores_sites_on_shutdown(tmp_path: Path, monkeypatch):
+    ports = {"woken": _free_port(), "asleep": _free_port()}
+    backend = FakeSite(_free_port())
+    monkeypatch.setattr("app.Hibernator.backend_port", lambda port: backend.port)
+    sites = []
+    for name, port in ports.items():
+        (tmp_path / name).mkdir()
+        sites.append((name, str(tmp_path / name), {"wordpress": port}))
+    calls = []
+
+    async def compose(path, *args):
+        calls.append((Path(path).name, args))
+        if HIBERNATE_FILE in args:
+            await backend.start()
+
+    hibernator = Hibernator()
+    monkeypatch.setattr(hibernator, "_compose", compose)
+
+    async def scenario():
+        task = asyncio.create_task(hibernator._serve(sites))
+        while True:
+            try:
+                response = await _request(ports["woken"], b"ping")
+                break
+            except OSError:
+                # The proxy is not listening yet
+                await asyncio.sleep(0.01)
+        assert response == b"ping"
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await backend.stop()
+
+    asyncio.run(scenario())
+
+    assert ("woken", ("up", "-d")) in calls
+    assert ("asleep", ("up", "-d")) not in calls
+    assert not any((tmp_path / name / HIBERNATE_FILE).exists() for name in ports)
+
+
+def test_write_override(tmp_path: Path):
+    write_override(str(tmp_path), {"wordpress": 8000, "phpmyadmin": 9000})
+
+    assert (tmp_path / HIBERNATE_FILE).read_text() == (
+        "services:\n"
+        "  wordpress:\n"
+        "    ports: !override\n"
+        f'      - "127.0.0.1:{backend_port(8000)}:80"\n'
+        "  phpmyadmin:\n"
+        "    ports: !override\n"
+        f'      - "127.0.0.1:{backend_port(9000)}:80"\n'
+    )
+
+
+def test_compose_failure(tmp_path: Path):
+    hibernator = Hibernator(docker="false")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(hibernator._compose(str(tmp_path), "stop"))
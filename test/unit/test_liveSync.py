@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from app.LiveSync import REMOVE, REMOVE_TREE, WRITE, ChangeBatcher, LiveSync
+from app.SshTransport import LocalTransport
+
+linux_only = pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux only")
+
+
+def test_batcher_coalesces_changes():
+    batcher = ChangeBatcher(debounce=0)
+    for _ in range(100):
+        batcher.add("src/style.css", WRITE)
+    batcher.add("src/theme/a.php", WRITE)
+    batcher.add("src/theme/b.php", REMOVE)
+    batcher.add("src/theme", REMOVE_TREE)
+    batcher.add("src/theme/c.php", WRITE)
+
+    assert batcher.take(timeout=1) == {
+        "src/style.css": WRITE,
+        "src/theme": REMOVE_TREE,
+        "src/theme/c.php": WRITE,
+    }
+    assert batcher.events == 104
+    assert batcher.take(timeout=0) == {}
+
+
+def test_batcher_waits_for_quiet_period():
+    batcher = ChangeBatcher(debounce=10, max_delay=10)
+    batcher.add("src/index.php", WRITE)
+
+    assert batcher.take(timeout=0.05) == {}
+    assert batcher.pending == {"src/index.php": WRITE}
+
+
+def test_batcher_releases_after_max_delay():
+    batcher = ChangeBatcher(debounce=10, max_delay=0.05)
+    batcher.add("src/index.php", WRITE)
+
+    start = time.monotonic()
+    assert batcher.take(timeout=5) == {"src/index.php": WRITE}
+    assert time.monotonic() - start < 5
+
+
+def test_push(tmp_path: Path):
+    local = tmp_path / "src"
+    (local / "theme").mkdir(parents=True)
+    (local / "theme" / "style.css").write_text("body {}")
+    remote = tmp_path / "remote"
+    (remote / "html" / "plugins" / "old").mkdir(parents=True)
+    (remote / "html" / "plugins" / "old" / "old.php").write_text("<?php")
+    (remote / "html" / "readme.txt").write_text("readme")
+    live_sync = LiveSync(lambda: LocalTransport(str(remote)), str(local), "html")
+
+    stats = live_sync.push(
+        {
+            str(local / "theme" / "style.css"): WRITE,
+            str(local / "gone.php"): WRITE,
+            str(local / "readme.txt"): REMOVE,
+            str(local / "missing.txt"): REMOVE,
+            str(local / "plugins"): REMOVE_TREE,
+        }
+    )
+
+    # The transport resolves the remote directory against its root
+    assert (remote / "html" / "theme" / "style.css").read_text() == "body {}"
+    assert not (remote / "html" / "theme" / "style.css.part").exists()
+    assert sorted(os.listdir(remote / "html")) == ["theme"]
+    assert stats["files"] == 1
+    assert stats["bytes"] == 7
+    assert stats["removed"] == 3
+    assert live_sync.stats["batches"] == 1
+
+
+def test_push_reconnects_once(tmp_path: Path):
+    (tmp_path / "index.php").write_text("<?php")
+    transports = [mock.MagicMock(), LocalTransport(str(tmp_path / "remote"))]
+    transports[0].put.side_effect = EOFError()
+    live_sync = LiveSync(lambda: transports.pop(0), str(tmp_path), "html")
+
+    stats = live_sync.push({str(tmp_path / "index.php"): WRITE})
+
+    assert stats["files"] == 1
+    assert transports == []
+    assert (tmp_path / "remote" / "html" / "index.php").exists()
+
+
+def test_sync_all_skips_ignored_files(tmp_path: Path):
+    local = tmp_path / "src"
+    (local / ".git").mkdir(parents=True)
+    (local / ".git" / "HEAD").write_text("ref")
+    (local / "index.php").write_text("<?php")
+    (local / ".index.php.swp").write_text("swap")
+    remote = tmp_path / "remote"
+    live_sync = LiveSync(lambda: LocalTransport(str(remote)), str(local), "/")
+
+    stats = live_sync.sync_all()
+
+    assert stats["files"] == 1
+    assert os.listdir(remote) == ["index.php"]
+
+
+def test_overflow_queues_only_changes_since_last_sync(tmp_path: Path):
+    local = tmp_path / "src"
+    local.mkdir()
+    for name in ("index.php", "style.css", "old.php"):
+        (local / name).write_text(name)
+    live_sync = LiveSync(
+        lambda: LocalTransport(str(tmp_path / "remote")), str(local), "/"
+    )
+    live_sync.sync_all()
+
+    (local / "style.css").write_text("body { color: red }")
+    (local / "old.php").unlink()
+    (local / "new.php").write_text("<?php")
+    live_sync._inotify = mock.MagicMock()
+    live_sync._inotify.add_tree.return_value = [
+        str(local / name) for name in ("index.php", "style.css", "new.php")
+    ]
+    live_sync._handle(None, 0)
+
+    assert live_sync.batcher.pending == {
+        str(local / "style.css"): WRITE,
+        str(local / "new.php"): WRITE,
+        str(local / "old.php"): REMOVE,
+    }
+    assert live_sync.stats["overflows"] == 1
+
+
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@linux_only
+def test_run_follows_changes(tmp_path: Path):
+    local = tmp_path / "src"
+    (local / "wp-content").mkdir(parents=True)
+    (local / "index.php").write_text("<?php")
+    remote = tmp_path / "remote"
+    remote.mkdir()
+    live_sync = LiveSync(
+        lambda: LocalTransport(str(remote)), str(local), "/", debounce=0.02
+    )
+    thread = threading.Thread(target=live_sync.run)
+    thread.start()
+    try:
+        assert live_sync.wait_ready(5)
+        # Nothing is pushed for files that didn't change
+        time.sleep(0.1)
+        assert list(remote.iterdir()) == []
+
+        (local / "wp-content" / "style.css").write_text("body {}")
+        for index in range(50):
+            (local / "index.php").write_text(f"<?php // {index}")
+        _wait_for(lambda: (remote / "index.php").exists())
+        _wait_for(lambda: (remote / "index.php").read_text() == "<?php // 49")
+        assert (remote / "wp-content" / "style.css").read_text() == "body {}"
+
+        # A directory created or moved in is watched as well
+        staging = tmp_path / "plugin"
+        staging.mkdir()
+        (staging / "plugin.php").write_text("<?php")
+        os.rename(staging, local / "wp-content" / "plugin")
+        _wait_for(lambda: (remote / "wp-content" / "plugin" / "plugin.php").exists())
+        (local / "wp-content" / "plugin" / "extra.php").write_text("<?php")
+        _wait_for(lambda: (remote / "wp-content" / "plugin" / "extra.php").exists())
+
+        os.rename(local / "wp-content" / "plugin", tmp_path / "moved")
+        (local / "index.php").unlink()
+        _wait_for(lambda: not (remote / "wp-content" / "plugin").exists())
+        _wait_for(lambda: not (remote / "index.php").exists())
+    finally:
+        live_sync.stop()
+        thread.join(5)
+
+    assert not thread.is_alive()
+    assert live_sync.stats["overflows"] == 0
@@ -0,0 +1,243 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+import click
+import pytest
+
+from app import EnvFile
+from app.DaemonClient import DaemonClient, forward
+from app.ManagerDaemon import ManagerDaemon
+from app.constants import DAEMON_SOCKET, REGISTRY_FILE, SITES_DIR
+
+linux_only = pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux only")
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.pass_obj
+def names(manager):
+    click.echo(" ".join(manager.get_site_names()))
+
+
+@cli.command()
+@click.option("-n", "--name", prompt="Enter your site's name")
+def new(name):
+    click.echo(f"Site created: {name}.")
+
+
+@cli.command()
+def fail():
+    raise click.ClickException("Something went wrong")
+
+
+@cli.command()
+def crash():
+    raise KeyError("site")
+
+
+@cli.command()
+@click.argument("code", required=False)
+def leave(code):
+    sys.exit(int(code) if code and code.isdigit() else code)
+
+
+@cli.command()
+def where():
+    click.echo(f"{os.getcwd()} {os.environ.get('SITE_COLOR')}")
+
+
+@cli.command()
+def progress():
+    click.echo("blog: started")
+    # Waits until the client saw the first line
+    assert progress_seen.wait(5)
+    click.echo("blog: done")
+
+
+progress_seen = threading.Event()
+
+
+@pytest.fixture(autouse=True)
+def sites_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / SITES_DIR).mkdir()
+
+
+@pytest.fixture
+def manager():
+    manager = mock.MagicMock()
+    manager.get_site_names.return_value = ["blog", "shop"]
+    return manager
+
+
+@pytest.fixture
+def daemon(manager):
+    daemon = ManagerDaemon(cli, manager=manager)
+    ready = threading.Event()
+    thread = threading.Thread(target=daemon.serve, args=(ready.set,))
+    thread.start()
+    assert ready.wait(5)
+    yield daemon
+    daemon.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_run(manager):
+    daemon = ManagerDaemon(cli, manager=manager)
+
+    actual = daemon.run(["names"])
+
+    assert actual["exit_code"] == 0
+    assert actual["output"] == "blog shop\n"
+    assert daemon.stats["requests"] == 1
+
+
+def test_run_errors(manager):
+    daemon = ManagerDaemon(cli, manager=manager)
+
+    failed = daemon.run(["fail"])
+    crashed = daemon.run(["crash"])
+    unknown = daemon.run(["missing"])
+
+    assert failed == {**failed, "exit_code": 1, "output": "Error: Something went wrong\n"}
+    assert crashed["exit_code"] == 1
+    assert "KeyError: 'site'" in crashed["output"]
+    assert unknown["exit_code"] == 2
+
+
+def test_run_system_exit(manager):
+    daemon = ManagerDaemon(cli, manager=manager)
+
+    assert daemon.run(["leave"])["exit_code"] == 0
+    assert daemon.run(["leave", "3"])["exit_code"] == 3
+    failed = daemon.run(["leave", "Site not found"])
+    assert failed == {**failed, "exit_code": 1, "output": "Site not found\n"}
+
+
+def test_run_in_client_environment(manager, tmp_path):
+    daemon = ManagerDaemon(cli, manager=manager)
+
+    actual = daemon.run(["where"], env={"SITE_COLOR": "red"}, cwd=str(tmp_path))
+
+    assert actual["output"] == f"{tmp_path} red\n"
+    assert "SITE_COLOR" not in os.environ
+    assert daemon.run(["names"], cwd=str(tmp_path / SITES_DIR)) == {"direct": True}
+
+
+def test_run_reports_prompts(manager):
+    daemon = ManagerDaemon(cli, manager=manager)
+
+    assert daemon.run(["new"]) == {"interactive": True}
+    assert daemon.run(["new", "-n", "blog"])["output"] == "Site created: blog.\n"
+    assert click.termui.visible_prompt_func is input
+
+
+def test_run_reloads_registry_without_inotify(manager):
+    daemon = ManagerDaemon(cli, manager=manager)
+
+    daemon.run(["names"])
+
+    assert manager.registry.sites is None
+    assert manager.listening_ports is None
+
+
+def test_serve(daemon, capsys):
+    client = DaemonClient()
+
+    assert client.ping()["pid"] == os.getpid()
+    assert forward(["names"]) == 0
+    assert forward(["fail"]) == 1
+    assert forward(["new"]) is None
+    captured = capsys.readouterr()
+    assert captured.out == "blog shop\n"
+    assert captured.err == "Error: Something went wrong\n"
+    assert client.ping()["requests"] == 2
+
+    assert client.stop()
+    for _ in range(100):
+        if not os.path.exists(DAEMON_SOCKET):
+            break
+        time.sleep(0.05)
+    assert client.ping() is None
+    assert forward(["names"]) is None
+
+
+def test_serve_streams_output(daemon, capsys, monkeypatch):
+    written = []
+
+    def write(text):
+        written.append(text)
+        if text == "blog: started\n":
+            progress_seen.set()
+
+    monkeypatch.setattr(sys.stdout, "write", write)
+    assert forward(["progress"]) == 0
+    assert written == ["blog: started\n", "blog: done\n"]
+
+
+def test_serve_forwards_environment(daemon, capsys, monkeypatch):
+    monkeypatch.setenv("SITE_COLOR", "blue")
+
+    assert forward(["where"]) == 0
+    assert capsys.readouterr().out == f"{os.getcwd()} blue\n"
+
+
+def test_serve_replaces_stale_socket(manager):
+    Path(DAEMON_SOCKET).write_text("")
+    daemon = ManagerDaemon(cli, manager=manager)
+    thread = threading.Thread(target=daemon.serve)
+    thread.start()
+    try:
+        for _ in range(100):
+            if DaemonClient().ping() is not None:
+                break
+            time.sleep(0.05)
+        assert forward(["names"]) == 0
+    finally:
+        daemon.stop()
+        thread.join(5)
+
+    assert not os.path.exists(DAEMON_SOCKET)
+
+
+def test_forward_without_daemon():
+    assert forward(["names"]) is None
+    Path(DAEMON_SOCKET).write_text("")
+    assert forward(["names"]) is None
+
+
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@linux_only
+def test_invalidates_caches_on_changes(daemon, manager, tmp_path):
+    env_path = tmp_path / SITES_DIR / "blog" / ".env"
+    env_path.parent.mkdir()
+    env_path.write_text("WORDPRESS_PORT=8000\n")
+    # The new site directory is watched once its event arrives
+    _wait_for(lambda: str(Path(SITES_DIR, "blog")) in daemon._inotify.paths.values())
+    assert EnvFile.EnvFile(str(env_path)).get("WORDPRESS_PORT") == "8000"
+    manager.registry.sites = {"blog": {}}
+
+    daemon.run(["names"])
+    assert manager.registry.sites == {"blog": {}}
+
+    env_path.write_text("WORDPRESS_PORT=8001\n")
+    _wait_for(lambda: os.path.abspath(env_path) not in EnvFile._cache)
+    Path(REGISTRY_FILE).write_text("{}")
+    _wait_for(lambda: daemon._registry_stale)
+    daemon.run(["names"])
+    assert manager.registry.sites is None
@@ -0,0 +1,107 @@
+import errno
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from app.ConfigHelper import ConfigHelper
+from app.Materializer import Materializer, reflink
+
+
+def _create_template(root: Path) -> Path:
+    template = root / "template"
+    (template / "src" / "wp-includes" / "js").mkdir(parents=True)
+    (template / "src" / "wp-content").mkdir()
+    (template / "src" / "wp-includes" / "version.php").write_text("<?php $v = 1;")
+    (template / "src" / "wp-includes" / "js" / "app.js").write_text("app();")
+    (template / "src" / "wp-content" / "index.php").write_text("<?php")
+    (template / "docker-compose.yml").write_text("services: ${NETWORK_NAME}")
+    (template / ".env").write_text("WORDPRESS_PORT=\n")
+    os.symlink("wp-content", template / "src" / "content")
+    return template
+
+
+@pytest.fixture
+def no_reflink():
+    error = OSError(errno.EOPNOTSUPP, "Operation not supported")
+    with mock.patch("app.Materializer.reflink", side_effect=error) as mock_reflink:
+        yield mock_reflink
+
+
+def test_materialize_copies_without_reflinks(tmp_path: Path, no_reflink: mock.MagicMock):
+    template = _create_template(tmp_path)
+    destination = tmp_path / "site"
+
+    stats = Materializer(str(template), skip=("docker-compose.yml",)).materialize(
+        str(destination)
+    )
+
+    version = destination / "src" / "wp-includes" / "version.php"
+    assert version.read_text() == "<?php $v = 1;"
+    # Core files are updated in place, so they must not share an inode
+    assert not os.path.samefile(version, template / "src" / "wp-includes" / "version.php")
+    assert os.stat(version).st_nlink == 1
+    assert os.readlink(destination / "src" / "content") == "wp-content"
+    assert not (destination / "docker-compose.yml").exists()
+    assert stats["files"] == 4
+    assert stats["copied"] == 4
+    assert stats["reflinked"] == 0
+    # The first failure disables reflinks for the rest of the run
+    assert no_reflink.call_count == 1
+
+    version.write_text("<?php $v = 2;")
+    assert (template / "src" / "wp-includes" / "version.php").read_text() == (
+        "<?php $v = 1;"
+    )
+
+
+def test_materialize_prefers_reflinks(tmp_path: Path):
+    template = _create_template(tmp_path)
+
+    with mock.patch("app.Materializer.reflink") as mock_reflink:
+        stats = Materializer(str(template)).materialize(str(tmp_path / "site"))
+
+    assert stats["reflinked"] == 5
+    assert mock_reflink.call_count == 5
+
+
+def test_materialize_raises_unexpected_reflink_errors(tmp_path: Path):
+    template = _create_template(tmp_path)
+
+    with mock.patch("app.Materializer.reflink", side_effect=OSError(errno.ENOSPC, "")):
+        with pytest.raises(OSError):
+            Materializer(str(template)).materialize(str(tmp_path / "site"))
+
+
+def test_materialize_existing_destination(tmp_path: Path):
+    template = _create_template(tmp_path)
+
+    with pytest.raises(FileExistsError):
+        Materializer(str(template)).materialize(str(template))
+
+
+def test_reflink_unsupported_leaves_no_file(tmp_path: Path):
+    source = tmp_path / "source"
+    source.write_text("data")
+    target = tmp_path / "target"
+
+    with mock.patch(
+        "app.Materializer.fcntl.ioctl", side_effect=OSError(errno.EOPNOTSUPP, "")
+    ):
+        with pytest.raises(OSError):
+            reflink(str(source), str(target))
+
+    assert not target.exists()
+
+
+def test_update_env_file_does_not_write_through_hardlink(tmp_path: Path):
+    template_env = tmp_path / "template.env"
+    template_env.write_text("WORDPRESS_PORT=\n")
+    site_env = tmp_path / ".env"
+    os.link(template_env, site_env)
+
+    ConfigHelper.update_env_file(str(site_env), {"WORDPRESS_PORT": 8000})
+
+    assert template_env.read_text() == "WORDPRESS_PORT=\n"
+    assert site_env.read_text() == "WORDPRESS_PORT=8000\n"
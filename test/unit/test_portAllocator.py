@@ -0,0 +1,87 @@
+import pytest
+from pathlib import Path
+
+from app.PortAllocator import PortAllocator, listening_ports
+
+PROC_NET_TCP = """  sl  local_address rem_address   st tx_queue rx_queue
+   0: 00000000:1F40 00000000:0000 0A 00000000:00000000 00:00000000 00000000
+   1: 0100007F:2328 0100007F:C350 01 00000000:00000000 00:00000000 00000000
+"""
+
+PROC_NET_TCP6 = """  sl  local_address rem_address st
+   0: 00000000000000000000000000000000:1F41 00000000000000000000000000000000:0000 0A
+"""
+
+
+def test_allocate_lowest_free_slot():
+    allocator = PortAllocator()
+
+    assert allocator.allocate() == {"wordpress": 8000, "phpmyadmin": 9000}
+    assert allocator.allocate() == {"wordpress": 8001, "phpmyadmin": 9001}
+
+
+def test_allocate_skips_reserved_ports():
+    allocator = PortAllocator()
+    allocator.reserve_ports([8000, 9001, 8002])
+
+    assert allocator.allocate() == {"wordpress": 8003, "phpmyadmin": 9003}
+
+
+def test_release_makes_slot_available_again():
+    allocator = PortAllocator()
+    first = allocator.allocate()
+    allocator.allocate()
+
+    allocator.release(first)
+
+    assert not allocator.is_reserved(8000)
+    assert allocator.allocate() == first
+
+
+def test_allocate_lowest_slot_after_releases():
+    allocator = PortAllocator()
+    ports = [allocator.allocate() for _ in range(4)]
+
+    allocator.release(ports[1])
+    allocator.release(ports[3])
+    allocator.release(ports[0])
+
+    assert [allocator.allocate()["wordpress"] for _ in range(4)] == [
+        8000,
+        8001,
+        8003,
+        8004,
+    ]
+
+
+def test_release_ignores_missing_ports():
+    allocator = PortAllocator()
+
+    allocator.release({"wordpress": None, "phpmyadmin": 1234})
+
+    assert allocator.allocate() == {"wordpress": 8000, "phpmyadmin": 9000}
+
+
+def test_configurable_ranges():
+    allocator = PortAllocator((20000, 20002), (30000, 30010))
+
+    assert allocator.allocate() == {"wordpress": 20000, "phpmyadmin": 30000}
+    assert allocator.allocate() == {"wordpress": 20001, "phpmyadmin": 30001}
+    with pytest.raises(RuntimeError):
+        allocator.allocate()
+
+
+def test_invalid_ranges():
+    with pytest.raises(ValueError):
+        PortAllocator((8000, 8000), (9000, 9010))
+
+
+def test_listening_ports(tmp_path: Path):
+    tcp = tmp_path / "tcp"
+    tcp.write_text(PROC_NET_TCP)
+    tcp6 = tmp_path / "tcp6"
+    tcp6.write_text(PROC_NET_TCP6)
+
+    actual = listening_ports((str(tcp), str(tcp6), str(tmp_path / "missing")))
+
+    assert actual == {8000, 8001}
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from app import Reaper as Reaper_module
+from app.Reaper import Reaper
+from app.constants import REAPER_LOG, SITES_DIR, TRASH_DIR
+
+
+@pytest.fixture(autouse=True)
+def sites_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / SITES_DIR).mkdir()
+
+
+def _make_site(path: Path) -> int:
+    (path / "src" / "wp-content" / "uploads").mkdir(parents=True)
+    (path / "src" / "wp-content" / "uploads" / "image.jpg").write_bytes(b"x" * 1000)
+    (path / "src" / "index.php").write_bytes(b"x" * 100)
+    (path / "dev").mkdir()
+    (path / ".env").write_bytes(b"x" * 10)
+    os.symlink("src", path / "link")
+    return 1110 + len("src")
+
+
+def test_reclaim(tmp_path: Path):
+    path = tmp_path / TRASH_DIR / "blog.123"
+    size = _make_site(path)
+
+    result = Reaper(workers=2).reclaim(str(path))
+
+    assert result["name"] == "blog.123"
+    assert result["files"] == 4
+    assert result["bytes"] == size
+    assert not path.exists()
+    assert (tmp_path / TRASH_DIR).exists()
+
+
+def test_reclaim_spreads_single_subtree_over_workers(tmp_path: Path):
+    path = tmp_path / TRASH_DIR / "blog.123"
+    uploads = path / "src" / "wp-content" / "uploads"
+    for month in range(8):
+        (uploads / f"{month:02}").mkdir(parents=True)
+        (uploads / f"{month:02}" / "image.jpg").write_bytes(b"x" * 10)
+    threads = set()
+
+    def remove_file(file_path: str) -> tuple:
+        threads.add(threading.get_ident())
+        time.sleep(0.05)
+        return original(file_path)
+
+    original = Reaper_module._remove_file
+    with mock.patch("app.Reaper._remove_file", side_effect=remove_file):
+        result = Reaper(workers=4).reclaim(str(path))
+
+    assert result["files"] == 8
+    assert result["bytes"] == 80
+    assert not path.exists()
+    assert len(threads) > 1
+
+
+def test_reclaim_counts_only_freed_bytes(tmp_path: Path):
+    path = tmp_path / TRASH_DIR / "blog.123"
+    size = _make_site(path)
+    shared = tmp_path / "template.php"
+    shared.write_bytes(b"x" * 5000)
+    os.link(shared, path / "src" / "version.php")
+
+    result = Reaper().reclaim(str(path))
+
+    assert result["files"] == 5
+    assert result["bytes"] == size
+    assert shared.read_bytes() == b"x" * 5000
+
+
+def test_reclaim_missing_tree(tmp_path: Path):
+    result = Reaper().reclaim(str(tmp_path / TRASH_DIR / "missing"))
+
+    assert result["files"] == result["bytes"] == 0
+
+
+def test_reclaim_all(tmp_path: Path):
+    for name in ["blog.1", "shop.2"]:
+        _make_site(tmp_path / TRASH_DIR / name)
+
+    results = Reaper().reclaim_all()
+
+    assert [result["name"] for result in results] == ["blog.1", "shop.2"]
+    assert os.listdir(tmp_path / TRASH_DIR) == []
+    logged = [json.loads(line) for line in Path(REAPER_LOG).read_text().splitlines()]
+    assert logged == results
+
+
+def test_spawn(tmp_path: Path):
+    _make_site(tmp_path / TRASH_DIR / "blog.1")
+    process = Reaper().spawn()
+
+    assert process.wait(timeout=30) == 0
+    assert os.listdir(tmp_path / TRASH_DIR) == []
+    assert json.loads(Path(REAPER_LOG).read_text())["name"] == "blog.1"
@@ -0,0 +1,129 @@
+import io
+from pathlib import Path
+
+from app.SearchReplace import SearchReplace, process_chunk, replace_value
+
+OLD = "http://localhost:8000"
+NEW = "https://example.com"
+REPLACEMENTS = [(OLD.encode(), NEW.encode())]
+
+
+def _serialize_string(value: str) -> str:
+    return f's:{len(value.encode())}:"{value}";'
+
+
+def test_replace_plain_value():
+    assert replace_value(f"{OLD}/about".encode(), REPLACEMENTS) == f"{NEW}/about".encode()
+
+
+def test_replace_serialized_string_fixes_length():
+    value = _serialize_string(f"{OLD}/wp-content")
+
+    actual = replace_value(value.encode(), REPLACEMENTS)
+
+    assert actual == _serialize_string(f"{NEW}/wp-content").encode()
+
+
+def test_replace_serialized_array_with_nested_serialized_value():
+    inner = 'a:1:{s:3:"url";' + _serialize_string(OLD) + "}"
+    value = (
+        "a:3:{i:0;"
+        + _serialize_string(f"{OLD}/é")
+        + 's:5:"inner";'
+        + _serialize_string(inner)
+        + 's:4:"flag";b:1;}'
+    )
+
+    actual = replace_value(value.encode(), REPLACEMENTS).decode()
+
+    expected_inner = 'a:1:{s:3:"url";' + _serialize_string(NEW) + "}"
+    assert actual == (
+        "a:3:{i:0;"
+        + _serialize_string(f"{NEW}/é")
+        + 's:5:"inner";'
+        + _serialize_string(expected_inner)
+        + 's:4:"flag";b:1;}'
+    )
+
+
+def test_replace_serialized_object():
+    value = 'O:8:"stdClass":1:{s:4:"home";' + _serialize_string(OLD) + "}"
+
+    actual = replace_value(value.encode(), REPLACEMENTS).decode()
+
+    assert actual == 'O:8:"stdClass":1:{s:4:"home";' + _serialize_string(NEW) + "}"
+
+
+def test_replace_malformed_serialized_value_falls_back_to_plain_replace():
+    value = f's:99:"{OLD}";'.encode()
+
+    assert replace_value(value, REPLACEMENTS) == f's:99:"{NEW}";'.encode()
+
+
+def test_process_chunk_rewrites_escaped_sql_literals():
+    serialized = _serialize_string(f"{OLD}/it's").replace('"', '\\"').replace("'", "\\'")
+    chunk = (
+        "INSERT INTO `wp_options` VALUES (1,'siteurl','"
+        + OLD
+        + "'),(2,'widget','"
+        + serialized
+        + "'),(3,'other','value');\n"
+    ).encode()
+
+    output, read, rows, changed = process_chunk(chunk, REPLACEMENTS)
+
+    expected = _serialize_string(f"{NEW}/it's").replace('"', '\\"').replace("'", "\\'")
+    assert output.decode() == (
+        "INSERT INTO `wp_options` VALUES (1,'siteurl','"
+        + NEW
+        + "'),(2,'widget','"
+        + expected
+        + "'),(3,'other','value');\n"
+    )
+    assert read == len(chunk)
+    assert rows == 3
+    assert changed == 2
+
+
+def test_process_chunk_without_matches_is_unchanged():
+    chunk = b"INSERT INTO `t` VALUES (1,'a'),(2,'b');\n"
+
+    assert process_chunk(chunk, REPLACEMENTS) == (chunk, len(chunk), 2, 0)
+
+
+def _create_dump(statements: int) -> bytes:
+    lines = ["-- MySQL dump\n", "CREATE TABLE `t` (`id` int);\n"]
+    for index in range(statements):
+        value = _serialize_string(f"{OLD}/{index}").replace('"', '\\"')
+        lines.append(f"INSERT INTO `t` VALUES ({index},'{value}'),({index},'x');\n")
+    return "".join(lines).encode()
+
+
+def test_process_stream_in_worker_processes():
+    dump = _create_dump(200)
+    expected = io.BytesIO()
+    SearchReplace([(OLD, NEW)], workers=1).process_stream(io.BytesIO(dump), expected)
+    output = io.BytesIO()
+
+    stats = SearchReplace([(OLD, NEW)], workers=2, chunk_size=512).process_stream(
+        io.BytesIO(dump), output
+    )
+
+    assert output.getvalue() == expected.getvalue()
+    assert OLD.encode() not in output.getvalue()
+    assert stats["bytes"] == len(dump)
+    assert stats["rows"] == 400
+    assert stats["replacements"] == 200
+
+
+def test_process_file(tmp_path: Path):
+    input_path = tmp_path / "dump.sql"
+    input_path.write_bytes(_create_dump(3))
+    output_path = tmp_path / "out.sql"
+
+    stats = SearchReplace([(OLD, NEW)], workers=1).process_file(
+        str(input_path), str(output_path)
+    )
+
+    assert stats["replacements"] == 3
+    assert NEW.encode() in output_path.read_bytes()
@@ -0,0 +1,106 @@
+import pytest
+from pathlib import Path
+from unittest import mock
+
+from app.EnvFile import EnvFile
+from app.SharedDatabase import SharedDatabase, database_identifier
+from app.constants import COMPOSE_FILE, SHARED_TEMPLATES_DIR
+
+
+@pytest.fixture
+def shared(tmp_path: Path) -> SharedDatabase:
+    return SharedDatabase(str(tmp_path / "shared"), SHARED_TEMPLATES_DIR)
+
+
+@mock.patch("app.SharedDatabase.DockerMysqlClient")
+@mock.patch("subprocess.run")
+def test_ensure(
+    mock_run: mock.MagicMock, mock_client: mock.MagicMock, shared: SharedDatabase
+):
+    client = shared.ensure()
+
+    env_file = EnvFile(f"{shared.path}/.env")
+    password = env_file.get("MYSQL_ROOT_PASSWORD")
+    assert password
+    assert Path(shared.path, COMPOSE_FILE).exists()
+    mock_run.assert_called_with(
+        ["docker", "compose", "up", "-d"], cwd=shared.path, check=True
+    )
+    mock_client.assert_called_with("cms_mysql", "mysql", "root", password)
+    client.wait.assert_called_once()
+
+    shared.ensure(8080)
+
+    assert EnvFile(f"{shared.path}/.env").get("MYSQL_ROOT_PASSWORD") == password
+    mock_run.assert_called_with(
+        ["docker", "compose", "--profile", "phpmyadmin", "up", "-d"],
+        cwd=shared.path,
+        check=True,
+    )
+
+
+def test_root_client_not_provisioned(shared: SharedDatabase):
+    with pytest.raises(RuntimeError):
+        shared.root_client()
+
+
+def test_create_database(shared: SharedDatabase):
+    with mock.patch.object(SharedDatabase, "_execute") as mock_execute:
+        database = shared.create_database("blog")
+
+    sql = "".join(call.args[0] for call in mock_execute.call_args_list)
+    assert database["name"] == database["user"] == "wp_blog"
+    assert database["host"] == "cms_mysql"
+    assert "CREATE DATABASE `wp_blog`;" in sql
+    assert "IF NOT EXISTS" not in sql
+    assert f"CREATE USER 'wp_blog'@'%' IDENTIFIED BY '{database['password']}'" in sql
+    assert "GRANT ALL PRIVILEGES ON `wp_blog`.* TO 'wp_blog'@'%'" in sql
+
+
+def test_create_database_existing(shared: SharedDatabase):
+    with mock.patch.object(
+        SharedDatabase, "_execute", side_effect=RuntimeError("exit code 1")
+    ) as mock_execute:
+        with pytest.raises(RuntimeError, match="another site"):
+            shared.create_database("blog")
+
+    mock_execute.assert_called_once()
+
+
+def test_create_database_existing_user(shared: SharedDatabase):
+    with mock.patch.object(
+        SharedDatabase, "_execute", side_effect=[None, RuntimeError("exit code 1"), None]
+    ) as mock_execute:
+        with pytest.raises(RuntimeError, match="another site"):
+            shared.create_database("blog")
+
+    # Only the database this call created is dropped again
+    mock_execute.assert_called_with("DROP DATABASE IF EXISTS `wp_blog`;\n")
+
+
+def test_drop_database(shared: SharedDatabase):
+    with mock.patch.object(SharedDatabase, "_execute") as mock_execute:
+        shared.drop_database({"name": "wp_blog", "user": "wp_blog"})
+
+    mock_execute.assert_called_with(
+        "DROP DATABASE IF EXISTS `wp_blog`;\nDROP USER IF EXISTS 'wp_blog'@'%';\n"
+    )
+
+
+def test_database_identifier():
+    long_name = "a-very-long-site-name-for-a-mysql-user"
+
+    assert database_identifier("blog") == "wp_blog"
+    assert database_identifier("my-blog.dev").startswith("wp_my_blog_dev_")
+    assert len(database_identifier(long_name)) <= 32
+    assert database_identifier(long_name) != database_identifier(long_name + "2")
+
+
+def test_database_identifier_collisions():
+    names = ["my-site", "my_site", "my.site"]
+
+    identifiers = {database_identifier(name) for name in names}
+
+    assert len(identifiers) == len(names)
+    assert "wp_my_site" in identifiers
+    assert all(len(identifier) <= 32 for identifier in identifiers)
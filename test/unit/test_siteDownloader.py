@@ -0,0 +1,88 @@
+import os
+import pytest
+from pathlib import Path
+from unittest import mock
+
+from app.SiteDownloader import PART_SUFFIX, SiteDownloader
+from app.SshTransport import LocalTransport, TransportPool
+
+
+@pytest.fixture
+def remote(tmp_path: Path) -> Path:
+    remote = tmp_path / "remote" / "public_html"
+    (remote / "wp-content" / "uploads" / "2024").mkdir(parents=True)
+    (remote / "index.php").write_text("<?php // index")
+    (remote / "wp-content" / "plugin.php").write_text("<?php // plugin")
+    (remote / "wp-content" / "uploads" / "2024" / "video.mp4").write_bytes(
+        os.urandom(5000)
+    )
+    return remote
+
+
+@pytest.fixture
+def pool(remote: Path) -> TransportPool:
+    return TransportPool(lambda: LocalTransport(str(remote.parent)), 3)
+
+
+def test_download_mirrors_remote_tree(remote: Path, pool: TransportPool, tmp_path: Path):
+    local = tmp_path / "src"
+
+    stats = SiteDownloader(pool, workers=3, chunk_size=1024).download(
+        "public_html", str(local)
+    )
+
+    assert stats["files"] == 3
+    assert stats["skipped"] == 0
+    video = local / "wp-content" / "uploads" / "2024" / "video.mp4"
+    assert (
+        video.read_bytes()
+        == (remote / "wp-content" / "uploads" / "2024" / "video.mp4").read_bytes()
+    )
+    assert int(video.stat().st_mtime) == int(
+        (remote / "wp-content" / "uploads" / "2024" / "video.mp4").stat().st_mtime
+    )
+
+
+def test_download_only_fetches_changed_files(
+    remote: Path, pool: TransportPool, tmp_path: Path
+):
+    local = tmp_path / "src"
+    downloader = SiteDownloader(pool, workers=2)
+    downloader.download("public_html", str(local))
+    (remote / "index.php").write_text("<?php // changed index")
+    (local / "local-only.txt").write_text("keep me")
+
+    stats = downloader.download("public_html", str(local))
+
+    assert stats["files"] == 1
+    assert stats["skipped"] == 2
+    assert (local / "index.php").read_text() == "<?php // changed index"
+    assert (local / "local-only.txt").exists()
+
+
+def test_download_resumes_partial_file(remote: Path, pool: TransportPool, tmp_path: Path):
+    local = tmp_path / "src"
+    source = remote / "wp-content" / "uploads" / "2024" / "video.mp4"
+    part = local / "wp-content" / "uploads" / "2024" / f"video.mp4{PART_SUFFIX}"
+    part.parent.mkdir(parents=True)
+    part.write_bytes(source.read_bytes()[:3000])
+
+    stats = SiteDownloader(pool, chunk_size=1024).download("public_html", str(local))
+
+    assert stats["bytes"] == len("<?php // index") + len("<?php // plugin") + 2000
+    assert (part.parent / "video.mp4").read_bytes() == source.read_bytes()
+    assert not part.exists()
+
+
+def test_download_checksum_mismatch(remote: Path, pool: TransportPool, tmp_path: Path):
+    local = tmp_path / "src"
+
+    with mock.patch.object(
+        LocalTransport,
+        "checksums",
+        side_effect=lambda paths: {path: "0" * 64 for path in paths},
+    ):
+        with pytest.raises(RuntimeError):
+            SiteDownloader(pool).download("public_html", str(local))
+
+    assert not (local / "index.php").exists()
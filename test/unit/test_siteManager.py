@@ -1,9 +1,22 @@
+import multiprocessing
+import os
+import pytest
+from pathlib import Path
 from unittest import mock
 
 from app.SiteManager import SiteManager
+from app.SiteRegistry import SiteRegistry
+from app.constants import SITES_DIR, TEMPLATES_DIR
 
 
-MOCK_CONFIG = {"PHPMYADMIN_PORT": 8000, "WORDPRESS_PORT": 9000}
+MOCK_SITES = {
+    "TestProject": {
+        "name": "TestProject",
+        "ports": {"phpmyadmin": 8000, "wordpress": 9000},
+        "ssh": None,
+        "template_hash": None,
+    }
+}
 
 
 def setup_function(function):
@@ -11,13 +24,28 @@ def setup_function(function):
     manager = SiteManager(False)
 
 
-@mock.patch("app.SiteManager.dotenv_values", return_value=MOCK_CONFIG)
-@mock.patch("os.listdir", return_value=["TestProject"])
-def test_constructor(mock_listdir: mock.MagicMock, mock_dotenv_values: mock.MagicMock):
+@pytest.fixture(autouse=True)
+def sites_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("app.SiteManager.listening_ports", lambda: set())
+    (tmp_path / SITES_DIR).mkdir()
+
+
+def _load_mock_sites(registry: SiteRegistry):
+    registry.sites = MOCK_SITES
+
+
+@mock.patch("app.SiteManager.listening_ports", return_value={8001})
+@mock.patch.object(SiteRegistry, "load", autospec=True, side_effect=_load_mock_sites)
+def test_constructor(mock_load: mock.MagicMock, mock_listening_ports: mock.MagicMock):
     manager = SiteManager()
 
     assert manager.site is not None
-    assert manager.reserved_ports == [8000, 9000]
+    assert manager.site.allocator is manager.allocator
+    assert manager.allocator.is_reserved(8000)
+    assert manager.allocator.is_reserved(9000)
+    assert manager.allocator.is_reserved(8001)
+    assert manager.allocator.allocate() == {"wordpress": 8002, "phpmyadmin": 9002}
 
 
 def test_create_site_no_reserverd_ports():
@@ -26,20 +54,233 @@ def test_create_site_no_reserverd_ports():
     actual = manager.create_site("TestProject")
 
     assert actual == manager.site.create.return_value
-    assert manager.site.create.called_with(
-        "TestProject", {"phpmyadmin": 8000, "wordpress": 9000}
+    manager.site.create.assert_called_with(
+        "TestProject", {"wordpress": 8000, "phpmyadmin": 9000}, None
     )
 
 
 def test_create_site_with_reserverd_ports():
     manager.site.create = mock.MagicMock()
-    manager.reserved_ports = [8000, 8003, 9001, 9004]
+    manager.registry.sites = {}
+    manager.registry.add("siteA", {"wordpress": 8000, "phpmyadmin": 9001})
+    manager.registry.add("siteB", {"wordpress": 8003, "phpmyadmin": 9004})
+    manager.registry.save()
 
     actual = manager.create_site("TestProject")
 
     assert actual == manager.site.create.return_value
-    assert manager.site.create.called_with(
-        "TestProject", {"phpmyadmin": 8005, "wordpress": 9005}
+    manager.site.create.assert_called_with(
+        "TestProject", {"wordpress": 8002, "phpmyadmin": 9002}, None
+    )
+
+
+def test_create_site_reserves_pending_entry():
+    manager.site.create = mock.MagicMock()
+
+    manager.create_site("Test Project")
+
+    other = SiteRegistry(manager.registry.path)
+    other.load()
+    assert other.get("Test-Project")["pending"] is True
+    assert other.reserved_ports() == [9000, 8000]
+    assert other.names() == []
+
+
+def test_create_site_expires_killed_creates(tmp_path: Path):
+    manager.site.create = mock.MagicMock()
+    manager.registry.sites = {}
+    manager.registry.add("Killed", {"wordpress": 8000, "phpmyadmin": 9000}, pending=True)
+    manager.registry.get("Killed")["pid"] = 2**22 + 1
+    manager.registry.save()
+    staging = tmp_path / SITES_DIR / ".staging"
+    (staging / f"Killed.{2**22 + 1}.abc" / "src").mkdir(parents=True)
+    (staging / f"Live.{os.getpid()}.abc").mkdir()
+
+    manager.create_site("Killed")
+
+    manager.site.create.assert_called_with(
+        "Killed", {"wordpress": 8000, "phpmyadmin": 9000}, None
+    )
+    assert os.listdir(staging) == [f"Live.{os.getpid()}.abc"]
+
+
+def test_create_site_existing_name():
+    manager.site.create = mock.MagicMock()
+    manager.registry.sites = {}
+    manager.registry.add("TestProject", {"wordpress": 8000, "phpmyadmin": 9000})
+    manager.registry.save()
+
+    with pytest.raises(FileExistsError):
+        manager.create_site("TestProject")
+
+    manager.site.create.assert_not_called()
+
+
+def test_create_site_releases_ports_on_failure():
+    manager.site.create = mock.MagicMock(side_effect=OSError)
+
+    with pytest.raises(OSError):
+        manager.create_site("TestProject")
+
+    assert not manager.allocator.is_reserved(8000)
+    assert manager.registry.get("TestProject") is None
+
+
+def _create_site(name: str, queue: multiprocessing.Queue):
+    with mock.patch("app.SiteManager.listening_ports", return_value=set()):
+        queue.put(SiteManager().create_site(name))
+
+
+def test_create_site_in_parallel(tmp_path: Path):
+    templates = tmp_path / TEMPLATES_DIR
+    templates.mkdir()
+    (templates / ".env").write_text("WORDPRESS_PORT=\nPHPMYADMIN_PORT=\n")
+    (templates / "docker-compose.yml").write_text(
+        '"${WORDPRESS_PORT}:80"\n"${PHPMYADMIN_PORT}:80"\n'
+    )
+    queue = multiprocessing.Queue()
+    names = [f"site{index}" for index in range(6)]
+
+    processes = [
+        multiprocessing.Process(target=_create_site, args=(name, queue)) for name in names
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    registry = SiteRegistry(manager.registry.path)
+    registry.reindex()
+    ports = registry.reserved_ports()
+    assert sorted(queue.get() for _ in names) == names
+    assert sorted(registry.names()) == names
+    assert len(ports) == len(set(ports)) == 2 * len(names)
+    assert sorted(os.listdir(tmp_path / SITES_DIR / ".staging")) == []
+
+
+def _register_source_site():
+    (Path(SITES_DIR) / "source").mkdir()
+    manager.registry.sites = {}
+    manager.registry.add("source", {"wordpress": 8000, "phpmyadmin": 9000})
+    manager.registry.save()
+
+
+def test_clone_site_without_database():
+    _register_source_site()
+    manager.site.clone = mock.MagicMock(return_value="copy")
+
+    actual = manager.clone_site("source", "copy", database=False)
+
+    assert actual == "copy"
+    source, name, ports, database = manager.site.clone.call_args.args
+    assert source.path == os.path.join(SITES_DIR, "source")
+    assert name == "copy"
+    assert ports == {"wordpress": 8001, "phpmyadmin": 9001}
+    assert database is None
+
+
+@mock.patch("app.DatabasePipeline.DatabasePipeline")
+def test_clone_site_copies_database(mock_pipeline: mock.MagicMock):
+    _register_source_site()
+    manager.site.clone = mock.MagicMock(return_value="copy")
+    manager.site.start_database = mock.MagicMock()
+    manager.site.get_database_client = mock.MagicMock()
+
+    manager.clone_site("source", "copy", workers=2)
+
+    manager.site.start_database.assert_called_once()
+    assert mock_pipeline.call_args.args[1] == 2
+    mock_pipeline.return_value.copy.assert_called_with(
+        manager.site.get_database_client.return_value,
+        [
+            ("http://localhost:8000", "http://localhost:8001"),
+            ("http:\\/\\/localhost:8000", "http:\\/\\/localhost:8001"),
+        ],
+    )
+
+
+def test_clone_site_releases_ports_on_failure():
+    _register_source_site()
+    manager.site.clone = mock.MagicMock(side_effect=OSError)
+
+    with pytest.raises(OSError):
+        manager.clone_site("source", "copy")
+
+    assert not manager.allocator.is_reserved(8001)
+    assert manager.registry.get("copy") is None
+
+
+def test_clone_missing_site():
+    with pytest.raises(FileNotFoundError):
+        manager.clone_site("missing", "copy")
+
+
+def test_select_sites():
+    manager.registry.sites = {}
+    for name in ["blog", "shop-staging", "shop"]:
+        manager.registry.add(name, {"wordpress": None, "phpmyadmin": None})
+
+    assert manager.select_sites(all_sites=True) == ["blog", "shop-staging", "shop"]
+    assert manager.select_sites(["shop*", "shop", "blog"]) == [
+        "shop-staging",
+        "shop",
+        "blog",
+    ]
+    with pytest.raises(ValueError):
+        manager.select_sites(["missing*"])
+
+
+@mock.patch("app.ContainerOrchestrator.ContainerOrchestrator")
+def test_orchestrate(mock_orchestrator: mock.MagicMock):
+    on_progress = mock.MagicMock()
+
+    actual = manager.orchestrate("up", ["blog"], 4, on_progress)
+
+    assert actual == mock_orchestrator.return_value.run.return_value
+    mock_orchestrator.assert_called_with(4, on_progress=on_progress)
+    mock_orchestrator.return_value.run.assert_called_with(
+        "up", [("blog", os.path.join(SITES_DIR, "blog"))]
+    )
+
+
+@mock.patch("app.Hibernator.Hibernator")
+def test_hibernate(mock_hibernator: mock.MagicMock):
+    manager.registry.sites = {}
+    manager.registry.add("blog", {"wordpress": 8000, "phpmyadmin": 9000})
+
+    manager.hibernate(["blog"], 60)
+
+    mock_hibernator.assert_called_with(60, on_event=None)
+    mock_hibernator.return_value.serve.assert_called_with(
+        [
+            (
+                "blog",
+                os.path.join(SITES_DIR, "blog"),
+                {"phpmyadmin": 9000, "wordpress": 8000},
+            )
+        ]
+    )
+
+
+@mock.patch("app.HealthProbe.HealthProbe")
+def test_health(mock_probe: mock.MagicMock):
+    sites = {"blog": "", "shop": "DATABASE_MODE=shared\n"}
+    for index, (name, mode) in enumerate(sites.items()):
+        (Path(SITES_DIR) / name).mkdir()
+        (Path(SITES_DIR) / name / ".env").write_text(
+            f"WORDPRESS_PORT={8000 + index}\nPHPMYADMIN_PORT={9000 + index}\n{mode}"
+        )
+
+    actual = manager.health(["blog", "shop"], 2, 3)
+
+    assert actual == mock_probe.return_value.probe.return_value
+    mock_probe.assert_called_with(2, 3)
+    mock_probe.return_value.probe.assert_called_with(
+        [
+            ("blog", "wordpress", 8000),
+            ("blog", "phpmyadmin", 9000),
+            ("shop", "wordpress", 8001),
+        ]
     )
 
 
@@ -52,8 +293,37 @@ def test_get_site():
     assert manager.site.load.called_with("TestProject")
 
 
-@mock.patch("os.listdir")
-def test_get_site_names(mock_listdir: mock.MagicMock):
+@mock.patch("app.SiteManager.listening_ports")
+@mock.patch.object(SiteRegistry, "load")
+def test_constructor_is_lazy(
+    mock_load: mock.MagicMock, mock_listening_ports: mock.MagicMock
+):
+    SiteManager(False)
+
+    mock_load.assert_not_called()
+    mock_listening_ports.assert_not_called()
+
+
+def test_get_site_names():
+    manager.registry.sites = MOCK_SITES
+
     actual = manager.get_site_names()
 
-    assert actual == mock_listdir.return_value
+    assert actual == ["TestProject"]
+
+
+@mock.patch("app.SiteRegistry.SiteRegistry.save")
+@mock.patch("app.SiteRegistry.SiteRegistry.reindex")
+@mock.patch.object(SiteRegistry, "load", autospec=True, side_effect=_load_mock_sites)
+def test_reindex(
+    mock_load: mock.MagicMock,
+    mock_reindex: mock.MagicMock,
+    mock_save: mock.MagicMock,
+):
+    actual = manager.reindex()
+
+    assert actual == 1
+    mock_reindex.assert_called_once()
+    mock_save.assert_called_once()
+    assert manager.allocator.is_reserved(8000)
+    assert manager.allocator.is_reserved(9000)
@@ -0,0 +1,88 @@
+import gzip
+import pytest
+from pathlib import Path
+from unittest import mock
+
+from app.SiteMigrator import SiteMigrator, get_url_replacements
+
+
+def setup_function(function):
+    global migrator
+    migrator = SiteMigrator()
+
+
+@mock.patch("app.SiteMigrator.DatabasePipeline")
+def test_dump_database(mock_pipeline: mock.MagicMock):
+    site = mock.MagicMock()
+
+    actual = migrator.dump_database(site, "package/db", workers=2)
+
+    assert actual == mock_pipeline.return_value.dump.return_value
+    mock_pipeline.assert_called_with(site.get_database_client.return_value, 2)
+    mock_pipeline.return_value.dump.assert_called_with("package/db")
+
+
+@mock.patch("app.SiteMigrator.DatabasePipeline")
+def test_restore_database(mock_pipeline: mock.MagicMock, tmp_path: Path):
+    site = mock.MagicMock()
+
+    actual = migrator.restore_database(site, str(tmp_path))
+
+    assert actual == mock_pipeline.return_value.restore.return_value
+    mock_pipeline.return_value.restore.assert_called_with(str(tmp_path))
+
+
+def test_restore_database_missing_dump(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        migrator.restore_database(mock.MagicMock(), str(tmp_path / "missing"))
+
+
+def test_migrate(tmp_path: Path):
+    site = mock.MagicMock()
+    site.path = str(tmp_path / "site")
+    (tmp_path / "site").mkdir()
+    (tmp_path / "site" / ".env").write_text(
+        "WORDPRESS_PORT=8000\nSSH_DOMAIN=example.com\n"
+    )
+    dump_dir = tmp_path / "db"
+    dump_dir.mkdir()
+    (dump_dir / "wp_options.schema.sql.gz").write_bytes(b"schema")
+    with gzip.open(dump_dir / "wp_options.data.sql.gz", "wb") as file:
+        file.write(
+            b"INSERT INTO `wp_options` VALUES (1,'s:21:\\\"http://localhost:8000\\\";'),"
+            b"(2,'http:\\\\/\\\\/localhost:8000');\n"
+        )
+    output_dir = tmp_path / "out"
+
+    with mock.patch("app.SiteMigrator.open_compressed", gzip_open_compressed):
+        stats = migrator.migrate(site, str(dump_dir), str(output_dir), workers=1)
+
+    assert stats["files"] == 1
+    assert stats["rows"] == 2
+    assert stats["replacements"] == 2
+    assert (output_dir / "wp_options.schema.sql.gz").read_bytes() == b"schema"
+    with gzip.open(output_dir / "wp_options.data.sql.gz") as file:
+        assert file.read() == (
+            b"INSERT INTO `wp_options` VALUES (1,'s:19:\\\"https://example.com\\\";'),"
+            b"(2,'https:\\\\/\\\\/example.com');\n"
+        )
+
+
+def test_migrate_without_domain(tmp_path: Path):
+    site = mock.MagicMock()
+    site.path = str(tmp_path)
+    (tmp_path / ".env").write_text("WORDPRESS_PORT=8000\n")
+
+    with pytest.raises(ValueError):
+        migrator.migrate(site, str(tmp_path), str(tmp_path / "out"))
+
+
+def test_get_url_replacements():
+    assert get_url_replacements("http://a", "https://b") == [
+        ("http://a", "https://b"),
+        ("http:\\/\\/a", "https:\\/\\/b"),
+    ]
+
+
+def gzip_open_compressed(path: str, level: int = 3, threads: int = -1):
+    return gzip.open(path, "wb")
@@ -0,0 +1,95 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import pytest
+from pathlib import Path
+from unittest import mock
+
+import app.SitePackager as SitePackagerModule
+from app.SitePackager import MANIFEST_FILE, MEDIA_ARCHIVE, SitePackager
+
+
+def _create_source(root: Path) -> Path:
+    source = root / "src"
+    (source / "wp-content" / "uploads").mkdir(parents=True)
+    (source / "wp-content" / "empty").mkdir()
+    (source / "index.php").write_text("<?php echo 'hello';\n" * 100)
+    (source / "wp-content" / "uploads" / "photo.JPG").write_bytes(os.urandom(4096))
+    (source / "wp-content" / "uploads" / "notes.txt").write_text("notes")
+    return source
+
+
+def _read_tar(path: Path) -> dict:
+    with tarfile.open(path) as tar:
+        return {
+            member.name: tar.extractfile(member).read() if member.isfile() else None
+            for member in tar.getmembers()
+        }
+
+
+def test_package(tmp_path: Path):
+    source = _create_source(tmp_path)
+    output = tmp_path / "package"
+
+    manifest = SitePackager(str(source)).package(str(output))
+
+    files = {entry["path"]: entry for entry in manifest["files"]}
+    assert sorted(files) == [
+        "index.php",
+        "wp-content/uploads/notes.txt",
+        "wp-content/uploads/photo.JPG",
+    ]
+    assert files["wp-content/uploads/photo.JPG"]["archive"] == MEDIA_ARCHIVE
+    assert (
+        files["index.php"]["sha256"]
+        == hashlib.sha256((source / "index.php").read_bytes()).hexdigest()
+    )
+    assert manifest["stats"]["files"] == 3
+    assert manifest["stats"]["bytes"] == sum(entry["size"] for entry in files.values())
+    assert json.loads((output / MANIFEST_FILE).read_text()) == manifest
+
+    media = _read_tar(output / MEDIA_ARCHIVE)
+    assert media == {
+        "wp-content/uploads/photo.JPG": (
+            source / "wp-content" / "uploads" / "photo.JPG"
+        ).read_bytes()
+    }
+
+
+@pytest.mark.skipif(SitePackagerModule.zstandard is None, reason="zstandard missing")
+def test_package_zstd_archive(tmp_path: Path):
+    source = _create_source(tmp_path)
+    output = tmp_path / "package"
+
+    manifest = SitePackager(str(source), threads=2).package(str(output))
+
+    assert manifest["compression"] == "zstd"
+    reader = SitePackagerModule.zstandard.ZstdDecompressor().stream_reader(
+        open(output / "files.tar.zst", "rb")
+    )
+    with tarfile.open(fileobj=io.BytesIO(reader.read()), mode="r") as tar:
+        names = tar.getnames()
+        content = tar.extractfile("index.php").read()
+
+    assert "wp-content/empty" in names
+    assert "wp-content/uploads/notes.txt" in names
+    assert content == (source / "index.php").read_bytes()
+
+
+@mock.patch("app.SitePackager.zstandard", None)
+def test_package_gzip_fallback(tmp_path: Path):
+    source = _create_source(tmp_path)
+    output = tmp_path / "package"
+
+    manifest = SitePackager(str(source)).package(str(output))
+
+    assert manifest["compression"] == "gzip"
+    files = _read_tar(output / "files.tar.gz")
+    assert files["wp-content/uploads/notes.txt"] == b"notes"
+
+
+def test_package_missing_source(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        SitePackager(str(tmp_path / "missing")).package(str(tmp_path / "package"))
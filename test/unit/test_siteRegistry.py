@@ -0,0 +1,147 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+from app.SiteRegistry import SiteRegistry, is_process_running, template_hash
+from app.constants import SITES_DIR, TEMPLATE_STATE_FILE
+
+
+def _create_site(root: Path, name: str, env: str):
+    site_path = root / SITES_DIR / name
+    site_path.mkdir(parents=True)
+    (site_path / ".env").write_text(env)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / SITES_DIR).mkdir()
+    return SiteRegistry(os.path.join(SITES_DIR, ".registry.json"))
+
+
+def test_load_reindexes_missing_registry(registry: SiteRegistry, tmp_path: Path):
+    _create_site(
+        tmp_path,
+        "siteA",
+        "PHPMYADMIN_PORT=9000\nWORDPRESS_PORT=8000\nSSH_USER=user\nSSH_DOMAIN=a.com\n",
+    )
+    _create_site(tmp_path, "siteB", "PHPMYADMIN_PORT=9001\nWORDPRESS_PORT=8001\n")
+
+    registry.load()
+
+    assert registry.names() == ["siteA", "siteB"]
+    assert registry.get("siteA")["ssh"] == "user@a.com"
+    assert registry.get("siteB")["ssh"] is None
+    assert registry.reserved_ports() == [9000, 8000, 9001, 8001]
+    assert os.path.exists(registry.path)
+
+
+def test_reindex_skips_hidden_entries(registry: SiteRegistry, tmp_path: Path):
+    _create_site(tmp_path, "siteA", "WORDPRESS_PORT=8000\n")
+    (tmp_path / SITES_DIR / ".registry.json").write_text("{}")
+
+    registry.reindex()
+
+    assert registry.names() == ["siteA"]
+
+
+def test_reindex_keeps_template_hash(registry: SiteRegistry, tmp_path: Path):
+    _create_site(tmp_path, "siteA", "WORDPRESS_PORT=8000\n")
+    registry.sites = {}
+    registry.add("siteA", {"wordpress": 8000}, "abc123")
+
+    registry.reindex()
+
+    assert registry.get("siteA")["template_hash"] == "abc123"
+
+
+def test_reindex_reads_template_state(registry: SiteRegistry, tmp_path: Path):
+    _create_site(tmp_path, "siteA", "WORDPRESS_PORT=8000\n")
+    (tmp_path / SITES_DIR / "siteA" / TEMPLATE_STATE_FILE).write_text(
+        '{"template_hash": "def456"}'
+    )
+    registry.sites = {}
+    registry.add("siteA", {"wordpress": 8000}, "abc123")
+
+    registry.reindex()
+
+    assert registry.get("siteA")["template_hash"] == "def456"
+
+
+def test_load_reads_saved_registry(registry: SiteRegistry):
+    registry.sites = {}
+    registry.add("siteA", {"phpmyadmin": 9000, "wordpress": 8000}, "abc123")
+    registry.save()
+
+    loaded = SiteRegistry(registry.path)
+    loaded.load()
+
+    assert loaded.get("siteA") == registry.get("siteA")
+
+
+def test_load_rebuilds_outdated_registry(registry: SiteRegistry, tmp_path: Path):
+    _create_site(tmp_path, "siteA", "WORDPRESS_PORT=8000\n")
+    with open(registry.path, "w") as file:
+        json.dump({"version": 0, "sites": {}}, file)
+
+    registry.load()
+
+    assert registry.names() == ["siteA"]
+
+
+def test_update_and_remove(registry: SiteRegistry):
+    registry.sites = {}
+    registry.add("siteA", {"phpmyadmin": 9000, "wordpress": 8000})
+
+    registry.update("siteA", ssh="user@a.com")
+    assert registry.get("siteA")["ssh"] == "user@a.com"
+
+    registry.remove("siteA")
+    assert registry.names() == []
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+def test_expire_pending(registry: SiteRegistry):
+    registry.sites = {}
+    registry.add("live", {"phpmyadmin": 9000, "wordpress": 8000}, pending=True)
+    registry.add("killed", {"phpmyadmin": 9001, "wordpress": 8001}, pending=True)
+    registry.add("old", {"phpmyadmin": 9002, "wordpress": 8002}, pending=True)
+    registry.add("legacy", {"phpmyadmin": 9003, "wordpress": 8003})
+    registry.add("siteA", {"phpmyadmin": 9004, "wordpress": 8004})
+    registry.get("killed")["pid"] = _dead_pid()
+    registry.get("old")["reserved"] -= 2 * 24 * 60 * 60
+    registry.update("legacy", pending=True)
+
+    assert sorted(registry.expire_pending()) == ["killed", "legacy", "old"]
+    assert sorted(registry.sites) == ["live", "siteA"]
+    assert registry.reserved_ports() == [9000, 8000, 9004, 8004]
+
+
+def test_is_process_running():
+    assert is_process_running(os.getpid())
+    assert not is_process_running(_dead_pid())
+    assert not is_process_running(None)
+
+
+def test_update_unknown_site(registry: SiteRegistry):
+    registry.sites = {}
+
+    with pytest.raises(KeyError):
+        registry.update("missing", ssh="user@a.com")
+
+
+def test_template_hash(tmp_path: Path):
+    (tmp_path / "docker-compose.yml").write_text("services: {}\n")
+
+    first = template_hash(str(tmp_path))
+    (tmp_path / "docker-compose.yml").write_text("services: {a: {}}\n")
+
+    assert first != template_hash(str(tmp_path))
@@ -0,0 +1,126 @@
+import os
+import pytest
+from pathlib import Path
+from unittest import mock
+
+from app.SiteUploader import JOURNAL_SUFFIX, RateLimiter, SiteUploader
+from app.SshTransport import LocalTransport, TransportPool
+
+
+class FlakyTransport(LocalTransport):
+    """
+    Local stand-in for an SFTP server whose connection drops after a number of writes.
+    """
+
+    writes = 0
+
+    def __init__(self, root: str, fail_after: int):
+        super().__init__(root)
+        self.fail_after = fail_after
+
+    def write_at(self, path: str, offset: int, data: bytes) -> None:
+        if FlakyTransport.writes >= self.fail_after:
+            raise ConnectionError("Connection reset")
+        FlakyTransport.writes += 1
+        super().write_at(path, offset, data)
+
+
+@pytest.fixture
+def package(tmp_path: Path) -> Path:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "chunks.tar.zst").write_bytes(os.urandom(10 * 1024 + 7))
+    (package / "manifest.json").write_text('{"files": {}}')
+    return package
+
+
+@pytest.fixture
+def remote(tmp_path: Path) -> Path:
+    remote = tmp_path / "remote"
+    remote.mkdir()
+    return remote
+
+
+def test_upload(package: Path, remote: Path):
+    pool = TransportPool(lambda: LocalTransport(str(remote)), 3)
+    uploader = SiteUploader(pool, chunk_size=1024, workers=3)
+    local_path = package / "chunks.tar.zst"
+
+    stats = uploader.upload(str(local_path), "site/packages/one/chunks.tar.zst")
+
+    uploaded = remote / "site" / "packages" / "one" / "chunks.tar.zst"
+    assert uploaded.read_bytes() == local_path.read_bytes()
+    assert stats["bytes"] == local_path.stat().st_size
+    assert stats["resumed_chunks"] == 0
+    assert not os.path.exists(f"{local_path}{JOURNAL_SUFFIX}")
+    assert len(pool._all) <= 3
+
+
+def test_upload_resumes_interrupted_upload(package: Path, remote: Path):
+    local_path = package / "chunks.tar.zst"
+    FlakyTransport.writes = 0
+    flaky_pool = TransportPool(lambda: FlakyTransport(str(remote), 4), 1)
+
+    with pytest.raises(ConnectionError):
+        SiteUploader(flaky_pool, chunk_size=1024, workers=1).upload(
+            str(local_path), "chunks.tar.zst"
+        )
+
+    assert os.path.exists(f"{local_path}{JOURNAL_SUFFIX}")
+    pool = TransportPool(lambda: LocalTransport(str(remote)), 2)
+    stats = SiteUploader(pool, chunk_size=1024, workers=2).upload(
+        str(local_path), "chunks.tar.zst"
+    )
+
+    assert stats["resumed_chunks"] == 4
+    assert stats["bytes"] == local_path.stat().st_size - 4 * 1024
+    assert (remote / "chunks.tar.zst").read_bytes() == local_path.read_bytes()
+
+
+def test_upload_restarts_when_local_file_changed(package: Path, remote: Path):
+    local_path = package / "chunks.tar.zst"
+    FlakyTransport.writes = 0
+    flaky_pool = TransportPool(lambda: FlakyTransport(str(remote), 2), 1)
+    with pytest.raises(ConnectionError):
+        SiteUploader(flaky_pool, chunk_size=1024).upload(
+            str(local_path), "chunks.tar.zst"
+        )
+
+    local_path.write_bytes(os.urandom(3000))
+    pool = TransportPool(lambda: LocalTransport(str(remote)), 2)
+    stats = SiteUploader(pool, chunk_size=1024).upload(str(local_path), "chunks.tar.zst")
+
+    assert stats["resumed_chunks"] == 0
+    assert (remote / "chunks.tar.zst").read_bytes() == local_path.read_bytes()
+
+
+def test_upload_checksum_mismatch(package: Path, remote: Path):
+    pool = TransportPool(lambda: LocalTransport(str(remote)), 1)
+    local_path = package / "chunks.tar.zst"
+
+    with mock.patch.object(LocalTransport, "checksum", return_value="0" * 64):
+        with pytest.raises(RuntimeError):
+            SiteUploader(pool, chunk_size=1024).upload(str(local_path), "chunks.tar.zst")
+
+    assert not (remote / "chunks.tar.zst").exists()
+    assert not os.path.exists(f"{local_path}{JOURNAL_SUFFIX}")
+
+
+def test_upload_directory(package: Path, remote: Path):
+    pool = TransportPool(lambda: LocalTransport(str(remote)), 2)
+
+    stats = SiteUploader(pool, chunk_size=1024).upload_directory(str(package), "one")
+
+    assert stats["files"] == 2
+    assert sorted(os.listdir(remote / "one")) == ["chunks.tar.zst", "manifest.json"]
+
+
+@mock.patch("time.sleep")
+def test_rate_limiter(mock_sleep: mock.MagicMock):
+    limiter = RateLimiter(1000)
+
+    limiter.consume(500)
+    mock_sleep.assert_not_called()
+
+    limiter.consume(1500)
+    assert mock_sleep.call_args.args[0] == pytest.approx(1.0, abs=0.05)
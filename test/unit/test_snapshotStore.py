@@ -0,0 +1,202 @@
+import errno
+import os
+import time
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from app.SnapshotStore import SnapshotStore, file_hash
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> SnapshotStore:
+    return SnapshotStore(str(tmp_path / "snapshots"), workers=2)
+
+
+def _make_site(path: Path) -> str:
+    (path / "src" / "wp-includes").mkdir(parents=True)
+    (path / "src" / "wp-includes" / "version.php").write_text("<?php $wp_version;")
+    (path / "src" / "index.php").write_text("<?php // index")
+    (path / "packages" / "20240101").mkdir(parents=True)
+    (path / "packages" / "20240101" / "files.tar").write_text("package")
+    (path / ".env").write_text(f"NAME={path.name}")
+    os.symlink("src", path / "html")
+    return str(path)
+
+
+def _dump(tables: dict):
+    def dump(output_dir):
+        for name, content in tables.items():
+            Path(output_dir, name).write_bytes(content)
+        return {"tables": len(tables)}
+
+    return dump
+
+
+def _objects(store: SnapshotStore) -> list:
+    return [digest for digest, _ in store._objects()]
+
+
+def test_snapshot_deduplicates_across_snapshots_and_sites(tmp_path, store):
+    blog = _make_site(tmp_path / "blog")
+    shop = _make_site(tmp_path / "shop")
+
+    first = store.snapshot("blog", blog, "before update")
+    objects = _objects(store)
+    second = store.snapshot("blog", blog)
+    store.snapshot("shop", shop)
+
+    assert set(first["files"]) == {".env", "src/index.php", "src/wp-includes/version.php"}
+    assert first["symlinks"] == {"html": "src"}
+    assert first["label"] == "before update"
+    assert first["stats"]["hashed"] == 3
+    assert second["stats"]["hashed"] == 0
+    assert second["stats"]["stored_bytes"] == 0
+    assert second["id"] != first["id"]
+    # Only the .env differs between the sites
+    assert len(objects) == 3
+    assert len(_objects(store)) == 4
+    assert [manifest["id"] for manifest in store.snapshots("blog")] == [
+        first["id"],
+        second["id"],
+    ]
+    assert "files" not in store.snapshots("blog")[0]
+
+
+def test_snapshot_stores_database(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+    tables = {"wp_posts.data.sql.zst": b"posts", "wp_users.data.sql.zst": b"users"}
+
+    manifest = store.snapshot("blog", site, dump=_dump(tables))
+
+    assert set(manifest["database"]) == set(tables)
+    assert manifest["database"]["wp_posts.data.sql.zst"]["size"] == 5
+    assert os.listdir(os.path.join(store.path, "tmp")) == []
+
+
+def test_rollback_restores_only_differing_files(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+    store.snapshot("blog", site)
+
+    (tmp_path / "blog" / "src" / "index.php").write_text("<?php // hacked")
+    (tmp_path / "blog" / "src" / "wp-includes" / "version.php").unlink()
+    (tmp_path / "blog" / "src" / "wp-content").mkdir()
+    (tmp_path / "blog" / "src" / "wp-content" / "shell.php").write_text("<?php")
+    (tmp_path / "blog" / "html").unlink()
+    (tmp_path / "blog" / "packages" / "20240102").mkdir()
+
+    stats = store.rollback("blog", site)
+
+    assert stats["restored"] == 2
+    assert stats["deleted"] == 1
+    assert stats["unchanged"] == 1
+    assert (tmp_path / "blog" / "src" / "index.php").read_text() == "<?php // index"
+    assert (tmp_path / "blog" / "src" / "wp-includes" / "version.php").exists()
+    assert not (tmp_path / "blog" / "src" / "wp-content").exists()
+    assert os.readlink(tmp_path / "blog" / "html") == "src"
+    # Packages are not part of snapshots
+    assert (tmp_path / "blog" / "packages" / "20240102").exists()
+    assert store.snapshot("blog", site)["stats"]["hashed"] == 0
+
+
+def test_rollback_leaves_objects_unshared(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+    store.snapshot("blog", site)
+    index = tmp_path / "blog" / "src" / "index.php"
+    index.write_text("<?php // hacked")
+
+    with mock.patch(
+        "app.SnapshotStore.reflink", side_effect=OSError(errno.EOPNOTSUPP, "")
+    ):
+        store.rollback("blog", site)
+
+    assert os.stat(index).st_nlink == 1
+    assert os.stat(index).st_mode & 0o777 != 0o444
+    with open(index, "r+") as file:
+        file.write("<?php // edit")
+    assert store.verify()["corrupt"] == []
+
+
+def test_rollback_hashes_files_with_changed_mtime(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+    store.snapshot("blog", site)
+    os.utime(tmp_path / "blog" / ".env", (0, 0))
+
+    stats = store.rollback("blog", site)
+
+    assert stats["restored"] == 0
+    assert stats["unchanged"] == 3
+
+
+def test_rollback_restores_database(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+    tables = {"wp_posts.data.sql.zst": b"posts"}
+    first = store.snapshot("blog", site, dump=_dump(tables))
+    store.snapshot("blog", site, dump=_dump({"wp_posts.data.sql.zst": b"changed"}))
+    restored = {}
+
+    def restore(input_dir):
+        restored.update({name: Path(input_dir, name).read_bytes() for name in tables})
+        return {"tables": 1}
+
+    stats = store.rollback("blog", site, first["id"], restore)
+
+    assert restored == tables
+    assert stats["database"] == {"tables": 1}
+
+
+def test_rollback_unknown_snapshot(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+
+    with pytest.raises(FileNotFoundError):
+        store.rollback("blog", site)
+    with pytest.raises(FileNotFoundError):
+        store.get("blog", "missing")
+
+
+def test_prune(tmp_path, store, monkeypatch):
+    site = Path(_make_site(tmp_path / "blog"))
+    now = time.time()
+    ids = []
+    for index in range(4):
+        monkeypatch.setattr(time, "time", lambda: now - (3 - index) * 86400)
+        (site / "src" / "index.php").write_text(f"<?php // {index}")
+        ids.append(store.snapshot("blog", str(site))["id"])
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    result = store.prune("blog", keep_last=1, keep_days=1.5)
+
+    assert result["removed"] == [ids[1], ids[0]]
+    assert result["objects"] == 2
+    assert len(_objects(store)) == 4
+    assert store.prune("blog")["removed"] == []
+
+
+def test_prune_latest_snapshot_forgets_collected_hashes(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+    store.snapshot("blog", site)
+
+    result = store.prune("blog", keep_last=0)
+    assert result["objects"] == 3
+    assert _objects(store) == []
+
+    manifest = store.snapshot("blog", site)
+    assert manifest["stats"]["hashed"] == 3
+    assert store.verify() == {"objects": 3, "corrupt": [], "missing": []}
+
+
+def test_verify(tmp_path, store):
+    site = _make_site(tmp_path / "blog")
+    manifest = store.snapshot("blog", site)
+    assert store.verify() == {"objects": 3, "corrupt": [], "missing": []}
+
+    corrupt = manifest["files"]["src/index.php"]["hash"]
+    path = store._object_path(corrupt)
+    os.chmod(path, 0o644)
+    Path(path).write_text("bit rot")
+    missing = manifest["files"][".env"]["hash"]
+    os.remove(store._object_path(missing))
+
+    assert store.verify() == {"objects": 2, "corrupt": [corrupt], "missing": [missing]}
+    assert file_hash(os.path.join(site, ".env")) == missing
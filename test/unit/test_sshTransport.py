@@ -0,0 +1,280 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from app.SiteUploader import SiteUploader
+from app.SshTransport import LocalTransport, SftpTransport, TransportPool, file_checksum
+
+
+def test_pool_reuses_connections():
+    factory = mock.MagicMock()
+    pool = TransportPool(factory, 2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    factory.assert_called_once()
+
+
+def test_pool_bounds_open_connections():
+    factory = mock.MagicMock(side_effect=lambda: mock.MagicMock())
+    pool = TransportPool(factory, 2)
+    barrier = threading.Barrier(2)
+    seen = []
+
+    def use():
+        with pool.connection() as transport:
+            seen.append(transport)
+            barrier.wait(timeout=5)
+
+    threads = [threading.Thread(target=use) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(seen) == 4
+    assert factory.call_count == 2
+
+
+def test_pool_drops_failed_connections():
+    transport = mock.MagicMock()
+    pool = TransportPool(lambda: transport, 1)
+
+    with pytest.raises(ConnectionError):
+        with pool.connection():
+            raise ConnectionError
+
+    transport.close.assert_called_once()
+    assert pool._all == []
+
+
+def test_local_transport(tmp_path: Path):
+    transport = LocalTransport(str(tmp_path))
+
+    transport.makedirs("/a/b")
+    transport.allocate("a/b/file", 6)
+    transport.write_at("a/b/file", 2, b"xyz")
+    transport.rename("a/b/file", "a/file")
+
+    assert transport.read_at("a/file", 2, 3) == b"xyz"
+    assert transport.size("a/file") == 6
+    assert transport.size("a/missing") is None
+    assert transport.checksum("a/file") == file_checksum(str(tmp_path / "a" / "file"))
+    entries = {name: (is_dir, size) for name, is_dir, size, _ in transport.listdir("a")}
+    assert entries["file"] == (False, 6)
+    assert entries["b"][0] is True
+
+    transport.put(str(tmp_path / "a" / "file"), "a/b/copy")
+    assert transport.size("a/b/copy") == 6
+    transport.remove_tree("a/b")
+    transport.remove_tree("a/missing")
+    assert transport.size("a/b/copy") is None
+
+
+class FakeSftpClient:
+    """
+    Stands in for paramiko's SFTPClient, serving a local directory the way an SFTP
+    server chrooted to it would.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.closed = False
+
+    def stat(self, path: str):
+        return os.stat(self._path(path))
+
+    def mkdir(self, path: str):
+        os.mkdir(self._path(path))
+
+    def open(self, path: str, mode: str):
+        return open(self._path(path), mode)
+
+    def listdir_attr(self, path: str):
+        entries = []
+        for name in sorted(os.listdir(self._path(path))):
+            attributes = os.lstat(os.path.join(self._path(path), name))
+            entries.append(
+                SimpleNamespace(
+                    filename=name,
+                    st_mode=attributes.st_mode,
+                    st_size=attributes.st_size,
+                    st_mtime=int(attributes.st_mtime),
+                )
+            )
+        return entries
+
+    def put(self, local_path: str, path: str):
+        shutil.copyfile(local_path, self._path(path))
+
+    def posix_rename(self, source: str, destination: str):
+        os.rename(self._path(source), self._path(destination))
+
+    def remove(self, path: str):
+        os.remove(self._path(path))
+
+    def close(self):
+        self.closed = True
+
+    def _path(self, path: str) -> str:
+        return str(self.root / path.lstrip("/"))
+
+
+class FakeSshClient:
+    """
+    Stands in for paramiko's SSHClient. Commands run in a shell rooted at the served
+    directory and their output is returned through a fake channel.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.commands = []
+        self.sftp = FakeSftpClient(root)
+        self.connected = None
+        self.closed = False
+
+    def load_system_host_keys(self):
+        pass
+
+    def connect(self, host, port, username, password):
+        self.connected = (host, port, username, password)
+
+    def open_sftp(self):
+        return self.sftp
+
+    def exec_command(self, command: str):
+        self.commands.append(command)
+        process = subprocess.run(
+            command, shell=True, cwd=self.root, capture_output=True, check=False
+        )
+        stdout = mock.MagicMock()
+        stdout.read.return_value = process.stdout
+        stdout.channel.recv_exit_status.return_value = process.returncode
+        return mock.MagicMock(), stdout, mock.MagicMock()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def ssh_client(tmp_path: Path):
+    client = FakeSshClient(tmp_path)
+    paramiko = SimpleNamespace(SSHClient=lambda: client)
+    with mock.patch.dict(sys.modules, {"paramiko": paramiko}):
+        yield client
+
+
+def test_sftp_transport(ssh_client: FakeSshClient, tmp_path: Path):
+    transport = SftpTransport("example.com", "deploy", "secret", port=2222)
+
+    transport.makedirs("site/wp content")
+    transport.allocate("site/wp content/file.part", 6)
+    transport.write_at("site/wp content/file.part", 2, b"xyz")
+    transport.write_at("site/wp content/file.part", 0, b"ab")
+    transport.rename("site/wp content/file.part", "site/wp content/file")
+
+    assert ssh_client.connected == ("example.com", 2222, "deploy", "secret")
+    assert (tmp_path / "site" / "wp content" / "file").read_bytes() == b"abxyz\0"
+    assert transport.read_at("site/wp content/file", 2, 3) == b"xyz"
+    assert transport.size("site/wp content/file") == 6
+    assert transport.size("site/missing") is None
+    entries = {name: is_dir for name, is_dir, _, _ in transport.listdir("site")}
+    assert entries == {"wp content": True}
+    files = transport.listdir("site/wp content")
+    assert [(name, is_dir, size) for name, is_dir, size, _ in files] == [
+        ("file", False, 6)
+    ]
+
+    transport.close()
+    assert ssh_client.sftp.closed and ssh_client.closed
+
+
+def test_sftp_transport_makedirs_absolute(ssh_client: FakeSshClient, tmp_path: Path):
+    ssh_client.sftp._path = lambda path: str(tmp_path / path.lstrip("/"))
+    transport = SftpTransport("example.com", "deploy", "secret")
+
+    transport.makedirs("/srv/site/")
+    transport.makedirs("/srv/site/uploads")
+
+    assert (tmp_path / "srv" / "site" / "uploads").is_dir()
+
+
+def test_sftp_transport_checksums(ssh_client: FakeSshClient, tmp_path: Path):
+    (tmp_path / "a file.php").write_bytes(b"<?php")
+    (tmp_path / "b.php").write_bytes(b"")
+    transport = SftpTransport("example.com", "deploy", "secret")
+
+    actual = transport.checksums(["a file.php", "b.php"])
+
+    assert actual == {
+        "a file.php": file_checksum(str(tmp_path / "a file.php")),
+        "b.php": file_checksum(str(tmp_path / "b.php")),
+    }
+    assert ssh_client.commands == ["sha256sum -- 'a file.php' b.php"]
+    assert transport.checksum("b.php") == actual["b.php"]
+
+
+def test_sftp_transport_checksum_binary_mode_output(ssh_client: FakeSshClient):
+    transport = SftpTransport("example.com", "deploy", "secret")
+    output = f"{'0' * 64} *site/index.php\n".encode()
+
+    with mock.patch.object(ssh_client, "exec_command") as exec_command:
+        stdout = mock.MagicMock()
+        stdout.read.return_value = output
+        stdout.channel.recv_exit_status.return_value = 0
+        exec_command.return_value = (None, stdout, None)
+
+        assert transport.checksums(["site/index.php"]) == {"site/index.php": "0" * 64}
+
+
+def test_sftp_transport_checksum_missing_file(ssh_client: FakeSshClient):
+    transport = SftpTransport("example.com", "deploy", "secret")
+
+    with pytest.raises(RuntimeError):
+        transport.checksum("missing.php")
+
+
+def test_sftp_transport_put_and_remove(ssh_client: FakeSshClient, tmp_path: Path):
+    (tmp_path / "local.php").write_text("<?php")
+    transport = SftpTransport("example.com", "deploy", "secret")
+    transport.makedirs("html/old")
+    (tmp_path / "html" / "old" / "old.php").write_text("<?php")
+
+    transport.put(str(tmp_path / "local.php"), "html/index.php.part")
+    transport.rename("html/index.php.part", "html/index.php")
+    transport.remove("local.php")
+    transport.remove_tree("html/old")
+
+    assert sorted(os.listdir(tmp_path / "html")) == ["index.php"]
+    assert not (tmp_path / "local.php").exists()
+    assert ssh_client.commands == ["rm -rf -- html/old"]
+    with pytest.raises(FileNotFoundError):
+        transport.remove("missing.php")
+
+
+def test_sftp_transport_upload(ssh_client: FakeSshClient, tmp_path: Path):
+    local = tmp_path / "local.bin"
+    local.write_bytes(os.urandom(10_000))
+    pool = TransportPool(lambda: SftpTransport("example.com", "deploy", "secret"), 2)
+
+    stats = SiteUploader(pool, chunk_size=4096, workers=2).upload(
+        str(local), "remote/packages/local.bin"
+    )
+    pool.close()
+
+    assert (tmp_path / "remote" / "packages" / "local.bin").read_bytes() == (
+        local.read_bytes()
+    )
+    assert not (tmp_path / "remote" / "packages" / "local.bin.part").exists()
+    assert stats["bytes"] == 10_000
+    assert stats["sha256"] == file_checksum(str(local))
@@ -0,0 +1,101 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.SiteRegistry import SiteRegistry, template_hash
+from app.TemplateUpgrader import (
+    TemplateUpgrader,
+    read_template_state,
+    write_template_state,
+)
+from app.constants import COMPOSE_FILE, SITES_DIR, TEMPLATE_STATE_FILE, TEMPLATES_DIR
+
+OLD_TEMPLATE = 'ports:\n  - "${WORDPRESS_PORT}:80"\n'
+NEW_TEMPLATE = 'ports:\n  - "${WORDPRESS_PORT}:80"\nnetwork: ${NETWORK_NAME}\n'
+
+
+@pytest.fixture
+def registry(tmp_path: Path, monkeypatch) -> SiteRegistry:
+    monkeypatch.chdir(tmp_path)
+    templates = tmp_path / TEMPLATES_DIR
+    templates.mkdir()
+    (templates / COMPOSE_FILE).write_text(OLD_TEMPLATE)
+    old_hash = template_hash()
+    (templates / COMPOSE_FILE).write_text(NEW_TEMPLATE)
+
+    registry = SiteRegistry()
+    registry.sites = {}
+    for index, name in enumerate(["current", "stale", "legacy"]):
+        ports = {"phpmyadmin": 9000 + index, "wordpress": 8000 + index}
+        site_path = tmp_path / SITES_DIR / name
+        site_path.mkdir(parents=True)
+        (site_path / COMPOSE_FILE).write_text(f'ports:\n  - "{8000 + index}:80"\n')
+        digest = template_hash() if name == "current" else old_hash
+        registry.add(name, ports, digest)
+        if name != "legacy":
+            write_template_state(
+                str(site_path), digest, {"site_name": name, "ports": ports}
+            )
+    registry.save()
+    return registry
+
+
+def test_upgrade_dry_run(registry: SiteRegistry, tmp_path: Path):
+    results = TemplateUpgrader(registry).upgrade(dry_run=True)
+
+    statuses = {result["name"]: result["status"] for result in results}
+    assert statuses == {"current": "current", "stale": "stale", "legacy": "stale"}
+    stale = next(result for result in results if result["name"] == "stale")
+    assert "+network: stale_network\n" in stale["diff"]
+    assert (tmp_path / SITES_DIR / "stale" / COMPOSE_FILE).read_text() == (
+        'ports:\n  - "8001:80"\n'
+    )
+
+
+def test_upgrade(registry: SiteRegistry, tmp_path: Path):
+    current_hash = template_hash()
+
+    results = TemplateUpgrader(registry, workers=2).upgrade()
+
+    statuses = {result["name"]: result["status"] for result in results}
+    assert statuses == {
+        "current": "current",
+        "stale": "upgraded",
+        "legacy": "upgraded",
+    }
+    legacy_path = tmp_path / SITES_DIR / "legacy"
+    assert (legacy_path / COMPOSE_FILE).read_text() == (
+        'ports:\n  - "8002:80"\nnetwork: legacy_network\n'
+    )
+    assert read_template_state(str(legacy_path)) == {
+        "template_hash": current_hash,
+        "inputs": {
+            "site_name": "legacy",
+            "ports": {"phpmyadmin": 9002, "wordpress": 8002},
+        },
+    }
+    other = SiteRegistry()
+    other.load()
+    assert all(other.get(name)["template_hash"] == current_hash for name in statuses)
+
+    results = TemplateUpgrader(registry).upgrade()
+
+    assert all(result["status"] == "current" for result in results)
+
+
+def test_read_template_state_for_legacy_site(tmp_path: Path):
+    assert read_template_state(str(tmp_path)) is None
+
+    (tmp_path / TEMPLATE_STATE_FILE).write_text("{")
+
+    assert read_template_state(str(tmp_path)) is None
+
+
+def test_write_template_state(tmp_path: Path):
+    write_template_state(str(tmp_path), "abc", {"site_name": "site"})
+
+    assert json.loads((tmp_path / TEMPLATE_STATE_FILE).read_text()) == {
+        "template_hash": "abc",
+        "inputs": {"site_name": "site"},
+    }
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+from app import Tracer
+from app.Tracer import NOOP_SPAN, current_span, span, traced
+
+
+@pytest.fixture(autouse=True)
+def stop_tracing():
+    yield
+    Tracer.stop_tracing()
+
+
+@traced("work", counters=("files", "bytes"))
+def _work(files: int) -> dict:
+    with span("step", index=files) as trace:
+        trace.add(bytes=10)
+    return {"files": files, "bytes": 100, "seconds": 1}
+
+
+def test_disabled_spans_are_noops():
+    assert span("anything") is NOOP_SPAN
+    assert current_span() is NOOP_SPAN
+    with span("anything") as trace:
+        trace.add(bytes=1)
+
+    assert _work(2)["files"] == 2
+
+
+def test_spans_nest():
+    tracer = Tracer.start_tracing("new")
+
+    _work(2)
+    _work(3)
+    Tracer.stop_tracing()
+
+    root = tracer.root
+    assert root.name == "new"
+    assert root.end is not None
+    assert [child.name for child in root.children] == ["work", "work"]
+    assert root.children[0].counters == {"files": 2, "bytes": 100}
+    step = root.children[1].children[0]
+    assert step.name == "step"
+    assert step.attributes == {"index": 3}
+    assert step.counters == {"bytes": 10}
+
+
+def test_current_span_counters():
+    tracer = Tracer.start_tracing()
+
+    with span("scan"):
+        current_span().add(files=1)
+        current_span().add(files=2)
+    current_span().add(files=5)
+
+    assert tracer.root.children[0].counters == {"files": 3}
+    assert tracer.root.counters == {"files": 5}
+
+
+def test_worker_thread_spans_nest_under_root():
+    tracer = Tracer.start_tracing()
+
+    with span("parent"):
+        thread = threading.Thread(target=_work, args=(1,))
+        thread.start()
+        thread.join()
+
+    assert [child.name for child in tracer.root.children] == ["parent", "work"]
+    assert tracer.root.children[1].thread != tracer.root.children[0].thread
+
+
+def test_failed_span_records_error():
+    tracer = Tracer.start_tracing()
+
+    with pytest.raises(KeyError):
+        with span("fails"):
+            raise KeyError("x")
+
+    assert tracer.root.children[0].attributes == {"error": "KeyError"}
+
+
+def test_outputs():
+    tracer = Tracer.start_tracing("new")
+    _work(2)
+    Tracer.stop_tracing()
+
+    tree = tracer.format_tree().splitlines()
+    trace = tracer.to_chrome_trace()
+    profile = tracer.to_json()
+
+    assert tree[0].startswith("new")
+    assert tree[1].strip().startswith("work")
+    assert tree[1].endswith("files=2 bytes=100")
+    assert tree[2].startswith("    step")
+    assert [event["name"] for event in trace["traceEvents"]] == ["new", "work", "step"]
+    assert all(event["ph"] == "X" for event in trace["traceEvents"])
+    assert trace["traceEvents"][1]["args"] == {"files": 2, "bytes": 100}
+    assert profile["name"] == "new"
+    assert profile["children"][0]["counters"] == {"files": 2, "bytes": 100}
+    assert profile["children"][0]["children"][0]["attributes"] == {"index": 2}
@@ -1,9 +1,19 @@
+import errno
 import os
 import pytest
 from unittest import mock
 
+from app.SshTransport import LocalTransport
+from app.TemplateUpgrader import read_template_state
 from app.WpSite import WpSite
-from app.constants import SITES_DIR, TEMPLATES_DIR
+from app.constants import (
+    COMPOSE_FILE,
+    SHARED_TEMPLATES_DIR,
+    SITES_DIR,
+    STAGING_DIR,
+    TEMPLATES_DIR,
+    TRASH_DIR,
+)
 
 
 def setup_function(function):
@@ -11,24 +21,119 @@ def setup_function(function):
     site = WpSite()
 
 
+@pytest.fixture
+def no_template_state():
+    with mock.patch("app.TemplateUpgrader.write_template_state") as mock_write:
+        yield mock_write
+
+
+SHARED_ENV = (
+    "DATABASE_MODE=shared\n"
+    "WORDPRESS_DB_HOST=cms_mysql\n"
+    "WORDPRESS_DB_NAME=wp_blog\n"
+    "WORDPRESS_DB_USER=wp_blog\n"
+    "WORDPRESS_DB_PASSWORD=secret\n"
+)
+
+
 def test_init():
     assert site.path is None
 
 
+@pytest.mark.usefixtures("no_template_state")
+@mock.patch("os.rename")
+@mock.patch("os.makedirs")
+@mock.patch("app.WpSite.ConfigHelper.update_env_file")
 @mock.patch("app.WpSite.ConfigHelper.update_compose_file")
-@mock.patch("shutil.copytree")
-def test_create(mock_copytree: mock.MagicMock, mock_update_compose_file: mock.MagicMock):
+@mock.patch("app.Materializer.Materializer")
+def test_create(
+    mock_materializer: mock.MagicMock,
+    mock_update_compose_file: mock.MagicMock,
+    mock_update_env_file: mock.MagicMock,
+    mock_makedirs: mock.MagicMock,
+    mock_rename: mock.MagicMock,
+):
     name = "testSite"
-    ports = {"http": 8080, "https": 8443}
+    ports = {"phpmyadmin": 9000, "wordpress": 8000}
     expected_path = os.path.join(SITES_DIR, name)
 
     actual = site.create(name, ports)
 
+    staging_path = mock_materializer.return_value.materialize.call_args.args[0]
     assert actual == name
-    mock_copytree.assert_called_with(TEMPLATES_DIR, expected_path)
-    mock_update_compose_file.assert_called_with(expected_path, name, ports)
+    assert staging_path.startswith(os.path.join(STAGING_DIR, f"{name}."))
+    mock_materializer.assert_called_with(TEMPLATES_DIR, skip=(COMPOSE_FILE, "shared"))
+    mock_update_compose_file.assert_called_with(
+        staging_path,
+        name,
+        ports,
+        template_path=os.path.join(TEMPLATES_DIR, COMPOSE_FILE),
+        database=None,
+    )
+    mock_update_env_file.assert_called_with(
+        os.path.join(staging_path, ".env"),
+        {"PHPMYADMIN_PORT": 9000, "WORDPRESS_PORT": 8000},
+    )
+    mock_rename.assert_called_with(staging_path, expected_path)
+
+
+@pytest.mark.usefixtures("no_template_state")
+@mock.patch("os.rename")
+@mock.patch("os.makedirs")
+@mock.patch("app.WpSite.template_hash", return_value="abc123")
+@mock.patch("app.WpSite.ConfigHelper.update_env_file")
+@mock.patch("app.WpSite.ConfigHelper.update_compose_file")
+@mock.patch("app.Materializer.Materializer")
+def test_create_updates_registry(
+    mock_materializer: mock.MagicMock,
+    mock_update_compose_file: mock.MagicMock,
+    mock_update_env_file: mock.MagicMock,
+    mock_template_hash: mock.MagicMock,
+    mock_makedirs: mock.MagicMock,
+    mock_rename: mock.MagicMock,
+):
+    site.registry = mock.MagicMock()
+    ports = {"phpmyadmin": 9000, "wordpress": 8000}
+
+    site.create("testSite", ports)
+
+    site.registry.transaction.assert_called_once()
+    site.registry.add.assert_called_with("testSite", ports, "abc123")
+
 
+@pytest.mark.usefixtures("no_template_state")
+@mock.patch("shutil.rmtree")
+@mock.patch("os.rename")
+@mock.patch("os.makedirs")
+@mock.patch("app.WpSite.ConfigHelper.update_env_file")
+@mock.patch("app.WpSite.ConfigHelper.update_compose_file", side_effect=KeyError)
+@mock.patch("app.Materializer.Materializer")
+def test_create_cleans_up_staging_on_failure(
+    mock_materializer: mock.MagicMock,
+    mock_update_compose_file: mock.MagicMock,
+    mock_update_env_file: mock.MagicMock,
+    mock_makedirs: mock.MagicMock,
+    mock_rename: mock.MagicMock,
+    mock_rmtree: mock.MagicMock,
+):
+    site.registry = mock.MagicMock()
+
+    with pytest.raises(KeyError):
+        site.create("testSite", {"phpmyadmin": 9000, "wordpress": 8000})
+
+    staging_path = mock_materializer.return_value.materialize.call_args.args[0]
+    mock_rmtree.assert_called_with(staging_path, ignore_errors=True)
+    mock_rename.assert_not_called()
+    site.registry.add.assert_not_called()
 
+
+@mock.patch("os.path.exists", return_value=True)
+def test_create_existing_site(mock_exists: mock.MagicMock):
+    with pytest.raises(FileExistsError):
+        site.create("testSite", {"phpmyadmin": 9000, "wordpress": 8000})
+
+
+@pytest.mark.usefixtures("no_template_state")
 @pytest.mark.parametrize(
     "name,expected_name",
     [
@@ -40,11 +145,17 @@ def test_create(mock_copytree: mock.MagicMock, mock_update_compose_file: mock.Ma
         ("test:site", "testsite"),
     ],
 )
+@mock.patch("os.rename")
+@mock.patch("os.makedirs")
+@mock.patch("app.WpSite.ConfigHelper.update_env_file")
 @mock.patch("app.WpSite.ConfigHelper.update_compose_file")
-@mock.patch("shutil.copytree")
+@mock.patch("app.Materializer.Materializer")
 def test_create_sanitize_site_name(
-    mock_copytree: mock.MagicMock,
+    mock_materializer: mock.MagicMock,
     mock_update_compose_file: mock.MagicMock,
+    mock_update_env_file: mock.MagicMock,
+    mock_makedirs: mock.MagicMock,
+    mock_rename: mock.MagicMock,
     name: str,
     expected_name: str,
 ):
@@ -53,9 +164,118 @@ def test_create_sanitize_site_name(
 
     actual = site.create(name, ports)
 
+    staging_path = mock_materializer.return_value.materialize.call_args.args[0]
     assert actual == expected_name
-    mock_copytree.assert_called_with(TEMPLATES_DIR, expected_path)
-    mock_update_compose_file.assert_called_with(expected_path, expected_name, ports)
+    assert mock_update_compose_file.call_args.args == (staging_path, expected_name, ports)
+    mock_rename.assert_called_with(staging_path, expected_path)
+
+
+def test_clone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / TEMPLATES_DIR).mkdir()
+    (tmp_path / TEMPLATES_DIR / COMPOSE_FILE).write_text('"${WORDPRESS_PORT}:80"\n')
+    source_path = tmp_path / SITES_DIR / "source"
+    (source_path / "src").mkdir(parents=True)
+    (source_path / "packages").mkdir()
+    (source_path / "src" / "index.php").write_text("<?php")
+    (source_path / "packages" / "manifest.json").write_text("{}")
+    (source_path / COMPOSE_FILE).write_text('"8000:80"\n')
+    (source_path / ".env").write_text("SSH_USER=user\nWORDPRESS_PORT=8000")
+    source = WpSite()
+    source.load("source")
+    site.registry = mock.MagicMock()
+    site.registry.get.return_value = {"ssh": "user@example.com"}
+    ports = {"phpmyadmin": 9001, "wordpress": 8001}
+
+    actual = site.clone(source, "copy", ports)
+
+    clone_path = tmp_path / SITES_DIR / "copy"
+    assert actual == "copy"
+    assert site.path == os.path.join(SITES_DIR, "copy")
+    assert (clone_path / "src" / "index.php").read_text() == "<?php"
+    assert not (clone_path / "packages").exists()
+    assert (clone_path / COMPOSE_FILE).read_text() == '"8001:80"\n'
+    assert (clone_path / ".env").read_text() == (
+        "SSH_USER=user\nWORDPRESS_PORT=8001\nPHPMYADMIN_PORT=9001"
+    )
+    assert (source_path / ".env").read_text() == "SSH_USER=user\nWORDPRESS_PORT=8000"
+    assert read_template_state(str(clone_path))["inputs"] == {
+        "site_name": "copy",
+        "ports": ports,
+    }
+    site.registry.update.assert_called_with("copy", ssh="user@example.com")
+
+
+def test_clone_copies_without_reflinks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / TEMPLATES_DIR).mkdir()
+    (tmp_path / TEMPLATES_DIR / COMPOSE_FILE).write_text('"${WORDPRESS_PORT}:80"\n')
+    source_path = tmp_path / SITES_DIR / "source"
+    (source_path / "src" / "wp-includes").mkdir(parents=True)
+    (source_path / "src" / "wp-includes" / "version.php").write_text("<?php $v = 1;")
+    (source_path / ".env").write_text("WORDPRESS_PORT=8000")
+    source = WpSite()
+    source.load("source")
+    site.registry = None
+
+    error = OSError(errno.EOPNOTSUPP, "Operation not supported")
+    with mock.patch("app.Materializer.reflink", side_effect=error):
+        site.clone(source, "staging", {"phpmyadmin": 9001, "wordpress": 8001})
+
+    # Updating core in the clone must leave the live source untouched
+    version = tmp_path / SITES_DIR / "staging" / "src" / "wp-includes" / "version.php"
+    assert os.stat(version).st_nlink == 1
+    version.write_text("<?php $v = 2;")
+    assert (source_path / "src" / "wp-includes" / "version.php").read_text() == (
+        "<?php $v = 1;"
+    )
+
+
+def test_clone_unloaded_source():
+    with pytest.raises(ValueError):
+        site.clone(WpSite(), "copy", {"phpmyadmin": 9001, "wordpress": 8001})
+
+
+@mock.patch("subprocess.run")
+def test_start_database(mock_run: mock.MagicMock):
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    with mock.patch.object(WpSite, "get_database_client") as mock_client:
+        site.start_database()
+
+    mock_run.assert_called_with(
+        ["docker", "compose", "up", "-d", "mysql"], cwd=site.path, check=True
+    )
+    mock_client.return_value.wait.assert_called_once()
+
+
+@mock.patch("app.SharedDatabase.SharedDatabase")
+def test_start_database_shared(mock_shared: mock.MagicMock, tmp_path):
+    (tmp_path / ".env").write_text("DATABASE_MODE=shared\n")
+    site.path = str(tmp_path)
+
+    site.start_database()
+
+    mock_shared.return_value.ensure.assert_called_once()
+
+
+def test_reserve():
+    site.registry = mock.MagicMock()
+    site.registry.get.return_value = None
+    ports = {"phpmyadmin": 9000, "wordpress": 8000}
+
+    actual = site.reserve("test site", ports)
+
+    assert actual == "test-site"
+    site.registry.add.assert_called_with("test-site", ports, pending=True)
+
+
+def test_reserve_registered_site():
+    site.registry = mock.MagicMock()
+    site.registry.get.return_value = {"name": "testSite"}
+
+    with pytest.raises(FileExistsError):
+        site.reserve("testSite", {"phpmyadmin": 9000, "wordpress": 8000})
 
 
 @mock.patch("os.path.exists", return_value=True)
@@ -75,31 +295,104 @@ def test_load_path_not_exists(mock_exists: mock.MagicMock):
         site.load("testSite")
 
 
-@mock.patch("shutil.rmtree")
-def test_remove(mock_rmtree: mock.MagicMock):
+@pytest.fixture
+def mock_reaper():
+    with mock.patch("app.Reaper.Reaper") as mock_reaper:
+        yield mock_reaper
+
+
+@mock.patch("os.makedirs")
+@mock.patch("os.rename")
+def test_remove(
+    mock_rename: mock.MagicMock,
+    mock_makedirs: mock.MagicMock,
+    mock_reaper: mock.MagicMock,
+):
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    actual = site.remove()
+
+    trash_path = mock_rename.call_args.args[1]
+    assert actual is None
+    assert trash_path.startswith(os.path.join(TRASH_DIR, "testSite."))
+    mock_rename.assert_called_with("sites/testSite", trash_path)
+    mock_reaper.return_value.spawn.assert_called_once()
+    mock_reaper.return_value.reclaim.assert_not_called()
+
+
+@mock.patch("os.makedirs")
+@mock.patch("os.rename")
+def test_remove_wait(
+    mock_rename: mock.MagicMock,
+    mock_makedirs: mock.MagicMock,
+    mock_reaper: mock.MagicMock,
+):
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    actual = site.remove(wait=True)
+
+    assert actual == mock_reaper.return_value.reclaim.return_value
+    mock_reaper.return_value.reclaim.assert_called_with(mock_rename.call_args.args[1])
+    mock_reaper.return_value.spawn.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_reaper")
+@mock.patch("os.makedirs")
+@mock.patch("os.rename")
+def test_remove_updates_registry(
+    mock_rename: mock.MagicMock, mock_makedirs: mock.MagicMock
+):
+    ports = {"phpmyadmin": 9000, "wordpress": 8000}
+    site.registry = mock.MagicMock()
+    site.registry.get.return_value = {"name": "testSite", "ports": ports}
+    site.allocator = mock.MagicMock()
     site.path = os.path.join(SITES_DIR, "testSite")
 
     site.remove()
 
-    mock_rmtree.assert_called_with("sites/testSite")
+    site.allocator.release.assert_called_with(ports)
+    site.registry.remove.assert_called_with("testSite")
+    site.registry.transaction.assert_called_once()
 
 
-@mock.patch("shutil.rmtree", side_effect=FileNotFoundError)
-def test_remove_path_not_exists(mock_exists: mock.MagicMock):
-    with pytest.raises(FileNotFoundError):
-        site.remove()
+@pytest.mark.usefixtures("mock_reaper")
+@mock.patch("os.rename")
+@mock.patch("app.SharedDatabase.SharedDatabase")
+def test_remove_drops_shared_database(
+    mock_shared: mock.MagicMock, mock_rename: mock.MagicMock, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".env").write_text(SHARED_ENV)
+    site.path = str(tmp_path)
+
+    site.remove()
+
+    mock_shared.return_value.drop_database.assert_called_with(
+        {
+            "host": "cms_mysql",
+            "name": "wp_blog",
+            "user": "wp_blog",
+            "password": "secret",
+            "network": "cms_shared",
+        }
+    )
+    assert mock_rename.call_args.args[0] == str(tmp_path)
 
 
-@mock.patch("shutil.rmtree", side_effect=PermissionError)
-def test_remove_permission_denied(mock_exists: mock.MagicMock):
-    with pytest.raises(PermissionError):
-        site.remove()
+@pytest.mark.parametrize("error", [FileNotFoundError, PermissionError, Exception])
+@mock.patch("os.makedirs")
+def test_remove_rename_error(
+    mock_makedirs: mock.MagicMock, mock_reaper: mock.MagicMock, error: type
+):
+    site.registry = mock.MagicMock()
+    site.path = os.path.join(SITES_DIR, "testSite")
 
+    with mock.patch("os.rename", side_effect=error):
+        with pytest.raises(error):
+            site.remove()
 
-@mock.patch("shutil.rmtree", side_effect=Exception)
-def test_remove_exception(mock_exists: mock.MagicMock):
-    with pytest.raises(Exception):
-        site.remove()
+    site.registry.remove.assert_not_called()
+    mock_reaper.return_value.spawn.assert_not_called()
 
 
 @mock.patch("app.ConfigHelper.ConfigHelper.update_env_file")
@@ -120,6 +413,20 @@ def test_set_ssh_details_for_empty_env_file(
     )
 
 
+@mock.patch("app.ConfigHelper.ConfigHelper.update_env_file")
+@mock.patch("os.path.exists", return_value=True)
+def test_set_ssh_details_updates_registry(
+    mock_exists: mock.MagicMock, mock_update_env_file: mock.MagicMock
+):
+    site.registry = mock.MagicMock()
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    site.set_ssh_details("testUser", "testDomain", "testPassword")
+
+    site.registry.update.assert_called_with("testSite", ssh="testUser@testDomain")
+    site.registry.transaction.assert_called_once()
+
+
 def test_set_ssh_details_for_missing_site_path():
     site.path = None
 
@@ -141,3 +448,226 @@ def test_set_ssh_details_for_missing_env_file(tmp_path: str):
 
     with pytest.raises(FileNotFoundError):
         site.set_ssh_details("testUser", "testDomain", "testPassword")
+
+
+@mock.patch("app.SitePackager.SitePackager")
+def test_package(mock_packager: mock.MagicMock):
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    actual = site.package("release")
+
+    assert actual == mock_packager.return_value.package.return_value
+    mock_packager.assert_called_with(os.path.join(site.path, "src"))
+    mock_packager.return_value.package.assert_called_with(
+        os.path.join(site.path, "packages", "release")
+    )
+
+
+def test_package_for_missing_site_path():
+    site.path = None
+
+    with pytest.raises(ValueError):
+        site.package("release")
+
+
+@mock.patch("app.ChunkStore.ChunkStore")
+def test_package_incremental(mock_store: mock.MagicMock):
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    actual = site.package("release", incremental=True)
+
+    assert actual == mock_store.return_value.package.return_value
+    mock_store.assert_called_with(os.path.join(site.path, "packages", ".store"))
+    mock_store.return_value.package.assert_called_with(
+        os.path.join(site.path, "src"), os.path.join(site.path, "packages", "release")
+    )
+
+
+def test_upload(tmp_path):
+    site.path = str(tmp_path / "testSite")
+    package_dir = tmp_path / "testSite" / "packages" / "release"
+    package_dir.mkdir(parents=True)
+    (package_dir / "manifest.json").write_text("{}")
+    (tmp_path / "testSite" / ".env").write_text(
+        "SSH_USER=user\nSSH_DOMAIN=example.com\nSSH_PASSWORD=secret\n"
+    )
+    remote = tmp_path / "remote"
+
+    with mock.patch.object(
+        WpSite, "_create_transport", return_value=LocalTransport(str(remote))
+    ) as mock_create_transport:
+        stats = site.upload("release", workers=2)
+
+    assert stats["files"] == 1
+    assert (remote / "cms-manager/testSite/packages/release/manifest.json").exists()
+    mock_create_transport.assert_called_with(
+        {
+            "user": "user",
+            "domain": "example.com",
+            "password": "secret",
+            "remote_path": "cms-manager/testSite",
+            "wordpress_path": "public_html",
+        }
+    )
+
+
+def test_live_sync(tmp_path):
+    site.path = str(tmp_path / "testSite")
+    (tmp_path / "testSite").mkdir()
+    (tmp_path / "testSite" / ".env").write_text(
+        "SSH_USER=user\nSSH_DOMAIN=example.com\nSSH_PASSWORD=secret\n"
+    )
+
+    with mock.patch.object(WpSite, "_create_transport") as mock_create_transport:
+        live_sync = site.live_sync(debounce=0.5)
+        live_sync.transport_factory()
+
+    assert live_sync.local_dir == str(tmp_path / "testSite" / "src")
+    assert live_sync.remote_dir == "public_html"
+    assert live_sync.batcher.debounce == 0.5
+    mock_create_transport.assert_called_once()
+
+
+def test_upload_without_ssh_details(tmp_path):
+    site.path = str(tmp_path / "testSite")
+    (tmp_path / "testSite" / "packages" / "release").mkdir(parents=True)
+    (tmp_path / "testSite" / ".env").write_text("WORDPRESS_PORT=8000\n")
+
+    with pytest.raises(ValueError):
+        site.upload("release")
+
+
+def test_download(tmp_path):
+    site.path = str(tmp_path / "testSite")
+    (tmp_path / "testSite").mkdir()
+    (tmp_path / "testSite" / ".env").write_text(
+        "SSH_USER=user\nSSH_DOMAIN=example.com\nSSH_WORDPRESS_PATH=www\n"
+    )
+    remote = tmp_path / "remote"
+    (remote / "www" / "wp-content").mkdir(parents=True)
+    (remote / "www" / "wp-content" / "index.php").write_text("<?php")
+
+    with mock.patch.object(
+        WpSite, "_create_transport", return_value=LocalTransport(str(remote))
+    ):
+        stats = site.download(workers=2)
+
+    assert stats["files"] == 1
+    assert (tmp_path / "testSite" / "src" / "wp-content" / "index.php").exists()
+
+
+@mock.patch("app.DatabasePipeline.DatabasePipeline")
+@mock.patch("app.SitePackager.SitePackager")
+def test_package_with_database(
+    mock_packager: mock.MagicMock, mock_pipeline: mock.MagicMock
+):
+    site.path = os.path.join(SITES_DIR, "testSite")
+    mock_packager.return_value.package.return_value = {"files": []}
+
+    actual = site.package("release", database=True)
+
+    assert actual["database"] == mock_pipeline.return_value.dump.return_value
+    mock_pipeline.return_value.dump.assert_called_with(
+        os.path.join(site.path, "packages", "release", "db")
+    )
+
+
+@mock.patch("app.DatabasePipeline.DatabasePipeline")
+@mock.patch("app.SnapshotStore.SnapshotStore")
+def test_snapshot(mock_store: mock.MagicMock, mock_pipeline: mock.MagicMock):
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    actual = site.snapshot("before update")
+
+    assert actual == mock_store.return_value.snapshot.return_value
+    mock_store.return_value.snapshot.assert_called_with(
+        "testSite", site.path, "before update", mock_pipeline.return_value.dump
+    )
+
+
+@mock.patch("app.SnapshotStore.SnapshotStore")
+def test_rollback_without_database(mock_store: mock.MagicMock):
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    site.rollback("20240101-120000", database=False)
+
+    mock_store.return_value.rollback.assert_called_with(
+        "testSite", site.path, "20240101-120000", None
+    )
+
+
+def test_snapshot_for_missing_site_path():
+    site.path = None
+
+    with pytest.raises(ValueError):
+        site.snapshot()
+
+
+def test_get_database_client():
+    site.path = os.path.join(SITES_DIR, "testSite")
+
+    client = site.get_database_client()
+
+    assert client.container == "mysql_testSite"
+    assert client.database == "mysqldb"
+
+
+def test_get_database_client_shared(tmp_path):
+    (tmp_path / ".env").write_text(SHARED_ENV)
+    site.path = str(tmp_path)
+
+    client = site.get_database_client()
+
+    assert client.container == "cms_mysql"
+    assert client.database == "wp_blog"
+    assert client.user == "wp_blog"
+    assert client.password == "secret"
+
+
+@pytest.mark.usefixtures("no_template_state")
+@mock.patch("os.rename")
+@mock.patch("os.makedirs")
+@mock.patch("app.WpSite.template_hash", return_value="abc123")
+@mock.patch("app.WpSite.ConfigHelper.update_env_file")
+@mock.patch("app.WpSite.ConfigHelper.update_compose_file")
+@mock.patch("app.Materializer.Materializer")
+def test_create_with_shared_database(
+    mock_materializer: mock.MagicMock,
+    mock_update_compose_file: mock.MagicMock,
+    mock_update_env_file: mock.MagicMock,
+    mock_template_hash: mock.MagicMock,
+    mock_makedirs: mock.MagicMock,
+    mock_rename: mock.MagicMock,
+):
+    ports = {"phpmyadmin": 9000, "wordpress": 8000}
+    database = {
+        "host": "cms_mysql",
+        "name": "wp_blog",
+        "user": "wp_blog",
+        "password": "secret",
+        "network": "cms_shared",
+    }
+
+    site.create("blog", ports, database)
+
+    staging_path = mock_materializer.return_value.materialize.call_args.args[0]
+    mock_template_hash.assert_called_with(SHARED_TEMPLATES_DIR)
+    mock_update_compose_file.assert_called_with(
+        staging_path,
+        "blog",
+        ports,
+        template_path=os.path.join(SHARED_TEMPLATES_DIR, COMPOSE_FILE),
+        database=database,
+    )
+    mock_update_env_file.assert_called_with(
+        os.path.join(staging_path, ".env"),
+        {
+            "PHPMYADMIN_PORT": 9000,
+            "WORDPRESS_PORT": 8000,
+            "DATABASE_MODE": "shared",
+            "WORDPRESS_DB_HOST": "cms_mysql",
+            "WORDPRESS_DB_NAME": "wp_blog",
+            "WORDPRESS_DB_USER": "wp_blog",
+            "WORDPRESS_DB_PASSWORD": "secret",
+        },
+    )